@@ -0,0 +1,144 @@
+"""Micro-benchmark du coût de censure par requête (avant / après).
+
+"avant" reproduit l'ancien hook : 4 regex recompilés à chaque requête puis
+4 passes complètes par message. "après" utilise redaction.Redactor (règles
+compilées une fois, préfiltre, passe unique). Aucune dépendance LiteLLM.
+
+La seconde partie rejoue une conversation où chaque tour renvoie tout
+l'historique, sans puis avec le cache de textes déjà censurés.
+
+La dernière partie mesure le retard de la boucle asyncio (ce que subissent
+les autres requêtes en vol) pendant la censure de gros payloads concurrents :
+sur place, dans un pool de threads ou dans un pool de processus.
+
+    python bench_redaction.py --sizes 1000 10000 100000 500000 --turns 40
+"""
+import re
+import asyncio
+import statistics
+import random
+import timeit
+import argparse
+import redaction
+
+
+def legacy_redact(messages):
+    redaction_rules = [
+        (re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'), '[REDACTED_EMAIL]'),
+        (re.compile(r'\b(sk|pk|rk|ghp)_[a-zA-Z0-9]{20,}\b'), '[REDACTED_API_KEY]'),
+        (re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b'), '[REDACTED_IPV4]'),
+        (re.compile(r'/home/\w+/llm/'), '[REDACTED_PATH]'),
+    ]
+    for message in messages:
+        if isinstance(message, dict) and isinstance(message.get("content"), str):
+            modified = message["content"]
+            for pattern, replacement in redaction_rules:
+                modified = pattern.sub(replacement, modified)
+            message["content"] = modified
+
+
+def make_messages(total_chars: int, secrets: bool, seed: int = 1):
+    """Conversation synthétique d'environ total_chars caractères (10 messages)."""
+    rng = random.Random(seed)
+    words = ["docker", "compose", "python", "mémoire", "résumé", "volume", "réseau", "config", "modèle", "le", "la"]
+    if secrets:
+        words += ["jean.dupont@example.com", "192.168.1.12", "sk_" + "a" * 24, "/home/bob/llm/data"]
+    per_message = max(1, total_chars // 10)
+    messages = []
+    for i in range(10):
+        text, size = [], 0
+        while size < per_message:
+            w = rng.choice(words)
+            text.append(w)
+            size += len(w) + 1
+        messages.append({"role": "user" if i % 2 else "assistant", "content": " ".join(text)})
+    return messages
+
+
+def bench(fn, messages, repeat: int) -> float:
+    """Temps moyen (ms) par requête ; les messages sont recopiés avant chaque appel."""
+    runs = timeit.repeat(lambda: fn([dict(m) for m in messages]), number=1, repeat=repeat)
+    return min(runs) * 1000
+
+
+def bench_conversation(turns: int, message_chars: int):
+    """Coût cumulé (ms) d'une conversation de `turns` tours, sans puis avec cache."""
+    history = make_messages(message_chars * turns, True)
+    history = (history * (turns // len(history) + 1))[:turns]
+    history = [{**m, "content": f"{i} {m['content']}"} for i, m in enumerate(history)]
+    results = {}
+    for label, redactor in (("sans cache", redaction.Redactor()),
+                            ("avec cache", redaction.Redactor(cache=redaction.RedactionCache()))):
+        started = timeit.default_timer()
+        for turn in range(1, turns + 1):
+            redactor.redact_messages([dict(m) for m in history[:turn]])
+        results[label] = ((timeit.default_timer() - started) * 1000, redactor.cache.stats() if redactor.cache else None)
+    return results
+
+
+async def _loop_lag(async_redactor, requests: int, payload_chars: int):
+    """Retards (ms) d'un tic de 1 ms de la boucle pendant `requests` censures concurrentes."""
+    payloads = [make_messages(payload_chars, True, seed) for seed in range(requests)]
+    lags, done = [], False
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not done:
+            expected = loop.time() + 0.001
+            await asyncio.sleep(0.001)
+            lags.append(max(0.0, loop.time() - expected) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await asyncio.gather(*(async_redactor.redact_messages(m) for m in payloads))
+    done = True
+    await tick
+    return lags
+
+
+def bench_event_loop(requests: int, payload_chars: int):
+    results = {}
+    for mode, offload in (("sur place", None), ("thread", "thread"), ("process", "process")):
+        async_redactor = redaction.AsyncRedactor(redaction.Redactor(), mode=offload or "thread",
+                                                 offload_chars=payload_chars + 1 if offload is None else 0)
+        if offload == "process":
+            # Démarrage des processus hors mesure
+            async_redactor.warm_up()
+            asyncio.run(async_redactor.redact_messages(make_messages(1000, False)))
+        lags = sorted(asyncio.run(_loop_lag(async_redactor, requests, payload_chars)))
+        async_redactor.shutdown()
+        results[mode] = {"p50": statistics.median(lags), "p99": lags[int(len(lags) * 0.99) - 1], "max": lags[-1]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de la censure LiteLLM")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 500_000],
+                        help="taille totale des messages d'une requête (caractères)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=40, help="tours de la conversation rejouée")
+    parser.add_argument("--message-chars", type=int, default=4000, help="taille d'un message de la conversation")
+    parser.add_argument("--concurrent", type=int, default=8, help="gros payloads censurés en parallèle")
+    parser.add_argument("--payload-chars", type=int, default=500_000, help="taille d'un gros payload")
+    args = parser.parse_args()
+
+    redactor = redaction.Redactor()
+    print(f"{'taille':>9} {'secrets':>8} {'avant (ms)':>11} {'après (ms)':>11} {'gain':>6}")
+    for size in args.sizes:
+        for secrets in (False, True):
+            messages = make_messages(size, secrets)
+            before = bench(legacy_redact, messages, args.repeat)
+            after = bench(redactor.redact_messages, messages, args.repeat)
+            print(f"{size:>9} {'oui' if secrets else 'non':>8} {before:>11.3f} {after:>11.3f} {before / after:>5.1f}x")
+
+    print(f"\nConversation de {args.turns} tours (historique renvoyé à chaque tour) :")
+    for label, (ms, stats) in bench_conversation(args.turns, args.message_chars).items():
+        print(f"  {label:<11} {ms:>9.1f} ms" + (f"  {stats}" if stats else ""))
+
+    print(f"\nRetard de la boucle asyncio, {args.concurrent} payloads de {args.payload_chars} caractères :")
+    for mode, lag in bench_event_loop(args.concurrent, args.payload_chars).items():
+        print(f"  {mode:<10} p50 {lag['p50']:>7.2f} ms  p99 {lag['p99']:>7.2f} ms  max {lag['max']:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
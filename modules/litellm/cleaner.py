@@ -1,14 +1,28 @@
-import re
+import os
+import copy
 import logging
-from typing import Optional, Literal, Union
+from typing import Any, AsyncGenerator, Optional, Literal, Union
 from litellm.integrations.custom_logger import CustomLogger
 from litellm.proxy._types import UserAPIKeyAuth
 from litellm.caching import DualCache
 from litellm._logging import verbose_proxy_logger  # Pour logger proprement dans LiteLLM
+import redaction  # Moteur de censure (sans dépendance LiteLLM, voir bench_redaction.py)
 
 verbose_proxy_logger.setLevel(logging.INFO)  # Ou DEBUG pour plus de détails
 
+# Règles compilées une seule fois au chargement (redaction_rules.json / REDACTION_RULES_PATH) ;
+# l'historique renvoyé à chaque tour est servi par le cache (REDACTION_CACHE_ENTRIES / _MAX_MB)
+REDACTOR = redaction.Redactor(cache=redaction.RedactionCache())
+# Gros payloads (> REDACTION_OFFLOAD_CHARS) censurés hors de la boucle asyncio (REDACTION_OFFLOAD_MODE)
+ASYNC_REDACTOR = redaction.AsyncRedactor(REDACTOR)
+ASYNC_REDACTOR.warm_up()
+# Fréquence (en requêtes) du log des statistiques du cache (0 = jamais)
+STATS_EVERY = int(os.getenv("REDACTION_STATS_EVERY", "1000"))
+verbose_proxy_logger.info(f"🔥 SÉCURITÉ : {len(REDACTOR.rules)} règles de censure chargées 🔥")
+
 class SensitiveInfoRedactor(CustomLogger):
+    requests_seen = 0
+
     async def async_pre_call_hook(
         self,
         user_api_key_dict: UserAPIKeyAuth,
@@ -17,39 +31,22 @@ class SensitiveInfoRedactor(CustomLogger):
         call_type: Literal["completion", "text_completion", "embeddings", "image_generation", "moderation", "audio_transcription"]
     ) -> Optional[Union[dict, str]]:
         try:
-            verbose_proxy_logger.info("🔥 SÉCURITÉ : MODE PRE-CALL HOOK ACTIVÉ 🔥")
-
             # On cible les messages (dans 'messages' ou ailleurs si besoin)
             messages = data.get("messages", [])
             if not messages:
-                verbose_proxy_logger.info("Pas de messages à redacter.")
+                verbose_proxy_logger.debug("Pas de messages à redacter.")
                 return data
 
-            redaction_rules = [
-                (re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'), '[REDACTED_EMAIL]'),
-                (re.compile(r'\b(sk|pk|rk|ghp)_[a-zA-Z0-9]{20,}\b'), '[REDACTED_API_KEY]'),
-                (re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b'), '[REDACTED_IPV4]'),
-                # Ajoute d'autres règles si besoin (ex: paths sensibles comme /home/...)
-                (re.compile(r'/home/\w+/llm/'), '[REDACTED_PATH]'),
-            ]
-
-            modified_count = 0
-            for message in messages:
-                if isinstance(message, dict) and "content" in message and isinstance(message["content"], str):
-                    original = message["content"]
-                    modified = original
-                    for pattern, replacement in redaction_rules:
-                        modified = pattern.sub(replacement, modified)
-
-                    if original != modified:
-                        verbose_proxy_logger.info(f"--- ✂️ CENSURE APPLIQUÉE ✂️ ---")
-                        verbose_proxy_logger.info(f"Avant : {original[:30]}...")
-                        verbose_proxy_logger.info(f"Après : {modified[:30]}...")
-                        message["content"] = modified
-                        modified_count += 1
+            # Une seule passe par message (texte ou parties multimodales)
+            modified_count = await ASYNC_REDACTOR.redact_messages(messages)
 
+            # Log par requête en DEBUG : l'INFO sur chaque appel coûte sur le chemin critique
             if modified_count > 0:
-                verbose_proxy_logger.info(f"✅ {modified_count} éléments censurés avant envoi.")
+                verbose_proxy_logger.debug(f"✅ {modified_count} éléments censurés avant envoi.")
+
+            SensitiveInfoRedactor.requests_seen += 1
+            if STATS_EVERY and SensitiveInfoRedactor.requests_seen % STATS_EVERY == 0:
+                verbose_proxy_logger.info(f"♻️ Censure : cache {REDACTOR.cache.stats()}, requêtes {ASYNC_REDACTOR.stats()}")
 
             return data  # Renvoie le data modifié
 
@@ -57,5 +54,63 @@ class SensitiveInfoRedactor(CustomLogger):
             verbose_proxy_logger.error(f"❌ ERREUR CRITIQUE CLEANER: {e}")
             raise e  # Ou return "Erreur interne" pour rejeter
 
+    async def async_post_call_success_hook(
+        self,
+        data: dict,
+        user_api_key_dict: UserAPIKeyAuth,
+        response: Any,
+    ) -> Any:
+        """Réponse complète (hors streaming) : censure avant retour au client (puis archivage)."""
+        try:
+            choices = [c for c in (getattr(response, "choices", None) or [])
+                       if isinstance(getattr(getattr(c, "message", None), "content", None), str)]
+            if not choices:
+                return response
+            contents = [{"content": c.message.content} for c in choices]
+            if await ASYNC_REDACTOR.redact_messages(contents):
+                for choice, content in zip(choices, contents):
+                    choice.message.content = content["content"]
+                verbose_proxy_logger.debug("✅ Réponse du modèle censurée.")
+            return response
+        except Exception as e:
+            verbose_proxy_logger.error(f"❌ ERREUR CRITIQUE CLEANER (réponse): {e}")
+            raise e
+
+    async def async_post_call_streaming_iterator_hook(
+        self,
+        user_api_key_dict: UserAPIKeyAuth,
+        response: Any,
+        request_data: dict,
+    ) -> AsyncGenerator[Any, None]:
+        """Réponse en streaming : chaque morceau est censuré au vol (fenêtre glissante,
+        voir redaction.StreamRedactor) ; seul le dernier mot en cours est retenu."""
+        streams = {}
+        last_chunk = None
+        async for chunk in response:
+            for choice in getattr(chunk, "choices", None) or []:
+                delta = getattr(choice, "delta", None)
+                if delta is None:
+                    continue
+                stream = streams.get(choice.index)
+                if stream is None:
+                    stream = streams[choice.index] = redaction.StreamRedactor(REDACTOR)
+                text = getattr(delta, "content", None)
+                if isinstance(text, str) and text:
+                    delta.content = stream.feed(text)
+                if getattr(choice, "finish_reason", None):
+                    # Fin du choix : on libère le texte retenu avec le dernier morceau
+                    delta.content = (delta.content or "") + stream.flush()
+            last_chunk = chunk
+            yield chunk
+
+        # Flux terminé sans finish_reason : le texte retenu part dans un morceau final
+        leftovers = {index: stream.flush() for index, stream in streams.items()}
+        if last_chunk is not None and any(leftovers.values()):
+            final = copy.deepcopy(last_chunk)
+            for choice in getattr(final, "choices", None) or []:
+                if getattr(choice, "delta", None) is not None:
+                    choice.delta.content = leftovers.get(choice.index, "")
+            yield final
+
 # Instance globale (obligatoire pour le config.yaml)
 redactor_instance = SensitiveInfoRedactor()
@@ -0,0 +1,473 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("redaction")
+
+# Fichier de règles (JSON) : REDACTION_RULES_PATH, sinon redaction_rules.json à côté de ce module
+RULES_PATH = os.getenv("REDACTION_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "redaction_rules.json"))
+
+# Cache des textes déjà censurés (historique renvoyé à chaque tour de conversation)
+CACHE_MAX_ENTRIES = int(os.getenv("REDACTION_CACHE_ENTRIES", "4096"))
+CACHE_MAX_MB = float(os.getenv("REDACTION_CACHE_MAX_MB", "32"))
+# En dessous de cette taille, censurer coûte moins cher que hacher + chercher
+CACHE_MIN_CHARS = int(os.getenv("REDACTION_CACHE_MIN_CHARS", "256"))
+
+# Au-delà de cette taille (caractères de texte d'une requête), la censure quitte la boucle asyncio
+OFFLOAD_CHARS = int(os.getenv("REDACTION_OFFLOAD_CHARS", "65536"))
+# process : la boucle reste libre (défaut) ; thread : pas de copie du payload, mais le scan garde le GIL
+OFFLOAD_MODE = os.getenv("REDACTION_OFFLOAD_MODE", "process").lower()
+OFFLOAD_WORKERS = int(os.getenv("REDACTION_OFFLOAD_WORKERS", "2"))
+
+# Réponses en streaming : nombre max de caractères retenus en fin de flux (motif à cheval sur deux morceaux)
+STREAM_WINDOW = int(os.getenv("REDACTION_STREAM_WINDOW", "256"))
+
+# Règles par défaut (utilisées si le fichier est absent ou illisible)
+DEFAULT_RULES = [
+    {"name": "email", "pattern": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
+     "replacement": "[REDACTED_EMAIL]", "literals": ["@"]},
+    {"name": "api_key", "pattern": r"\b(?:sk|pk|rk|ghp)_[a-zA-Z0-9]{20,}\b",
+     "replacement": "[REDACTED_API_KEY]", "literals": ["sk_", "pk_", "rk_", "ghp_"]},
+    {"name": "ipv4", "pattern": r"\b(?:\d{1,3}\.){3}\d{1,3}\b",
+     "replacement": "[REDACTED_IPV4]", "prefilter": r"\d\.\d"},
+    {"name": "path", "pattern": r"/home/\w+/llm/",
+     "replacement": "[REDACTED_PATH]", "literals": ["/home/"]},
+]
+
+
+# Drapeaux d'un motif sans drapeau inline global (ex: (?i) en tête)
+_BASE_FLAGS = re.compile("").flags
+
+
+class RedactionRule:
+    """Une règle : motif, remplacement et préfiltre bon marché.
+
+    Le préfiltre (sous-chaînes `literals` et/ou petit regex `prefilter`) dit si
+    le motif PEUT apparaître dans le texte ; sinon la règle est ignorée sans
+    lancer le regex complet. Sans préfiltre, la règle est toujours appliquée.
+
+    Un motif avec groupes capturants (références arrière \\1, (?P=nom), noms
+    en double) ou drapeau inline global ((?i) : utiliser ignore_case) ne peut
+    pas entrer dans le regex combiné : la règle est alors appliquée seule.
+    """
+
+    def __init__(self, name: str, pattern: str, replacement: str, literals: Iterable[str] = (),
+                 prefilter: Optional[str] = None, ignore_case: bool = False):
+        self.name = name
+        self.pattern = pattern
+        self.replacement = replacement
+        self.ignore_case = ignore_case
+        self.literals = tuple(l.lower() for l in literals) if ignore_case else tuple(literals)
+        self.prefilter = re.compile(prefilter) if prefilter else None
+        # Compilé seul pour valider le motif dès le chargement
+        self.regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        self.standalone = self.regex.groups > 0 or self.regex.flags != _BASE_FLAGS
+
+    def may_match(self, text: str, lowered: Optional[str]) -> bool:
+        if not self.literals and self.prefilter is None:
+            return True
+        haystack = lowered if self.ignore_case else text
+        if any(l in haystack for l in self.literals):
+            return True
+        return bool(self.prefilter and self.prefilter.search(text))
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "RedactionRule":
+        return cls(spec["name"], spec["pattern"], spec["replacement"], spec.get("literals") or (),
+                   spec.get("prefilter"), bool(spec.get("ignore_case")))
+
+
+def load_rules(path: Optional[str] = None) -> List[RedactionRule]:
+    """Charge les règles depuis un fichier JSON ({"rules": [...]}) ; règles par défaut en repli."""
+    path = path or RULES_PATH
+    specs = DEFAULT_RULES
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                specs = json.load(f)["rules"]
+        except Exception as e:
+            logger.error(f"Règles de censure illisibles ({path}), règles par défaut utilisées : {e}")
+            specs = DEFAULT_RULES
+    rules = []
+    for spec in specs:
+        try:
+            rules.append(RedactionRule.from_dict(spec))
+        except (KeyError, re.error) as e:
+            logger.error(f"Règle de censure ignorée ({spec.get('name', '?')}) : {e}")
+    return rules
+
+
+class RedactionCache:
+    """LRU borné des résultats de censure, indexé par l'empreinte du texte.
+
+    Les clients renvoient toute la conversation à chaque tour : le prompt
+    système et les anciens messages sont donc déjà connus. La clé est un
+    BLAKE2b de 16 octets du texte ; la valeur est le texte censuré, ou None
+    quand le texte ne contenait rien à censurer (rien à stocker). Bornes :
+    nombre d'entrées et volume des textes conservés.
+    """
+
+    ENTRY_OVERHEAD = 200  # Octets approximatifs par entrée (clé, tuple, OrderedDict)
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_bytes = int(CACHE_MAX_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[bytes, Tuple[Optional[str], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    @classmethod
+    def _size(cls, value: Tuple[Optional[str], int]) -> int:
+        return cls.ENTRY_OVERHEAD + (len(value[0]) if value[0] is not None else 0)
+
+    def get(self, key: bytes) -> Optional[Tuple[Optional[str], int]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: bytes, redacted: Optional[str], count: int):
+        value = (redacted, count)
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= self._size(old)
+            self._entries[key] = value
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "mb": round(self.bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class Redactor:
+    """Moteur de censure : toutes les règles en une seule passe.
+
+    Les règles dont le préfiltre répond sont réunies dans un unique regex
+    alternatif, (?P<r0>...)|(?P<r1>...) ; chaque correspondance est remplacée
+    selon la règle qui l'a produite. Les regex combinés sont compilés une fois
+    par sous-ensemble de règles puis réutilisés. Les règles `standalone` (voir
+    RedactionRule) passent ensuite une par une. Avec un RedactionCache, un
+    texte déjà vu (>= CACHE_MIN_CHARS) n'est pas re-scanné.
+    """
+
+    def __init__(self, rules: Optional[List[RedactionRule]] = None, cache: Optional[RedactionCache] = None):
+        self.rules = rules if rules is not None else load_rules()
+        self.cache = cache
+        self._any_ignore_case = any(r.ignore_case for r in self.rules)
+        self._combined: Dict[Tuple[int, ...], re.Pattern] = {}
+        self._standalone = {i for i, rule in enumerate(self.rules) if rule.standalone}
+        # Regex combiné de toutes les règles compilé dès le départ : une erreur
+        # sort ici, au chargement, et pas au milieu d'une requête
+        combined = tuple(i for i in range(len(self.rules)) if i not in self._standalone)
+        if combined:
+            try:
+                self._pattern_for(combined)
+            except re.error as e:
+                logger.error(f"Regex combiné de censure invalide, règles appliquées une par une : {e}")
+                self._standalone = set(range(len(self.rules)))
+
+    def _pattern_for(self, indexes: Tuple[int, ...]) -> re.Pattern:
+        pattern = self._combined.get(indexes)
+        if pattern is None:
+            # Les motifs commençant par \b partagent un seul test de frontière de mot :
+            # \b(?:A|B|C) ne tente les alternatives qu'aux débuts de mot
+            # (bien plus rapide que A|B|C testé à chaque caractère).
+            parts, bounded = [], []
+            for i in indexes:
+                rule = self.rules[i]
+                body = rule.pattern
+                group = bounded if body.startswith("\\b") else parts
+                if group is bounded:
+                    if not bounded:
+                        parts.append(None)  # Place du groupe \b dans l'ordre des règles
+                    body = body[2:]
+                body = f"(?i:{body})" if rule.ignore_case else body
+                group.append(f"(?P<r{i}>{body})")
+            alternatives = [p if p is not None else "\\b(?:" + "|".join(bounded) + ")" for p in parts]
+            pattern = self._combined[indexes] = re.compile("|".join(alternatives))
+        return pattern
+
+    def _replace(self, match: re.Match) -> str:
+        # lastgroup = groupe nommé le plus externe, donc la règle qui a matché
+        return self.rules[int(match.lastgroup[1:])].replacement
+
+    def redact_text(self, text: str) -> Tuple[str, int]:
+        """Retourne (texte censuré, nombre de remplacements)."""
+        if not text:
+            return text, 0
+        cached = self.lookup(text)
+        if cached is not None:
+            return cached
+        redacted, count = self._scan(text)
+        self.remember(text, redacted, count)
+        return redacted, count
+
+    def _cacheable(self, text: str) -> bool:
+        return self.cache is not None and len(text) >= CACHE_MIN_CHARS
+
+    def lookup(self, text: str) -> Optional[Tuple[str, int]]:
+        """Résultat déjà en cache pour ce texte, sinon None."""
+        if not self._cacheable(text):
+            return None
+        cached = self.cache.get(self.cache.key(text))
+        if cached is None:
+            return None
+        redacted, count = cached
+        return (text if redacted is None else redacted), count
+
+    def remember(self, text: str, redacted: str, count: int):
+        if self._cacheable(text):
+            self.cache.put(self.cache.key(text), redacted if count else None, count)
+
+    def _scan(self, text: str) -> Tuple[str, int]:
+        lowered = text.lower() if self._any_ignore_case else None
+        indexes = tuple(i for i, rule in enumerate(self.rules) if rule.may_match(text, lowered))
+        if not indexes:
+            return text, 0
+        combined = tuple(i for i in indexes if i not in self._standalone)
+        count = 0
+        if combined:
+            text, count = self._pattern_for(combined).subn(self._replace, text)
+        for i in indexes:
+            if i in self._standalone:
+                rule = self.rules[i]
+                # Remplacement littéral, comme dans le regex combiné
+                text, n = rule.regex.subn(lambda _m, r=rule.replacement: r, text)
+                count += n
+        return text, count
+
+    def redact_content(self, content: Any) -> Tuple[Any, int]:
+        """Censure un champ `content` : texte simple ou liste de parties (multimodal).
+
+        Seules les parties texte ({"type": "text", "text": ...}) sont modifiées ;
+        images, audio, etc. sont laissés tels quels.
+        """
+        if isinstance(content, str):
+            return self.redact_text(content)
+        if not isinstance(content, list):
+            return content, 0
+        total = 0
+        parts = content
+        for i, part in enumerate(content):
+            if isinstance(part, str):
+                new, n = self.redact_text(part)
+            elif isinstance(part, dict) and isinstance(part.get("text"), str):
+                redacted, n = self.redact_text(part["text"])
+                new = {**part, "text": redacted} if n else part
+            else:
+                continue
+            if n:
+                if parts is content:
+                    parts = list(content)
+                parts[i] = new
+                total += n
+        return parts, total
+
+    def redact_messages(self, messages: List[Any]) -> int:
+        """Censure en place le `content` de chaque message. Retourne le nombre de messages modifiés."""
+        modified = 0
+        for message in messages:
+            if not isinstance(message, dict) or "content" not in message:
+                continue
+            new, n = self.redact_content(message["content"])
+            if n:
+                message["content"] = new
+                modified += 1
+        return modified
+
+
+class StreamRedactor:
+    """Censure d'un flux de texte (réponse du modèle en streaming), morceau par morceau.
+
+    Seule la fin du texte reçu qui pourrait encore être le début d'une donnée
+    sensible est retenue : le dernier « mot » (après le dernier blanc), borné
+    à `window` caractères. Tout ce qui précède est censuré et émis aussitôt,
+    le premier token n'attend donc que la fin de son mot. Les règles ne
+    contenant pas de blanc (e-mails, clés, IP, chemins), une donnée coupée
+    entre deux morceaux est toujours vue en entier.
+    """
+
+    def __init__(self, redactor: Redactor, window: int = None):
+        self.redactor = redactor
+        self.window = STREAM_WINDOW if window is None else window
+        self.pending = ""
+        self.redacted = 0
+
+    def feed(self, text: str) -> str:
+        """Ajoute un morceau ; retourne le texte censuré qui peut être émis maintenant."""
+        if not text:
+            return ""
+        buffer = self.pending + text
+        cut = max(buffer.rfind(" "), buffer.rfind("\n"), buffer.rfind("\t")) + 1
+        cut = max(cut, len(buffer) - self.window)
+        self.pending = buffer[cut:]
+        return self._emit(buffer[:cut])
+
+    def flush(self) -> str:
+        """Fin du flux : censure et retourne le texte encore retenu."""
+        tail, self.pending = self.pending, ""
+        return self._emit(tail)
+
+    def _emit(self, text: str) -> str:
+        if not text:
+            return ""
+        redacted, count = self.redactor.redact_text(text)
+        self.redacted += count
+        return redacted
+
+
+def payload_chars(messages: List[Any]) -> int:
+    """Nombre de caractères de texte à censurer dans une liste de messages."""
+    total = 0
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            total += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if isinstance(part, str):
+                    total += len(part)
+                elif isinstance(part, dict) and isinstance(part.get("text"), str):
+                    total += len(part["text"])
+    return total
+
+
+# Moteur propre à chaque processus du pool (mode "process")
+_process_redactor: Optional[Redactor] = None
+
+
+def _init_process():
+    global _process_redactor
+    # Sans cache : le cache du processus principal est consulté avant l'envoi
+    _process_redactor = Redactor()
+
+
+def _redact_with(redactor: Redactor, contents: List[Any]) -> List[Tuple[Any, int]]:
+    return [redactor.redact_content(c) for c in contents]
+
+
+def _redact_contents(contents: List[Any]) -> List[Tuple[Any, int]]:
+    return _redact_with(_process_redactor, contents)
+
+
+class AsyncRedactor:
+    """Censure depuis la boucle asyncio du proxy sans la bloquer.
+
+    Les petites requêtes sont traitées sur place (moins cher qu'un aller-retour
+    vers un pool). Au-delà de OFFLOAD_CHARS, le travail part dans un pool de
+    threads ou de processus borné (OFFLOAD_WORKERS) : un énorme document collé
+    ne fige plus les autres requêtes en vol. Le regex garde le GIL : seul le
+    mode "process" libère vraiment la boucle (voir bench_redaction.py) ; les
+    messages déjà en cache n'y sont pas envoyés.
+    """
+
+    def __init__(self, redactor: Redactor, offload_chars: int = None, mode: str = None, workers: int = None):
+        self.redactor = redactor
+        self.offload_chars = OFFLOAD_CHARS if offload_chars is None else offload_chars
+        self.mode = mode or OFFLOAD_MODE
+        self.workers = workers or OFFLOAD_WORKERS
+        self.inline = 0
+        self.offloaded = 0
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    # spawn : pas de fork d'un proxy multi-threadé (verrous hérités)
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                         initializer=_init_process)
+                else:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="redaction")
+            return self._executor
+
+    async def redact_messages(self, messages: List[Any]) -> int:
+        """Comme Redactor.redact_messages (modification en place), en asynchrone."""
+        if payload_chars(messages) < self.offload_chars:
+            self.inline += 1
+            return self.redactor.redact_messages(messages)
+        self.offloaded += 1
+        loop = asyncio.get_running_loop()
+        if self.mode != "process":
+            return await loop.run_in_executor(self.executor(), self.redactor.redact_messages, messages)
+        modified = 0
+        targets = []
+        for message in messages:
+            if not isinstance(message, dict) or "content" not in message:
+                continue
+            content = message["content"]
+            cached = self.redactor.lookup(content) if isinstance(content, str) else None
+            if cached is None:
+                targets.append(message)
+            elif cached[1]:
+                message["content"] = cached[0]
+                modified += 1
+        if not targets:
+            return modified
+        originals = [m["content"] for m in targets]
+        try:
+            results = await loop.run_in_executor(self.executor(), _redact_contents, originals)
+        except Exception as e:
+            # Pool cassé (processus tué, spawn impossible...) : on ne laisse jamais passer
+            # une requête non censurée, repli définitif sur le mode thread.
+            logger.error(f"Pool de censure indisponible ({e}), repli sur le mode thread")
+            self.shutdown()
+            self.mode = "thread"
+            results = await loop.run_in_executor(self.executor(), _redact_with, self.redactor, originals)
+        for message, original, (content, count) in zip(targets, originals, results):
+            if isinstance(original, str):
+                self.redactor.remember(original, content, count)
+            if count:
+                message["content"] = content
+                modified += 1
+        return modified
+
+    def warm_up(self):
+        """Démarre le pool tout de suite (mode process : évite le coût du spawn sur la 1re grosse requête)."""
+        if self.mode == "process":
+            self.executor().submit(payload_chars, [])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"inline": self.inline, "offloaded": self.offloaded, "mode": self.mode}
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# redaction.py est importé à plat, comme dans le conteneur LiteLLM
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+import redaction
+from redaction import AsyncRedactor, RedactionCache, RedactionRule, Redactor, StreamRedactor
+
+SECRETS = "Écris à jean.dupont@example.com, clé sk_abcdefghijklmnopqrstuvwx, serveur 192.168.1.20, " \
+          "dossier /home/jean/llm/models."
+EXPECTED = "Écris à [REDACTED_EMAIL], clé [REDACTED_API_KEY], serveur [REDACTED_IPV4], " \
+           "dossier [REDACTED_PATH]models."
+
+
+@pytest.fixture
+def redactor():
+    return Redactor(redaction.load_rules())
+
+
+def test_all_default_rules_in_one_pass(redactor):
+    assert redactor.redact_text(SECRETS) == (EXPECTED, 4)
+    assert redactor.redact_text("rien à cacher ici") == ("rien à cacher ici", 0)
+
+
+def test_rules_file_matches_defaults():
+    assert [r.pattern for r in redaction.load_rules()] == [r["pattern"] for r in redaction.DEFAULT_RULES]
+
+
+def test_invalid_rule_is_skipped(tmp_path):
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(json.dumps({"rules": [
+        {"name": "broken", "pattern": "(", "replacement": "x"},
+        {"name": "ok", "pattern": "secret", "replacement": "[S]"},
+    ]}))
+    assert [r.name for r in redaction.load_rules(str(rules_path))] == ["ok"]
+
+
+def test_rules_that_cannot_be_combined_run_alone():
+    rules = redaction.load_rules() + [
+        RedactionRule("double", r"\b(\w+) \1\b", "[DOUBLE]"),
+        RedactionRule("flag", r"(?i)code-\d+", "[CODE]"),
+        RedactionRule("named_a", r"token=(?P<v>\w+)", "[TOKEN]"),
+        RedactionRule("named_b", r"pwd=(?P<v>\w+)", "[PWD]"),
+    ]
+    assert [r.name for r in rules if r.standalone] == ["double", "flag", "named_a", "named_b"]
+    text, count = Redactor(rules).redact_text("a@b.fr le le CODE-7 token=abc pwd=x 10.0.0.1")
+    assert (text, count) == ("[REDACTED_EMAIL] [DOUBLE] [CODE] [TOKEN] [PWD] [REDACTED_IPV4]", 6)
+
+
+def test_ignore_case_rule():
+    rule = RedactionRule("projet", "projet-secret", "[PROJET]", literals=["projet-secret"], ignore_case=True)
+    assert Redactor([rule]).redact_text("Le PROJET-SECRET avance") == ("Le [PROJET] avance", 1)
+
+
+def test_cache_reuses_results(redactor):
+    cache = RedactionCache(max_entries=10, max_bytes=10 ** 6)
+    cached = Redactor(redactor.rules, cache)
+    long_text = SECRETS * 20
+    assert cached.redact_text(long_text) == redactor.redact_text(long_text)
+    assert cached.redact_text(long_text) == redactor.redact_text(long_text)
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = RedactionCache(max_entries=2, max_bytes=10 ** 6)
+    for text in ("a", "b", "c"):
+        cache.put(cache.key(text), None, 0)
+    assert cache.get(cache.key("a")) is None
+    assert cache.get(cache.key("c")) == (None, 0)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_multimodal_content_only_text_parts(redactor):
+    image = {"type": "image_url", "image_url": {"url": "data:..."}}
+    messages = [{"role": "user", "content": [{"type": "text", "text": SECRETS}, image]},
+                {"role": "assistant", "content": "rien"}]
+    assert redactor.redact_messages(messages) == 1
+    assert messages[0]["content"][0]["text"] == EXPECTED
+    assert messages[0]["content"][1] is image
+    assert messages[1]["content"] == "rien"
+
+
+def _stream(redactor, pieces, window=256):
+    stream = StreamRedactor(redactor, window)
+    out = "".join(stream.feed(p) for p in pieces) + stream.flush()
+    return out, stream.redacted
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 8, 13])
+def test_stream_redaction_across_chunk_boundaries(redactor, size):
+    pieces = [SECRETS[i:i + size] for i in range(0, len(SECRETS), size)]
+    assert _stream(redactor, pieces) == (EXPECTED, 4)
+
+
+def test_stream_redaction_random_splits(redactor):
+    rng = random.Random(0)
+    text = " ".join([SECRETS] * 5)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(text)), 30))
+        pieces = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        out, count = _stream(redactor, pieces)
+        assert out == " ".join([EXPECTED] * 5)
+        assert count == 20
+
+
+def test_stream_emits_before_the_end(redactor):
+    stream = StreamRedactor(redactor, 256)
+    assert stream.feed("Bonjour à ") == "Bonjour à "
+    assert stream.feed("jean.dup") == ""  # Début possible d'une adresse : retenu
+    assert stream.feed("ont@example.com et") == "[REDACTED_EMAIL] "
+    assert stream.flush() == "et"
+
+
+def test_stream_window_bounds_the_hold_back(redactor):
+    stream = StreamRedactor(redactor, 16)
+    emitted = stream.feed("x" * 100)
+    assert len(stream.pending) == 16
+    assert emitted + stream.flush() == "x" * 100
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_async_redactor_offloads_large_payloads(redactor, mode):
+    async_redactor = AsyncRedactor(redactor, offload_chars=500, mode=mode, workers=1)
+    small = [{"role": "user", "content": SECRETS}]
+    large = [{"role": "user", "content": SECRETS * 10}, {"role": "system", "content": "consignes"}]
+
+    async def run():
+        return await async_redactor.redact_messages(small), await async_redactor.redact_messages(large)
+
+    try:
+        assert asyncio.run(run()) == (1, 1)
+    finally:
+        async_redactor.executor().shutdown()
+    assert small[0]["content"] == EXPECTED
+    assert large[0]["content"] == EXPECTED * 10
+    assert (async_redactor.inline, async_redactor.offloaded) == (1, 1)
@@ -1,11 +1,13 @@
 import os
-import requests
 import json
-import tempfile
-import hashlib
 import logging
-from typing import Tuple, Dict, Any, Optional
+import tempfile
+import threading
+import time
 import config as worker_config
+import http_client
+import metrics
+from manifest_store import ManifestStore
 
 logger = logging.getLogger("anything_client")
 logger.setLevel(logging.INFO)
@@ -16,6 +18,10 @@ ARCHIVE_DIR = worker_config.ARCHIVE_DEFAULT_PATH
 MD_DIR = worker_config.MD_DEFAULT_PATH
 
 
+def _session():
+    return http_client.get_session("anythingllm")
+
+
 def _headers():
     h = {}
     if API_KEY:
@@ -23,15 +29,17 @@ def _headers():
     return h
 
 
-def upload_document(content, filename, workspace_slug, timeout=60):
+def upload_document(content, filename, workspace_slug, timeout=None):
     """Upload a markdown/string as a document to AnythingLLM.
     Returns (doc_id, full_response_dict) on success, (None, resp) on failure.
     """
     upload_url = f"{BASE_URL}/api/v1/document/upload"
     files = {'file': (filename, content, 'text/markdown')}
     try:
-        r = requests.post(upload_url, headers=_headers(), files=files, timeout=timeout)
+        with metrics.ANYTHING_LATENCY.time(operation="upload"):
+            r = _session().post(upload_url, headers=_headers(), files=files, timeout=timeout or http_client.timeout_for("upload"))
     except Exception as e:
+        metrics.ANYTHING_ERRORS.inc(operation="upload")
         logger.warning(f"[upload] connection error: {e}")
         return None, None
 
@@ -82,134 +90,296 @@ def upload_document(content, filename, workspace_slug, timeout=60):
         logger.warning(f"[upload] success but no id found in response: keys={list(resp.keys())}")
         return None, resp
     else:
+        metrics.ANYTHING_ERRORS.inc(operation="upload")
         logger.warning(f"[upload] server rejected upload: {r.status_code} {r.text}")
         return None, resp
 
 
-def delete_document(doc_id, workspace_slug=None, timeout=30):
-    """Try several deletion endpoints. Return True if any deletion reports success."""
+class EndpointSelector:
+    """Remember which endpoint variant the AnythingLLM server accepts.
+
+    The choice is persisted per operation ("delete", ...) in the state dir with
+    a TTL, so a restarted worker goes straight to the working variant instead
+    of probing the failing ones first. A variant is forgotten as soon as it
+    fails, which sends the next call back through the full fallback order.
+    """
+
+    def __init__(self, path=None, ttl_seconds=None):
+        self.path = path or os.path.join(worker_config.STATE_DEFAULT_PATH, 'anything_endpoints.json')
+        self.ttl_seconds = worker_config.ENDPOINT_CACHE_TTL_HOURS * 3600 if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._choices = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f) or {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        try:
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            # Atomic write: a crash mid-write must not leave a truncated state file
+            with tempfile.NamedTemporaryFile('w', delete=False, dir=directory, encoding='utf-8', suffix='.tmp') as tf:
+                json.dump(self._choices, tf, indent=2)
+                tempname = tf.name
+            os.replace(tempname, self.path)
+        except OSError as e:
+            logger.debug(f"[endpoints] Unable to persist endpoint choices: {e}")
+
+    def get(self, operation):
+        with self._lock:
+            choice = self._choices.get(operation)
+            if not choice:
+                return None
+            if time.time() - choice.get('detected_at', 0) > self.ttl_seconds:
+                return None
+            return choice.get('variant')
+
+    def order(self, operation, variants):
+        """Return variants with the remembered one first."""
+        cached = self.get(operation)
+        if cached in variants:
+            return [cached] + [v for v in variants if v != cached]
+        return list(variants)
+
+    def remember(self, operation, variant):
+        with self._lock:
+            current = self._choices.get(operation) or {}
+            if current.get('variant') == variant and time.time() - current.get('detected_at', 0) <= self.ttl_seconds:
+                return
+            self._choices[operation] = {'variant': variant, 'detected_at': time.time()}
+            self._save()
+        logger.info(f"[endpoints] Using '{variant}' endpoint for {operation}")
+
+    def forget(self, operation):
+        with self._lock:
+            if self._choices.pop(operation, None) is not None:
+                self._save()
+
+
+endpoints = EndpointSelector()
+
+
+def _delete_rest(doc_ids, workspace_slug, timeout):
+    # DELETE /api/v1/document/{id} (one document per request)
+    url = f"{BASE_URL}/api/v1/document/{doc_ids[0]}"
+    r = _session().delete(url, headers=_headers(), timeout=timeout)
+    logger.debug(f"[delete] DELETE endpoint response: {r.status_code} {r.text}")
+    return r.status_code in (200, 204)
+
+
+def _delete_bulk(doc_ids, workspace_slug, timeout):
+    # POST /api/v1/document/delete {ids: [...]} (several documents per request)
+    url = f"{BASE_URL}/api/v1/document/delete"
+    r = _session().post(url, headers={**_headers(), 'Content-Type': 'application/json'}, json={'ids': list(doc_ids)}, timeout=timeout)
+    logger.debug(f"[delete] Bulk delete response: {r.status_code} {r.text}")
+    return r.status_code == 200 and bool(r.json().get('success') or r.json().get('deleted'))
+
+
+def _delete_workspace(doc_ids, workspace_slug, timeout):
+    # POST /api/v1/workspace/{ws}/document/{id}/delete
+    url = f"{BASE_URL}/api/v1/workspace/{workspace_slug}/document/{doc_ids[0]}/delete"
+    r = _session().post(url, headers=_headers(), timeout=timeout)
+    logger.debug(f"[delete] Workspace delete response: {r.status_code} {r.text}")
+    return r.status_code == 200 and bool(r.json().get('success'))
+
+
+# Variants in fallback order when no choice is remembered
+_DELETE_VARIANTS = {
+    'rest': _delete_rest,
+    'bulk': _delete_bulk,
+    'workspace': _delete_workspace,
+}
+
+
+def delete_document(doc_id, workspace_slug=None, timeout=None):
+    """Delete a document, starting with the endpoint variant known to work.
+    Falls back to the other variants only when it fails. Return True on success."""
     if not doc_id:
         return False
 
     logger.debug(f"[delete] Attempting to delete document {doc_id}, workspace: {workspace_slug}")
+    timeout = timeout or http_client.timeout_for("delete")
+    cached = endpoints.get('delete')
 
-    # 1) Try DELETE /api/v1/document/{id}
-    try:
-        url = f"{BASE_URL}/api/v1/document/{doc_id}"
-        r = requests.delete(url, headers=_headers(), timeout=timeout)
-        logger.debug(f"[delete] DELETE endpoint response: {r.status_code} {r.text}")
-        if r.status_code in (200, 204):
-            logger.info(f"[delete] Deleted document {doc_id} via DELETE endpoint")
+    for variant in endpoints.order('delete', list(_DELETE_VARIANTS)):
+        if variant == 'workspace' and not workspace_slug:
+            continue
+        try:
+            with metrics.ANYTHING_LATENCY.time(operation="delete"):
+                ok = _DELETE_VARIANTS[variant]([doc_id], workspace_slug, timeout)
+        except Exception as e:
+            logger.debug(f"[delete] {variant} attempt failed: {e}")
+            ok = False
+        if ok:
+            logger.info(f"[delete] Deleted document {doc_id} via {variant} endpoint")
+            endpoints.remember('delete', variant)
             return True
-    except Exception as e:
-        logger.debug(f"[delete] DELETE attempt failed: {e}")
+        if variant == cached:
+            logger.info(f"[delete] Remembered '{variant}' endpoint failed, falling back")
+            endpoints.forget('delete')
 
-    # 2) Try POST /api/v1/document/delete {ids: [...]} (some servers use this)
-    try:
-        url = f"{BASE_URL}/api/v1/document/delete"
-        r = requests.post(url, headers={**_headers(), 'Content-Type': 'application/json'}, json={'ids': [doc_id]}, timeout=timeout)
-        logger.debug(f"[delete] Bulk delete response: {r.status_code} {r.text}")
-        if r.status_code == 200 and (r.json().get('success') or r.json().get('deleted')):
-            logger.info(f"[delete] Deleted document {doc_id} via bulk delete")
-            return True
-    except Exception as e:
-        logger.debug(f"[delete] bulk delete attempt failed: {e}")
+    metrics.ANYTHING_ERRORS.inc(operation="delete")
+    logger.warning(f"[delete] Unable to delete document {doc_id} - tried multiple endpoints")
+    return False
 
-    # 3) Workspace-scoped delete: POST /api/v1/workspace/{ws}/document/{id}/delete
-    if workspace_slug:
+
+def delete_documents(doc_ids, workspace_slug=None, timeout=None):
+    """Delete several documents, in a single request when the server supports
+    the bulk endpoint. Return {doc_id: success}."""
+    doc_ids = [d for d in dict.fromkeys(doc_ids) if d]
+    if not doc_ids:
+        return {}
+    timeout = timeout or http_client.timeout_for("delete")
+
+    if len(doc_ids) > 1 and endpoints.get('delete') in (None, 'bulk'):
         try:
-            url = f"{BASE_URL}/api/v1/workspace/{workspace_slug}/document/{doc_id}/delete"
-            r = requests.post(url, headers=_headers(), timeout=timeout)
-            logger.debug(f"[delete] Workspace delete response: {r.status_code} {r.text}")
-            if r.status_code == 200 and r.json().get('success'):
-                logger.info(f"[delete] Deleted document {doc_id} via workspace-scoped endpoint")
-                return True
+            with metrics.ANYTHING_LATENCY.time(operation="delete"):
+                deleted = _delete_bulk(doc_ids, workspace_slug, timeout)
+            if deleted:
+                logger.info(f"[delete] Deleted {len(doc_ids)} documents via bulk endpoint")
+                endpoints.remember('delete', 'bulk')
+                return {d: True for d in doc_ids}
         except Exception as e:
-            logger.debug(f"[delete] workspace delete attempt failed: {e}")
+            logger.debug(f"[delete] bulk attempt failed: {e}")
+        if endpoints.get('delete') == 'bulk':
+            endpoints.forget('delete')
 
-    logger.warning(f"[delete] Unable to delete document {doc_id} - tried multiple endpoints")
-    return False
+    return {d: delete_document(d, workspace_slug, timeout) for d in doc_ids}
 
 
-def trigger_embeddings(workspace_slug, timeout=30):
+def trigger_embeddings(workspace_slug, timeout=None):
     try:
         url = f"{BASE_URL}/api/v1/workspace/{workspace_slug}/update-embeddings"
-        r = requests.post(url, headers=_headers(), timeout=timeout)
+        with metrics.ANYTHING_LATENCY.time(operation="embeddings"):
+            r = _session().post(url, headers=_headers(), timeout=timeout or http_client.timeout_for("embeddings"))
         if r.status_code == 200:
             logger.info(f"[embeddings] Triggered embeddings for workspace {workspace_slug}")
             return True
         logger.warning(f"[embeddings] Non-200 response: {r.status_code} {r.text}")
     except Exception as e:
         logger.warning(f"[embeddings] Error triggering embeddings: {e}")
+    metrics.ANYTHING_ERRORS.inc(operation="embeddings")
     return False
 
 
-def _read_manifest():
-    path = os.path.join(ARCHIVE_DIR, 'manifest.json')
-    if not os.path.exists(path):
-        return {}
+class EmbeddingDebouncer:
+    """Collect the workspaces touched during a cycle and refresh each one once.
+
+    touch() records a workspace instead of re-embedding it after every upload.
+    flush() triggers one update per pending workspace and returns
+    {workspace_slug: success}. With quiet_seconds > 0 a workspace is also
+    refreshed on its own once it has seen no upload for that long.
+    """
+
+    def __init__(self, quiet_seconds=None):
+        self.quiet_seconds = worker_config.EMBED_QUIET_SECONDS if quiet_seconds is None else quiet_seconds
+        self._pending = {}   # slug -> time of the last upload
+        self._timers = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def touch(self, workspace_slug):
+        with self._lock:
+            self._pending[workspace_slug] = time.monotonic()
+            if self.quiet_seconds > 0:
+                old = self._timers.pop(workspace_slug, None)
+                if old:
+                    old.cancel()
+                timer = threading.Timer(self.quiet_seconds, self._fire, args=(workspace_slug,))
+                timer.daemon = True
+                self._timers[workspace_slug] = timer
+                timer.start()
+
+    def _fire(self, workspace_slug):
+        with self._lock:
+            last = self._pending.get(workspace_slug)
+            # Upload arrivé entre-temps : le timer suivant s'en charge
+            if last is None or time.monotonic() - last < self.quiet_seconds:
+                return
+            del self._pending[workspace_slug]
+            self._timers.pop(workspace_slug, None)
+        # Appel HTTP hors verrou, résultat enregistré sous verrou (lu par flush())
+        ok = trigger_embeddings(workspace_slug)
+        with self._lock:
+            self._results[workspace_slug] = ok
+
+    def flush(self):
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            pending = list(self._pending)
+            self._pending.clear()
+        fired = {slug: trigger_embeddings(slug) for slug in pending}
+        with self._lock:
+            results, self._results = self._results, {}
+        results.update(fired)
+        return results
+
+
+_manifest_store = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest():
+    """Return the shared ManifestStore (SQLite index), created on first use.
+    An existing manifest.json is migrated automatically at that point."""
+    global _manifest_store
+    with _manifest_lock:
+        if _manifest_store is None:
+            _manifest_store = ManifestStore()
+        return _manifest_store
+
+
+def manifest_batch():
+    """Context manager grouping manifest writes of a cycle in one transaction."""
+    return get_manifest().batch()
+
+
+def queue_stale_document(doc_id, workspace_slug):
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f) or {}
+        get_manifest().queue_stale(doc_id, workspace_slug)
+        return True
     except Exception:
-        return {}
+        logger.exception(f"[manifest] Failed to queue deletion of {doc_id}.")
+        return False
 
 
-def _write_manifest(manifest):
-    path = os.path.join(ARCHIVE_DIR, 'manifest.json')
+def commit_manifest():
+    """Commit pending manifest writes now, even inside a manifest_batch()."""
     try:
-        os.makedirs(ARCHIVE_DIR, exist_ok=True)
-        with tempfile.NamedTemporaryFile('w', delete=False, dir=ARCHIVE_DIR, encoding='utf-8') as tf:
-            json.dump(manifest, tf, ensure_ascii=False, indent=2)
-            tmp = tf.name
-        os.replace(tmp, path)
+        get_manifest().commit()
         return True
     except Exception:
-        logger.exception(f"[manifest] Failed to write manifest to {path}.")
+        logger.exception("[manifest] Commit failed.")
         return False
 
 
 def find_entry_by_filename(filename):
-    manifest = _read_manifest()
-    for k, v in manifest.items():
-        if v.get('filename') == filename or v.get('filepath', '').endswith(filename):
-            return k, v
-    return None, None
+    try:
+        entry = get_manifest().get(filename)
+    except Exception:
+        logger.exception(f"[manifest] Lookup failed for {filename}.")
+        return None, None
+    if entry is None:
+        return None, None
+    return filename, entry
 
 
 def update_entry_docid(filename, doc_id):
-    manifest = _read_manifest()
-    changed = False
-    for k, v in manifest.items():
-        if v.get('filename') == filename or v.get('filepath', '').endswith(filename):
-            # Set previous to current before updating
-            if 'any_document_id' in v:
-                v['previous_any_document_id'] = v['any_document_id']
-            v['any_document_id'] = doc_id
-            manifest[k] = v
-            changed = True
-            break
-    if not changed:
-        # Add new entry if not found
-        key = filename  # use filename as key
-        manifest[key] = {
-            'filename': filename,
-            'any_document_id': doc_id
-        }
-        changed = True
-    if changed:
-        return _write_manifest(manifest)
-    return False
+    try:
+        return get_manifest().set_document_id(filename, doc_id)
+    except Exception:
+        logger.exception(f"[manifest] Failed to update doc id for {filename}.")
+        return False
 
-def update_entry_timestamp(filename, timestamp):
-    manifest = _read_manifest()
-    changed = False
-    for k, v in manifest.items():
-        if v.get('filename') == filename or v.get('filepath', '').endswith(filename):
-            v['last_message_timestamp'] = timestamp
-            manifest[k] = v
-            changed = True
-            break
-    if changed:
-        return _write_manifest(manifest)
-    return False
+def update_entry_timestamp(filename, timestamp, chat_id=None):
+    try:
+        return get_manifest().set_timestamp(filename, timestamp, chat_id)
+    except Exception:
+        logger.exception(f"[manifest] Failed to update timestamp for {filename}.")
+        return False
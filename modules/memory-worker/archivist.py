@@ -1,4 +1,5 @@
 import sqlite3
+import sys
 import json
 import os
 import time
@@ -7,8 +8,10 @@ import tempfile
 import hashlib
 import logging
 from datetime import datetime, timedelta, time as dt_time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import config as worker_config # Module de configuration partagé
+import metrics
+import storage
 
 # --- CONFIGURATION ---
 # DB_PATH est maintenant récupéré via worker_config
@@ -19,6 +22,11 @@ import config as worker_config # Module de configuration partagé
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger('archivist')
 
+# Version du format des archives JSON. v2 : chaque message porte aussi "ts"
+# (createdAt en epoch ms, brut) et "chat_id" (workspace_chats.id) à côté de
+# la date lisible "date". Les archives v1 (sans "schema") restent lisibles.
+ARCHIVE_SCHEMA_VERSION = 2
+
 # --- UTILITAIRES ---
 def clean_filename(text: str) -> str:
     """
@@ -105,6 +113,32 @@ def get_db_connection() -> sqlite3.Connection:
     """
     return sqlite3.connect(f"file:{worker_config.DB_DEFAULT_PATH}?mode=ro", uri=True)
 
+def content_digest(data: Dict[str, Any]) -> str:
+    """
+    Empreinte stable du contenu d'une archive : SHA-256 du JSON canonique
+    (clés triées, sans espaces), indépendante de l'indentation sur disque.
+    """
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def _digest_path(ws_dir: str, filename: str) -> str:
+    # Fichier caché : ignoré par le glob du summarizer et par delete_ghost_files
+    return os.path.join(ws_dir, f".{filename}.sha256")
+
+def read_digest(digest_path: str) -> Optional[str]:
+    try:
+        with open(digest_path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def write_digest(digest_path: str, digest: str):
+    try:
+        with open(digest_path, 'w', encoding='utf-8') as f:
+            f.write(digest)
+    except OSError as e:
+        logger.debug(f"Impossible d'écrire l'empreinte {digest_path}: {e}")
+
 def save_json(workspace_name: str, filename: str, data: Dict[str, Any]):
     """
     Écrit le JSON seulement si le contenu a changé pour éviter de réveiller
@@ -122,31 +156,39 @@ def save_json(workspace_name: str, filename: str, data: Dict[str, Any]):
 
     filepath = os.path.join(ws_dir, f"{filename}.json")
 
-    # --- 🔽 AJOUT : VÉRIFICATION INTELLIGENTE 🔽 ---
+    # --- 🔽 VÉRIFICATION PAR EMPREINTE 🔽 ---
+    # L'empreinte du contenu est stockée à côté de l'archive (.<nom>.sha256) :
+    # inutile de relire et parser l'ancien JSON pour savoir s'il a changé.
+    digest = content_digest(data)
+    digest_path = _digest_path(ws_dir, filename)
     if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
-            
-            # On compare le contenu (Python gère très bien la comparaison de dicts profonds)
+        stored = read_digest(digest_path)
+        if stored == digest:
             # Si c'est identique, on ne touche à rien (la date de modif reste vieille)
-            if existing_data == data:
-                # logger.debug(f"   💤 [ARCHIVIST] Pas de changement pour {filename}")
-                return
-        except Exception as e:
-            logger.warning(f"Impossible de lire l'ancien fichier {filepath} pour comparaison: {e}")
-    # --- 🔼 FIN AJOUT 🔼 ---
+            metrics.ARCHIVES.inc(result="skipped")
+            return
+        if stored is None:
+            # Archive antérieure aux empreintes : comparaison complète une seule fois
+            try:
+                existing_data = storage.read_json(filepath)
+                if existing_data == data:
+                    write_digest(digest_path, digest)
+                    metrics.ARCHIVES.inc(result="skipped")
+                    return
+            except Exception as e:
+                logger.warning(f"Impossible de lire l'ancien fichier {filepath} pour comparaison: {e}")
+    # --- 🔼 FIN VÉRIFICATION 🔼 ---
 
     # Si on arrive ici, c'est que le fichier est nouveau ou différent
+    # (écrit compressé ou non selon STORAGE_COMPRESSION ; l'empreinte porte sur le contenu)
     try:
-        with tempfile.NamedTemporaryFile('w', delete=False, dir=ws_dir, encoding='utf-8', suffix='.tmp') as tf:
-            json.dump(data, tf, indent=2, ensure_ascii=False)
-            tempname = tf.name
-        
-        os.replace(tempname, filepath)
+        storage.write_json(filepath, data)
         force_permissions(filepath)
+        write_digest(digest_path, digest)
+        metrics.ARCHIVES.inc(result="written")
         logger.info(f"   💾 [ARCHIVIST] Sauvegardé (Nouveau/Modifié) : {safe_ws}/{filename}.json")
     except Exception as e:
+        metrics.ARCHIVES.inc(result="error")
         logger.error(f"Erreur écriture JSON {filepath}: {e}")
 
 # --- CLEANUP ---
@@ -170,103 +212,334 @@ def delete_ghost_files(workspace_name: str, valid_ids: List[int]):
                 fid = int(parts[1])
                 if fid not in valid_ids:
                     os.remove(f)
+                    if os.path.exists(_digest_path(ws_dir, base)):
+                        os.remove(_digest_path(ws_dir, base))
                     print(f"   🗑️ [CLEANUP] Fantôme supprimé : {fname}")
         except Exception as e:
             logger.debug(f"Erreur lors du nettoyage du fichier fantôme {fname}: {e}")
 
-# --- SCAN PROCESS ---
-def process_workspace(cursor: sqlite3.Cursor, ws_id: int, ws_name: str):
+# --- ÉTAT INCRÉMENTAL ---
+STATE_FILENAME = "archivist_state.json"
+
+def _state_path() -> str:
+    return os.path.join(worker_config.STATE_DEFAULT_PATH, STATE_FILENAME)
+
+def load_state() -> Dict[str, Any]:
     """
-    Traite un espace de travail AnythingLLM : extrait les threads nommés
-    et le thread default (messages sans thread_id) et les sauvegarde en JSON.
+    Charge l'état incrémental : par workspace, le dernier workspace_chats.id vu
+    et l'ensemble des threads déjà archivés. Retourne un état vide si absent.
     """
-    logger.info(f"📂 Workspace : {ws_name}")
+    path = _state_path()
+    if not os.path.exists(path):
+        return {"workspaces": {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f) or {}
+        state.setdefault("workspaces", {})
+        return state
+    except Exception as e:
+        logger.warning(f"État archivist illisible ({path}), rescan complet: {e}")
+        return {"workspaces": {}}
 
-    # 1. THREADS NOMMÉS (Table: workspace_threads / Col: workspace_id)
-    cursor.execute("SELECT id, name FROM workspace_threads WHERE workspace_id = ?", (ws_id,))
-    threads = cursor.fetchall()
-    valid_ids = [t['id'] for t in threads]
+def save_state(state: Dict[str, Any]):
+    """
+    Écrit l'état incrémental de façon atomique (fichier temporaire + replace).
+    """
+    state_dir = worker_config.STATE_DEFAULT_PATH
+    path = _state_path()
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', delete=False, dir=state_dir, encoding='utf-8', suffix='.tmp') as tf:
+            json.dump(state, tf, indent=2, ensure_ascii=False)
+            tempname = tf.name
+        os.replace(tempname, path)
+        force_permissions(path)
+    except Exception as e:
+        logger.error(f"Erreur écriture état archivist {path}: {e}")
 
-    for thread in threads:
-        t_id = thread['id']
-        t_name = thread['name']
+def load_archive(workspace_name: str, filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Relit une archive JSON existante (None si absente ou illisible).
+    """
+    filepath = os.path.join(worker_config.ARCHIVE_DEFAULT_PATH, clean_filename(workspace_name), f"{filename}.json")
+    if not os.path.exists(filepath):
+        return None
+    try:
+        return storage.read_json(filepath)
+    except Exception as e:
+        logger.warning(f"Impossible de relire l'archive {filepath}: {e}")
+        return None
 
-        # Table: workspace_chats / Col: thread_id
-        cursor.execute("SELECT prompt, response, createdAt FROM workspace_chats WHERE thread_id = ? ORDER BY id ASC", (t_id,))
-        messages = cursor.fetchall()
-        if not messages:
-            continue
+def remove_archive(workspace_name: str, filename: str):
+    """
+    Supprime une archive (ex: ancien nom d'un thread renommé).
+    """
+    ws_dir = os.path.join(worker_config.ARCHIVE_DEFAULT_PATH, clean_filename(workspace_name))
+    filepath = os.path.join(ws_dir, f"{filename}.json")
+    try:
+        if os.path.exists(_digest_path(ws_dir, filename)):
+            os.remove(_digest_path(ws_dir, filename))
+        if os.path.exists(filepath):
+            os.remove(filepath)
+            print(f"   🗑️ [CLEANUP] Ancienne archive supprimée : {filename}.json")
+    except Exception as e:
+        logger.debug(f"Erreur suppression archive {filepath}: {e}")
 
-        # If thread name is missing or is the generic 'Thread', prefer the first user message
-        first_user = messages[0]['prompt'] if messages and messages[0] and messages[0]['prompt'] else None
-        if t_name and str(t_name).strip() and str(t_name).strip().lower() != 'thread':
-            final_title = t_name
-        elif first_user:
-            # use first sentence of first_user
-            sentence = str(first_user).split('\n')[0]
-            sentence = sentence.split('.')[0].split('?')[0].split('!')[0].strip()
-            final_title = sentence if sentence else f"Thread_{t_id}"
-        else:
-            final_title = f"Thread_{t_id}"
-
-        # Ajout de format_date() ici
-        msgs_formatted = []
-        for m in messages:
-            msgs_formatted.append({
-                "date": format_date(m['createdAt']),
-                "user": m['prompt'],
-                "ai": clean_ai_response(m['response'])
-            })
-
-        data = {
-            "id": t_id,
-            "type": "thread",
-            "workspace": ws_name,
-            "title": final_title,
-            "messages": msgs_formatted
+# --- SCAN PROCESS ---
+def resolve_thread_title(t_id: int, t_name: Optional[str], first_user: Optional[str]) -> str:
+    """
+    Titre du thread : son nom s'il est explicite, sinon la première phrase
+    du premier message utilisateur, sinon Thread_<id>.
+    """
+    if t_name and str(t_name).strip() and str(t_name).strip().lower() != 'thread':
+        return t_name
+    if first_user:
+        # use first sentence of first_user
+        sentence = str(first_user).split('\n')[0]
+        sentence = sentence.split('.')[0].split('?')[0].split('!')[0].strip()
+        return sentence if sentence else f"Thread_{t_id}"
+    return f"Thread_{t_id}"
+
+def format_messages(rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+    """
+    Convertit des lignes workspace_chats en messages d'archive.
+    """
+    return [
+        {
+            "date": format_date(m['createdAt']),
+            "ts": normalize_to_ms(m['createdAt']),
+            "chat_id": m['id'],
+            "user": m['prompt'],
+            "ai": clean_ai_response(m['response'])
         }
-        # filename contains cleaned title and thread id for traceability
-        save_json(ws_name, f"{clean_filename(final_title)}_{t_id}", data)
+        for m in rows
+    ]
 
-    # 2. DEFAULT THREAD (Table: workspace_chats / Col: workspaceId)
+def is_current_schema(data: Dict[str, Any]) -> bool:
+    """
+    Vrai si l'archive est au format courant (on ne complète pas une archive
+    v1 avec des messages v2 : elle est reconstruite entièrement).
+    """
+    return data.get("schema") == ARCHIVE_SCHEMA_VERSION
+
+def iter_thread_chats(cursor: sqlite3.Cursor, ws_id: int, since_id: int = 0,
+                      batch_size: Optional[int] = None) -> Iterator[Tuple[Optional[int], List[sqlite3.Row]]]:
+    """
+    Lit tous les chats d'un workspace en une seule requête triée par
+    (thread_id, id) et émet un thread à la fois : (thread_id, lignes).
+    Le curseur est parcouru par lots de taille fixe, la mémoire reste donc
+    bornée par le plus gros thread. thread_id vaut None pour le thread default.
+    """
+    batch_size = batch_size or worker_config.ARCHIVE_FETCH_BATCH
+    cursor.execute("""
+        SELECT id, thread_id, prompt, response, createdAt
+        FROM workspace_chats
+        WHERE workspaceId = ? AND id > ?
+        ORDER BY thread_id, id
+    """, (ws_id, since_id))
+
+    current_id: Optional[int] = None
+    current: List[sqlite3.Row] = []
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        metrics.DB_ROWS_READ.inc(len(batch))
+        for row in batch:
+            if current and row['thread_id'] != current_id:
+                yield current_id, current
+                current = []
+            current_id = row['thread_id']
+            current.append(row)
+    if current:
+        yield current_id, current
+
+def write_thread_archive(ws_name: str, t_id: int, t_name: Optional[str], messages: List[sqlite3.Row]) -> str:
+    """
+    Écrit l'archive complète d'un thread nommé et retourne son nom de fichier.
+    """
+    # If thread name is missing or is the generic 'Thread', prefer the first user message
+    final_title = resolve_thread_title(t_id, t_name, messages[0]['prompt'])
+    data = {
+        "schema": ARCHIVE_SCHEMA_VERSION,
+        "id": t_id,
+        "type": "thread",
+        "workspace": ws_name,
+        "title": final_title,
+        "messages": format_messages(messages)
+    }
+    # filename contains cleaned title and thread id for traceability
+    filename = f"{clean_filename(final_title)}_{t_id}"
+    save_json(ws_name, filename, data)
+    return filename
+
+def write_default_archive(ws_id: int, ws_name: str, messages: List[sqlite3.Row]):
+    """
+    Écrit l'archive complète du thread default (messages sans thread_id).
+    """
+    data = {
+        "schema": ARCHIVE_SCHEMA_VERSION,
+        "id": "default",
+        "type": "default_thread",
+        "workspace": ws_name,
+        "title": "defaultThread",
+        "messages": format_messages(messages)
+    }
+    # name default files explicitly so you can spot them easily
+    save_json(ws_name, f"defaultThread_{ws_id}", data)
+
+def archive_thread(cursor: sqlite3.Cursor, ws_name: str, t_id: int, t_name: Optional[str]) -> Optional[str]:
+    """
+    Reconstruit l'archive d'un seul thread nommé (thread renommé ou archive perdue).
+    Retourne le nom de fichier ou None si le thread est vide.
+    """
+    # Table: workspace_chats / Col: thread_id
+    cursor.execute("SELECT id, prompt, response, createdAt FROM workspace_chats WHERE thread_id = ? ORDER BY id ASC", (t_id,))
+    messages = cursor.fetchall()
+    metrics.DB_ROWS_READ.inc(len(messages))
+    if not messages:
+        return None
+    return write_thread_archive(ws_name, t_id, t_name, messages)
+
+def archive_default_thread(cursor: sqlite3.Cursor, ws_id: int, ws_name: str):
+    """
+    Reconstruit l'archive du thread default seule (archive perdue).
+    """
     # ATTENTION: Ici on utilise workspaceId (CamelCase) comme tu l'as validé
     cursor.execute("""
-        SELECT prompt, response, createdAt
+        SELECT id, prompt, response, createdAt
         FROM workspace_chats
         WHERE workspaceId = ? AND thread_id IS NULL
         ORDER BY id ASC
     """, (ws_id,))
-
     default_msgs = cursor.fetchall()
+    metrics.DB_ROWS_READ.inc(len(default_msgs))
     if default_msgs:
-        # Ajout de format_date() ici aussi
-        msgs_formatted = []
-        for m in default_msgs:
-            msgs_formatted.append({
-                "date": format_date(m['createdAt']),
-                "user": m['prompt'],
-                "ai": clean_ai_response(m['response'])
-            })
-        data = {
-            "id": "default",
-            "type": "default_thread",
-            "workspace": ws_name,
-            "title": "defaultThread",
-            "messages": msgs_formatted
-        }
-        # name default files explicitly so you can spot them easily
-        save_json(ws_name, f"defaultThread_{ws_id}", data)
+        write_default_archive(ws_id, ws_name, default_msgs)
+
+def process_workspace(cursor: sqlite3.Cursor, ws_id: int, ws_name: str) -> Dict[str, Any]:
+    """
+    Traite un espace de travail AnythingLLM : extrait les threads nommés
+    et le thread default (messages sans thread_id) et les sauvegarde en JSON.
+    Retourne l'état incrémental du workspace (dernier id vu, threads archivés).
+    """
+    logger.info(f"📂 Workspace : {ws_name}")
+    last_chat_id = 0
+    known_threads: Dict[str, Dict[str, Any]] = {}
+
+    # 1. THREADS NOMMÉS (Table: workspace_threads / Col: workspace_id)
+    cursor.execute("SELECT id, name FROM workspace_threads WHERE workspace_id = ?", (ws_id,))
+    threads = {t['id']: t['name'] for t in cursor.fetchall()}
+
+    # 2. CHATS (Table: workspace_chats / Col: workspaceId) : une seule requête,
+    # un thread à la fois (le thread default, thread_id NULL, arrive en premier)
+    for t_id, messages in iter_thread_chats(cursor, ws_id):
+        last_chat_id = max(last_chat_id, messages[-1]['id'])
+        if t_id is None:
+            write_default_archive(ws_id, ws_name, messages)
+        elif t_id in threads:
+            filename = write_thread_archive(ws_name, t_id, threads[t_id], messages)
+            known_threads[str(t_id)] = {"name": threads[t_id], "file": filename}
+
     # 3. NETTOYAGE
-    delete_ghost_files(ws_name, valid_ids)
+    delete_ghost_files(ws_name, list(threads))
 
-def scan_all():
+    return {"name": ws_name, "last_chat_id": last_chat_id, "threads": known_threads}
+
+def process_workspace_incremental(cursor: sqlite3.Cursor, ws_id: int, ws_name: str, ws_state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Variante incrémentale de process_workspace : ne lit que les chats dont l'id
+    dépasse le dernier id vu et ne touche qu'aux archives des threads concernés
+    (messages ajoutés à la fin de l'archive existante).
+    """
+    mark = int(ws_state.get("last_chat_id") or 0)
+    known_threads: Dict[str, Dict[str, Any]] = dict(ws_state.get("threads") or {})
+
+    cursor.execute("SELECT MAX(id) AS max_id FROM workspace_chats WHERE workspaceId = ?", (ws_id,))
+    max_id = cursor.fetchone()['max_id'] or 0
+    if max_id < mark or ws_state.get("name") != ws_name:
+        # Base réinitialisée ou workspace renommé : l'état n'est plus fiable
+        logger.warning(f"⚠️ État incohérent pour {ws_name}, rescan complet du workspace.")
+        return process_workspace(cursor, ws_id, ws_name)
+
+    cursor.execute("SELECT id, name FROM workspace_threads WHERE workspace_id = ?", (ws_id,))
+    threads = {str(t['id']): t['name'] for t in cursor.fetchall()}
+
+    # Threads supprimés depuis le dernier cycle
+    removed = set(known_threads) - set(threads)
+    if removed:
+        delete_ghost_files(ws_name, [int(t) for t in threads])
+        for tid in removed:
+            known_threads.pop(tid, None)
+
+    # Threads renommés : le titre (donc le nom de fichier) change, on reconstruit
+    to_rebuild = {tid for tid, info in known_threads.items() if info.get("name") != threads[tid]}
+    rebuild_default = False
+    new_count = 0
+
+    # Pas d'autre requête sur le curseur pendant le streaming : les
+    # reconstructions complètes sont faites après coup.
+    for t_id, rows in iter_thread_chats(cursor, ws_id, since_id=mark):
+        mark = max(mark, rows[-1]['id'])
+        new_count += len(rows)
+        if t_id is None:
+            # Default thread : ajout en fin d'archive, reconstruction si absente
+            filename = f"defaultThread_{ws_id}"
+            data = load_archive(ws_name, filename)
+            if data is None or not is_current_schema(data):
+                rebuild_default = True
+            else:
+                data["messages"].extend(format_messages(rows))
+                save_json(ws_name, filename, data)
+            continue
+        tid = str(t_id)
+        if tid not in threads:
+            continue  # Chats d'un thread absent de workspace_threads : ignorés comme en scan complet
+        info = known_threads.get(tid)
+        data = load_archive(ws_name, info["file"]) if info and tid not in to_rebuild else None
+        if data is None or not is_current_schema(data):
+            to_rebuild.add(tid)
+            continue
+        data["messages"].extend(format_messages(rows))
+        save_json(ws_name, info["file"], data)
+
+    if not new_count and not to_rebuild:
+        logger.debug(f"📂 Workspace {ws_name} : aucun changement.")
+        return {"name": ws_name, "last_chat_id": mark, "threads": known_threads}
+
+    logger.info(f"📂 Workspace : {ws_name} (incrémental, {new_count} nouveaux chats)")
+
+    if rebuild_default:
+        archive_default_thread(cursor, ws_id, ws_name)
+
+    for tid in to_rebuild:
+        old_file = (known_threads.get(tid) or {}).get("file")
+        filename = archive_thread(cursor, ws_name, int(tid), threads[tid])
+        if not filename:
+            known_threads.pop(tid, None)
+            continue
+        if old_file and old_file != filename:
+            remove_archive(ws_name, old_file)
+        known_threads[tid] = {"name": threads[tid], "file": filename}
+
+    return {"name": ws_name, "last_chat_id": mark, "threads": known_threads}
+
+def scan_all(full: Optional[bool] = None):
     """
     Scanne tous les espaces de travail dans la base de données AnythingLLM
     et archive leurs conversations.
+
+    full: force un rescan complet (réparation). Par défaut, le mode est
+    incrémental si ARCHIVE_INCREMENTAL est actif et qu'un état existe.
     """
     if not os.path.exists(worker_config.DB_DEFAULT_PATH):
         logger.error("❌ DB introuvable: %s", worker_config.DB_DEFAULT_PATH)
         raise FileNotFoundError(f"Database not found at {worker_config.DB_DEFAULT_PATH}") # Lève une erreur pour le retry
+    if full is None:
+        full = not worker_config.ARCHIVE_INCREMENTAL
+    state = {"workspaces": {}} if full else load_state()
+    new_state: Dict[str, Any] = {"workspaces": {}}
+
     conn = get_db_connection()
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
@@ -274,8 +547,14 @@ def scan_all():
         cursor.execute("SELECT id, name FROM workspaces")
         workspaces = cursor.fetchall()
         for ws in workspaces:
-            process_workspace(cursor, ws['id'], ws['name'])
-        logger.info("✅ Cycle terminé.")
+            ws_key = str(ws['id'])
+            ws_state = state["workspaces"].get(ws_key)
+            if ws_state is None:
+                new_state["workspaces"][ws_key] = process_workspace(cursor, ws['id'], ws['name'])
+            else:
+                new_state["workspaces"][ws_key] = process_workspace_incremental(cursor, ws['id'], ws['name'], ws_state)
+        save_state(new_state)
+        logger.info(f"✅ Cycle terminé ({'complet' if full else 'incrémental'}).")
     except Exception as e:
         logger.exception("❌ Erreur lors du scan_all: %s", e)
         raise # Re-lève l'exception pour que tenacity puisse la capturer
@@ -283,7 +562,7 @@ def scan_all():
         conn.close()
 
 # Fonction appelée par main.py
-def run_archiving():
+def run_archiving(full: Optional[bool] = None):
    """
    Lance le processus d'archivage des conversations AnythingLLM.
    Cette fonction est désormais appelée par main.py.
@@ -292,7 +571,7 @@ def run_archiving():
 
    try:
        logger.info("🚀 Lancement du scan initial...")
-       scan_all()
+       scan_all(full=full)
    except Exception as e:
        logger.exception("❌ Erreur pendant l'archivage initial: %s", e)
        raise
@@ -303,5 +582,6 @@ if __name__ == "__main__":
     # Si archivist.py est exécuté directement, il utilise une heure par défaut
     # pour le scheduling (ici 4h du matin).
     # En production, il est appelé par main.py qui lui passe l'heure.
+    # --full : ignore l'état incrémental et reconstruit toutes les archives (réparation)
     default_scheduled_time = dt_time(hour=4, minute=0, second=0, microsecond=0)
-    run_archiving()
+    run_archiving(full=True if "--full" in sys.argv else None)
@@ -0,0 +1,152 @@
+"""Benchmark hors-ligne du memory-worker (aucun accès réseau).
+
+Génère une base AnythingLLM synthétique, démarre des serveurs LLM/AnythingLLM
+factices sur 127.0.0.1 puis mesure scan_all() et run_summarization() sur
+trois scénarios :
+  - cold        : archives, état, manifest et cache vides ;
+  - warm        : second passage sans aucun changement dans la base ;
+  - incremental : quelques nouveaux chats ajoutés à des threads existants.
+Pour chaque étape : durée, pic mémoire Python (tracemalloc) et requêtes reçues
+par les serveurs factices.
+
+    cd modules/memory-worker
+    python -m bench.run_bench --threads 50 --messages 20 --llm-latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import tracemalloc
+
+WORKER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if WORKER_DIR not in sys.path:
+    sys.path.insert(0, WORKER_DIR)
+
+from bench import stub_servers, synthetic_db  # noqa: E402
+
+
+def configure_env(workdir: str, llm_url: str, anything_url: str, args) -> None:
+    """Variables lues par config.py : à poser AVANT d'importer les modules du worker."""
+    os.environ.update({
+        "DB_PATH": os.path.join(workdir, "anythingllm.db"),
+        "ARCHIVE_PATH": os.path.join(workdir, "archives"),
+        "MD_PATH": os.path.join(workdir, "markdowns"),
+        "LITELLM_URL": llm_url,
+        "ANYTHING_LLM_HOST": anything_url,
+        "ANYTHING_LLM_API_KEY": "bench",
+        "BASE_MODEL": args.model,
+        "EMBED_QUIET_SECONDS": "0",
+    })
+    if not args.rate_limits:
+        # Limites du profil désactivées : on mesure le worker, pas le fournisseur
+        os.environ["LLM_RPM"] = "0"
+        os.environ["LLM_TPM"] = "0"
+    if args.concurrency:
+        os.environ["LLM_CONCURRENCY"] = str(args.concurrency)
+    if args.no_stream:
+        os.environ["LLM_STREAM"] = "false"
+
+
+def measure(name: str, fn, servers, track_memory: bool) -> dict:
+    before = {label: srv.snapshot() for label, srv in servers.items()}
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    requests = {}
+    for label, srv in servers.items():
+        delta = srv.snapshot() - before[label]
+        requests.update({f"{label}:{route}": n for route, n in sorted(delta.items())})
+    return {
+        "stage": name,
+        "seconds": round(elapsed, 3),
+        "peak_mb": round(peak / 1024 / 1024, 2) if peak is not None else None,
+        "requests": requests,
+    }
+
+
+def print_report(results: list) -> None:
+    print()
+    print(f"{'scénario':<12} {'étape':<18} {'durée (s)':>10} {'pic (Mo)':>9}  requêtes")
+    for r in results:
+        peak = f"{r['peak_mb']:.2f}" if r['peak_mb'] is not None else "-"
+        reqs = ", ".join(f"{k}={v}" for k, v in r["requests"].items()) or "-"
+        print(f"{r['scenario']:<12} {r['stage']:<18} {r['seconds']:>10.3f} {peak:>9}  {reqs}")
+
+
+def main(argv=None) -> list:
+    parser = argparse.ArgumentParser(description="Benchmark hors-ligne du memory-worker")
+    parser.add_argument("--workspaces", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=50, help="threads par workspace")
+    parser.add_argument("--messages", type=int, default=20, help="chats par thread")
+    parser.add_argument("--new-threads", type=int, default=5, help="threads modifiés (scénario incremental)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="latence du faux LLM (s)")
+    parser.add_argument("--anything-latency", type=float, default=0.01, help="latence du faux AnythingLLM (s)")
+    parser.add_argument("--model", default="bench-remote", help="BASE_MODEL (choisit le profil de config.MODEL_PROFILES)")
+    parser.add_argument("--concurrency", type=int, default=0, help="surcharge LLM_CONCURRENCY")
+    parser.add_argument("--rate-limits", action="store_true", help="garder les limites rpm/tpm du profil")
+    parser.add_argument("--no-stream", action="store_true", help="désactiver le streaming LLM")
+    parser.add_argument("--no-memory", action="store_true", help="ne pas mesurer la mémoire (tracemalloc ralentit)")
+    parser.add_argument("--workdir", help="dossier de travail (temporaire et supprimé par défaut)")
+    parser.add_argument("--json", dest="json_path", help="écrit aussi les résultats dans ce fichier JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="garder les logs du worker")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="memory-worker-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    llm = stub_servers.start_llm(args.llm_latency)
+    anything = stub_servers.start_anything(args.anything_latency)
+    configure_env(workdir, llm.url, anything.url, args)
+
+    rows = synthetic_db.generate(os.environ["DB_PATH"], args.workspaces, args.threads, args.messages)
+    print(f"📦 Base synthétique : {rows} ({workdir})")
+
+    # Import après configure_env : config.py lit l'environnement à l'import
+    import archivist
+    import summarizer
+    import http_client
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    servers = {"llm": llm, "anything": anything}
+    scenarios = [
+        ("cold", None),
+        ("warm", None),
+        ("incremental", lambda: synthetic_db.append_chats(os.environ["DB_PATH"], args.new_threads)),
+    ]
+    results = []
+    try:
+        for scenario, prepare in scenarios:
+            if prepare:
+                prepare()
+            for stage, fn in (("scan_all", archivist.scan_all), ("run_summarization", summarizer.run_summarization)):
+                result = measure(stage, fn, servers, not args.no_memory)
+                result["scenario"] = scenario
+                results.append(result)
+    finally:
+        http_client.close_all()
+        llm.shutdown()
+        anything.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+    # ru_maxrss : Ko sous Linux
+    print(f"\nRSS max du processus : {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} Mo")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "dataset": rows, "results": results}, f, indent=2, ensure_ascii=False)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Serveurs HTTP locaux imitant LiteLLM (/chat/completions) et l'API AnythingLLM.
+
+Latence configurable, aucun accès réseau : tout écoute sur 127.0.0.1 (port
+éphémère). Chaque serveur compte les requêtes reçues par route.
+"""
+import json
+import time
+import uuid
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency: float):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, route: str):
+        with self._lock:
+            self.counts[route] += 1
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def snapshot(self) -> Counter:
+        with self._lock:
+            return Counter(self.counts)
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+
+    def _json(self, obj, status=200):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class LLMHandler(_JsonHandler):
+    """/chat/completions : résumé factice, streaming SSE ou JSON complet."""
+
+    def do_POST(self):
+        req = json.loads(self._body() or b"{}")
+        self.server.count("chat/completions")
+        time.sleep(self.server.latency)
+        words = len((req.get("messages") or [{}])[-1].get("content", "").split())
+        summary = f"- Point clé factice ({words} mots en entrée)\n- Deuxième point clé\n"
+        if not req.get("stream"):
+            self._json({"choices": [{"message": {"content": summary}}],
+                        "usage": {"total_tokens": words + 20, "completion_tokens": 20}})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for token in summary.split(" "):
+            event = {"choices": [{"delta": {"content": token + " "}}]}
+            self.wfile.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class AnythingHandler(_JsonHandler):
+    """Upload, suppressions (3 variantes) et update-embeddings d'AnythingLLM."""
+
+    def do_POST(self):
+        self._body()
+        time.sleep(self.server.latency)
+        if self.path.endswith("/document/upload"):
+            self.server.count("document/upload")
+            self._json({"success": True, "documents": [{"id": str(uuid.uuid4())}]})
+        elif self.path.endswith("/document/delete"):
+            self.server.count("document/delete (bulk)")
+            self._json({"success": True})
+        elif self.path.endswith("/update-embeddings"):
+            self.server.count("update-embeddings")
+            self._json({"success": True})
+        elif self.path.endswith("/delete"):
+            self.server.count("workspace document delete")
+            self._json({"success": True})
+        else:
+            self.server.count("other")
+            self._json({"success": False}, status=404)
+
+    def do_DELETE(self):
+        time.sleep(self.server.latency)
+        self.server.count("document DELETE")
+        self._json({"success": True})
+
+
+def start_llm(latency: float = 0.05) -> _StubServer:
+    return _StubServer(LLMHandler, latency).start()
+
+
+def start_anything(latency: float = 0.01) -> _StubServer:
+    return _StubServer(AnythingHandler, latency).start()
@@ -0,0 +1,116 @@
+"""Génère une base anythingllm.db synthétique (workspaces, threads, chats).
+
+Seules les tables et colonnes lues par le worker sont créées, avec les noms
+d'AnythingLLM (workspaceId en CamelCase, thread_id, createdAt en ms...).
+
+    python -m bench.synthetic_db /tmp/anythingllm.db --workspaces 3 --threads 50 --messages 20
+"""
+import os
+import json
+import random
+import sqlite3
+import argparse
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    slug TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS workspace_threads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    slug TEXT NOT NULL UNIQUE,
+    workspace_id INTEGER NOT NULL,
+    user_id INTEGER,
+    createdAt INTEGER,
+    lastUpdatedAt INTEGER
+);
+CREATE TABLE IF NOT EXISTS workspace_chats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workspaceId INTEGER NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    include BOOLEAN DEFAULT true,
+    user_id INTEGER,
+    thread_id INTEGER,
+    createdAt INTEGER,
+    lastUpdatedAt INTEGER
+);
+"""
+
+WORDS = ("docker", "python", "sqlite", "moteur", "recette", "réseau", "compose", "volume", "modèle",
+         "résumé", "mémoire", "ollama", "gemini", "token", "cuisine", "arduino", "capteur", "script")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _response(rng: random.Random, paragraphs: int) -> str:
+    text = "\n\n".join(_sentence(rng, rng.randint(20, 60)) for _ in range(paragraphs))
+    # Même forme JSON que les réponses stockées par AnythingLLM
+    return json.dumps({"text": text, "sources": [], "type": "chat"}, ensure_ascii=False)
+
+
+def generate(path: str, workspaces: int = 3, threads: int = 50, messages: int = 20,
+             default_messages: int = 10, seed: int = 42) -> dict:
+    """Crée (ou écrase) la base `path`. Retourne le nombre de lignes créées."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    base_ms = int(time.time() * 1000) - 30 * 86400 * 1000
+    chats = 0
+    with conn:
+        for w in range(1, workspaces + 1):
+            cur = conn.execute("INSERT INTO workspaces (name, slug) VALUES (?, ?)", (f"workspace {w}", f"ws-{w}"))
+            ws_id = cur.lastrowid
+            rows = []
+            for t in range(threads):
+                # Un tiers des threads garde le nom générique "Thread" (titre tiré du 1er message)
+                name = "Thread" if t % 3 == 0 else f"{rng.choice(WORDS)} {t}"
+                cur = conn.execute(
+                    "INSERT INTO workspace_threads (name, slug, workspace_id, createdAt) VALUES (?, ?, ?, ?)",
+                    (name, f"ws-{w}-t-{t}", ws_id, base_ms))
+                for m in range(messages):
+                    rows.append((ws_id, _sentence(rng, rng.randint(5, 25)), _response(rng, rng.randint(1, 4)),
+                                 cur.lastrowid, base_ms + m * 60_000))
+            for m in range(default_messages):
+                rows.append((ws_id, _sentence(rng, 10), _response(rng, 2), None, base_ms + m * 60_000))
+            rng.shuffle(rows)  # Chats entrelacés entre threads, comme en usage réel
+            conn.executemany(
+                "INSERT INTO workspace_chats (workspaceId, prompt, response, thread_id, createdAt) VALUES (?, ?, ?, ?, ?)",
+                rows)
+            chats += len(rows)
+    conn.close()
+    return {"workspaces": workspaces, "threads": workspaces * threads, "chats": chats}
+
+
+def append_chats(path: str, threads: int = 5, messages: int = 3, seed: int = 7) -> int:
+    """Ajoute des chats à quelques threads existants (scénario incrémental)."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    targets = conn.execute("SELECT id, workspace_id FROM workspace_threads ORDER BY id LIMIT ?", (threads,)).fetchall()
+    now_ms = int(time.time() * 1000)
+    rows = [(ws_id, _sentence(rng, 12), _response(rng, 2), t_id, now_ms + m)
+            for t_id, ws_id in targets for m in range(messages)]
+    with conn:
+        conn.executemany(
+            "INSERT INTO workspace_chats (workspaceId, prompt, response, thread_id, createdAt) VALUES (?, ?, ?, ?, ?)",
+            rows)
+    conn.close()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--workspaces", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=50, help="threads par workspace")
+    parser.add_argument("--messages", type=int, default=20, help="chats par thread")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(generate(args.path, args.workspaces, args.threads, args.messages, seed=args.seed))
@@ -0,0 +1,96 @@
+from typing import Any, Dict, Iterable, List
+import config as worker_config
+
+# Estimation grossière mais stable : ~3,5 caractères par token pour du
+# français/anglais mêlé de code (pas de tokenizer embarqué dans le worker).
+CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(text: str) -> int:
+    """Nombre de tokens estimé pour `text`."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def chunk_token_budget(model_name: str) -> int:
+    """Budget de tokens d'un morceau pour `model_name`.
+
+    Valeur "chunk_tokens" du profil du modèle, bornée par sa fenêtre de
+    contexte (moins la place du prompt système et de la réponse) et, si
+    CHUNK_SIZE est défini, par cette taille (en caractères).
+    """
+    profile = worker_config.get_model_profile(model_name)
+    budget = profile["chunk_tokens"]
+    budget = min(budget, profile["context_tokens"] - worker_config.PROMPT_RESERVED_TOKENS)
+    if worker_config.SUMMARY_CHUNK_SIZE:
+        budget = min(budget, estimate_tokens("x" * worker_config.SUMMARY_CHUNK_SIZE))
+    return max(256, budget)
+
+
+def split_text(text: str, budget: int) -> List[str]:
+    """Coupe un texte trop long en morceaux de `budget` tokens au plus.
+
+    On coupe d'abord sur les paragraphes, puis sur les lignes, et en dernier
+    recours en plein texte.
+    """
+    if estimate_tokens(text) <= budget:
+        return [text]
+    # estimate_tokens ajoute 1 : la coupe franche doit rester dans le budget
+    max_chars = int((budget - 1) * CHARS_PER_TOKEN)
+    for separator in ("\n\n", "\n"):
+        units = [u for u in text.split(separator) if u.strip()]
+        if len(units) > 1:
+            break
+    else:
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+    parts: List[str] = []
+    current = ""
+    for unit in units:
+        if estimate_tokens(unit) > budget:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.extend(split_text(unit, budget))
+            continue
+        candidate = f"{current}{separator}{unit}" if current else unit
+        if estimate_tokens(candidate) > budget:
+            parts.append(current)
+            current = unit
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def build_chunks(messages: Iterable[Dict[str, Any]], budget: int) -> List[str]:
+    """Regroupe les échanges en morceaux remplis jusqu'à `budget` tokens.
+
+    Un échange plus gros que le budget est découpé sur ses paragraphes
+    (les suites sont marquées "(suite)") et occupe ses propres morceaux.
+    """
+    chunks: List[str] = []
+    current = ""
+    for m in messages:
+        u_text = m.get('user', '') or ""
+        a_text = m.get('ai', '') or ""
+        # Format lisible pour l'IA
+        entry = f"User: {u_text}\nAI: {a_text}\n\n"
+
+        if estimate_tokens(entry) > budget:
+            if current.strip():
+                chunks.append(current)
+            current = ""
+            pieces = split_text(entry.strip(), budget - 8)
+            chunks.extend(p if i == 0 else f"(suite) {p}" for i, p in enumerate(pieces))
+            continue
+
+        if estimate_tokens(current + entry) > budget and current.strip():
+            chunks.append(current)
+            current = entry
+        else:
+            current += entry
+
+    if current.strip():
+        chunks.append(current)
+    return chunks
@@ -9,23 +9,172 @@ DB_DEFAULT_PATH = os.getenv("DB_PATH", "/app/source_db/anythingllm.db")
 ARCHIVE_DEFAULT_PATH = os.getenv("ARCHIVE_PATH", "/app/archives")
 # Chemin par défaut pour les résumés Markdown sauvegardés localement
 MD_DEFAULT_PATH = os.getenv("MD_PATH", "/app/markdowns")
+# Dossier des états internes du worker (dossier caché : ignoré par le glob du summarizer)
+STATE_DEFAULT_PATH = os.getenv("STATE_PATH", os.path.join(ARCHIVE_DEFAULT_PATH, ".state"))
+# Mode incrémental de l'archivist : ne relit que les messages au-dessus du dernier id vu
+# (cycle de démarrage et cycles du mode surveillance). Chats modifiés ou supprimés et threads
+# renommés ne sont repris que par le rescan complet du cycle planifié.
+# Mettre à false (ou lancer `python archivist.py --full`) pour forcer un rescan complet.
+ARCHIVE_INCREMENTAL = os.getenv("ARCHIVE_INCREMENTAL", "true").lower() in ("1", "true", "yes", "on")
+# Index SQLite des documents uploadés (remplace manifest.json, migré automatiquement)
+MANIFEST_DB_PATH = os.getenv("MANIFEST_DB_PATH", os.path.join(STATE_DEFAULT_PATH, "manifest.sqlite3"))
+# Nombre d'écritures manifest groupées avant un commit intermédiaire
+MANIFEST_COMMIT_EVERY = int(os.getenv("MANIFEST_COMMIT_EVERY", "50"))
+# Journal de reprise du summarizer (un fichier par résumé en cours, supprimé une fois terminé)
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", os.path.join(STATE_DEFAULT_PATH, "journal"))
+# Compression des archives JSON et des résumés markdown : none, gzip ou zstd (module
+# zstandard requis, sinon gzip). Les fichiers gardent leur nom et sont lus quel que
+# soit leur format ; `python storage.py` convertit les fichiers existants.
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "none").lower()
+# Niveau de compression (0 = défaut du codec : 6 en gzip, 10 en zstd)
+STORAGE_COMPRESSION_LEVEL = int(os.getenv("STORAGE_COMPRESSION_LEVEL", "0") or 0)
+# Mode sharding : plusieurs workers (processus ou réplicas) se partagent un cycle.
+# Chaque archive est traitée sous un bail (LEASE_DB_PATH, sur le volume partagé)
+# et un seul worker à la fois fait l'archivage de la DB.
+SHARDING = os.getenv("SHARDING", "false").lower() in ("1", "true", "yes", "on")
+# Identifiant du worker dans les baux (vide = nom d'hôte + pid)
+WORKER_ID = os.getenv("WORKER_ID", "")
+LEASE_DB_PATH = os.getenv("LEASE_DB_PATH", os.path.join(STATE_DEFAULT_PATH, "leases.sqlite3"))
+# Durée d'un bail : un worker planté libère son travail au plus tard après ce délai
+LEASE_TTL_SECONDS = float(os.getenv("LEASE_TTL_SECONDS", "300"))
+# Fréquence de renouvellement des baux tenus (vide = tiers de LEASE_TTL_SECONDS)
+LEASE_RENEW_SECONDS = float(os.getenv("LEASE_RENEW_SECONDS", "0") or 0)
+# Budget d'un cycle du summarizer (0 = illimité) : durée en secondes et tokens LLM
+# estimés. Une fois épuisé, les archives restantes (les moins prioritaires) sont
+# reportées au cycle suivant.
+SUMMARY_TIME_BUDGET_SECONDS = float(os.getenv("SUMMARY_TIME_BUDGET_SECONDS", "0") or 0)
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "0") or 0)
+# Nombre de lignes workspace_chats lues par lot (fetchmany) lors de l'extraction
+ARCHIVE_FETCH_BATCH = int(os.getenv("ARCHIVE_FETCH_BATCH", "500"))
 # Heure de l'archivage Format HH:MM (24h) ou intervalle en heures
 SCHEDULE_TIME_STR = os.getenv("SUMMARY_TIME", "04:00")
 INTERVAL_HOURS = int(os.getenv("INTERVAL_HOURS", "24"))
+# Mode surveillance : cycle incrémental déclenché par un changement de la DB
+# (en plus du cycle complet planifié, conservé en filet de sécurité)
+WATCH_MODE = os.getenv("WATCH_MODE", "false").lower() in ("1", "true", "yes", "on")
+# Fréquence de vérification de la DB (en secondes)
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "5"))
+# Délai de calme après le dernier changement avant de lancer un cycle (en secondes)
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "60"))
+# Attente maximale depuis le premier changement, même si la DB bouge encore (en secondes)
+WATCH_MAX_DELAY_SECONDS = float(os.getenv("WATCH_MAX_DELAY_SECONDS", "900"))
+
+# Métriques : endpoint Prometheus /metrics (0 = désactivé) et snapshot JSON écrit après chaque cycle
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_BIND = os.getenv("METRICS_BIND", "0.0.0.0")
+METRICS_SNAPSHOT_PATH = os.getenv("METRICS_SNAPSHOT_PATH", os.path.join(STATE_DEFAULT_PATH, "metrics.json"))
+# Un cycle plus long que ce seuil est signalé (memory_worker_cycle_overruns_total), 0 = pas de seuil
+CYCLE_OVERRUN_SECONDS = float(os.getenv("CYCLE_OVERRUN_SECONDS", "3600"))
 
 # Temps d'attente initial avant de tenter de se connecter à la DB (en secondes)
 # Sera utilisé avec tenacity pour les retries
 INITIAL_DB_CONNECT_DELAY_SECONDS = 5
 MAX_DB_CONNECT_RETRIES = 10
 
-# Temps entre chaque traitement de fichier JSON par le summarizer (en secondes)
-RATE_LIMIT_SLEEP = int(os.getenv("RATE_LIMIT_SLEEP", "5"))
-# Taille des morceaux de texte envoyés au LLM pour résumé (en caractères)
-SUMMARY_CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "3000"))
+# Taille max des morceaux envoyés au LLM (en caractères), 3000 par défaut, bornée par
+# le profil du modèle. 0 = budget du profil seul (chunk_tokens / context_tokens dans MODEL_PROFILES)
+SUMMARY_CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "3000") or 0) or None
+# Tokens réservés au prompt système et à la réponse dans la fenêtre de contexte
+PROMPT_RESERVED_TOKENS = int(os.getenv("PROMPT_RESERVED_TOKENS", "1200"))
 # Limite de mots pour chaque résumé de morceau de texte par le LLM
 SUMMARY_WORD_LIMIT = int(os.getenv("WORD_LIMIT", "200")) # Pour forcer la concision
+# Compaction des résumés : au-delà de ce nombre de caractères, les anciennes
+# "Mise à jour" sont fondues dans une section "Mémoire consolidée"
+SUMMARY_COMPACT_THRESHOLD = int(os.getenv("SUMMARY_COMPACT_THRESHOLD", "12000"))
+# Nombre de sections récentes gardées telles quelles lors d'une compaction
+SUMMARY_KEEP_UPDATES = int(os.getenv("SUMMARY_KEEP_UPDATES", "2"))
+# Limite de mots de la mémoire consolidée
+SUMMARY_CONSOLIDATED_WORD_LIMIT = int(os.getenv("SUMMARY_CONSOLIDATED_WORD_LIMIT", "400"))
+# Taille max (caractères) d'un lot de résumés envoyé au LLM pendant la consolidation
+SUMMARY_COMPACT_BATCH_CHARS = int(os.getenv("SUMMARY_COMPACT_BATCH_CHARS", "6000"))
+# Nombre max de passes de réduction (map-reduce)
+SUMMARY_COMPACT_MAX_ROUNDS = 3
 # Timeout pour les appels API des LLM (en secondes)
 LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", "600"))
+# Ré-embedding AnythingLLM : un seul déclenchement par workspace, en fin de cycle.
+# > 0 : déclenché aussi dès que le workspace n'a reçu aucun upload pendant ce délai (secondes)
+EMBED_QUIET_SECONDS = float(os.getenv("EMBED_QUIET_SECONDS", "0"))
+# Durée de validité (heures) du choix mémorisé d'endpoint AnythingLLM (suppression...)
+ENDPOINT_CACHE_TTL_HOURS = float(os.getenv("ENDPOINT_CACHE_TTL_HOURS", "168"))
+
+# --- CACHE DES RÉSUMÉS LLM (clé = hash modèle + prompt système + morceau) ---
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(STATE_DEFAULT_PATH, "llm_cache.sqlite3"))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "90"))
+
+# --- STREAMING DES RÉPONSES LLM ---
+# Lecture en streaming avec arrêt anticipé (écho du prompt, dépassement, boucle)
+LLM_STREAM = os.getenv("LLM_STREAM", "true").lower() in ("1", "true", "yes", "on")
+# Arrêt quand la réponse dépasse N fois la limite de mots demandée
+STREAM_WORD_OVERRUN = float(os.getenv("STREAM_WORD_OVERRUN", "1.5"))
+# Arrêt quand la même ligne est générée N fois de suite
+STREAM_MAX_REPEATED_LINES = int(os.getenv("STREAM_MAX_REPEATED_LINES", "3"))
+
+# --- CLIENT HTTP (sessions keep-alive partagées) ---
+# Connexions gardées ouvertes par hôte (LiteLLM, AnythingLLM)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# Nombre d'hôtes distincts gardés en cache par session
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+# Timeout d'établissement de connexion (en secondes)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+# Timeouts de lecture par type d'appel (en secondes)
+HTTP_TIMEOUTS = {
+    "default": float(os.getenv("HTTP_TIMEOUT", "30")),
+    "llm": float(LLM_TIMEOUT),
+    "upload": float(os.getenv("ANYTHING_UPLOAD_TIMEOUT", "60")),
+    "delete": float(os.getenv("ANYTHING_DELETE_TIMEOUT", "30")),
+    "embeddings": float(os.getenv("ANYTHING_EMBED_TIMEOUT", "30")),
+}
+
+# --- PROFILS DES MODÈLES (backends LiteLLM) ---
+# Clé = nom du modèle tel que demandé à LiteLLM (BASE_MODEL). "ollama" s'applique à
+# tout modèle "ollama/..." non listé, "default" aux autres (API distantes).
+# concurrency : nombre d'appels LLM simultanés (chunks d'un même fichier et entre fichiers).
+# rpm / tpm : requêtes et tokens par minute autorisés (None = pas de limite), voir rate_limiter.
+# context_tokens : fenêtre de contexte ; chunk_tokens : budget d'un morceau de conversation, voir chunker.
+MODEL_PROFILES = {
+    "default": {"concurrency": 4, "rpm": 60, "tpm": None, "context_tokens": 8192, "chunk_tokens": 4000},
+    # CPU local : un seul appel à la fois ; Ollama tronque au-delà de son num_ctx
+    "ollama": {"concurrency": 1, "rpm": None, "tpm": None, "context_tokens": 4096, "chunk_tokens": 1500},
+    "qwen2.5:3b": {"concurrency": 1, "rpm": None, "tpm": None, "context_tokens": 4096, "chunk_tokens": 1500},
+    "phi3:mini": {"concurrency": 1, "rpm": None, "tpm": None, "context_tokens": 4096, "chunk_tokens": 1500},
+    "Gemini 2.5 Pro": {"concurrency": 4, "rpm": 10, "tpm": 250000, "context_tokens": 1000000, "chunk_tokens": 30000},
+    "Gemini 2.5 Flash": {"concurrency": 8, "rpm": 15, "tpm": 250000, "context_tokens": 1000000, "chunk_tokens": 30000},
+    # tpm bas : un morceau doit tenir dans une minute de budget
+    "Groq": {"concurrency": 4, "rpm": 30, "tpm": 6000, "context_tokens": 131072, "chunk_tokens": 4000},
+    "Groq-Fast": {"concurrency": 8, "rpm": 30, "tpm": 6000, "context_tokens": 131072, "chunk_tokens": 4000},
+}
+# Surcharges globales du profil du modèle courant (vide = valeur du profil)
+LLM_CONCURRENCY = os.getenv("LLM_CONCURRENCY", "")
+LLM_RPM = os.getenv("LLM_RPM", "")
+LLM_TPM = os.getenv("LLM_TPM", "")
+# Nombre de nouvelles tentatives d'un morceau après un 429 (rate limit)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# Le débit est réduit quand la latence moyenne dépasse N fois la meilleure latence observée
+RATE_LATENCY_SLOWDOWN = float(os.getenv("RATE_LATENCY_SLOWDOWN", "3"))
+
+def get_model_profile(model_name: str) -> dict:
+    """Return the profile of model_name merged over the "default" profile.
+
+    Lookup order: exact name, then "ollama" for any "ollama/..." model, then
+    "default". LLM_CONCURRENCY / LLM_RPM / LLM_TPM (env) override the
+    profile values when set.
+    """
+    profile = dict(MODEL_PROFILES["default"])
+    if model_name in MODEL_PROFILES:
+        profile.update(MODEL_PROFILES[model_name])
+    elif (model_name or "").startswith("ollama/"):
+        profile.update(MODEL_PROFILES["ollama"])
+    if LLM_CONCURRENCY.strip().isdigit():
+        profile["concurrency"] = int(LLM_CONCURRENCY)
+    if LLM_RPM.strip():
+        profile["rpm"] = float(LLM_RPM) or None
+    if LLM_TPM.strip():
+        profile["tpm"] = float(LLM_TPM) or None
+    profile["concurrency"] = max(1, int(profile["concurrency"]))
+    return profile
 
 
 def get_seconds_until_schedule(schedule_time_str: str = None):
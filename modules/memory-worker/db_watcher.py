@@ -0,0 +1,106 @@
+import os
+import zlib
+import sqlite3
+import logging
+from typing import Optional, Tuple
+import config as worker_config
+
+logger = logging.getLogger("db_watcher")
+
+
+class DbChangeWatcher:
+    """Détecte à faible coût les changements de la base AnythingLLM.
+
+    Deux niveaux, du moins cher au plus cher :
+    1. mtime/taille de anythingllm.db et de son WAL, plus `PRAGMA data_version`
+       sur une connexion lecture seule gardée ouverte (change à chaque commit
+       d'un autre processus) ;
+    2. seulement si (1) a bougé : une empreinte des chats et des threads
+       (MAX(id), COUNT(*), MAX(lastUpdatedAt), et les noms des threads) pour
+       ignorer les écritures qui ne concernent pas la mémoire (ex: AnythingLLM
+       qui enregistre les documents uploadés par le worker). Ajouts,
+       suppressions, chats modifiés et threads renommés changent l'empreinte.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or worker_config.DB_DEFAULT_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+        self._columns = {}
+        self._file_sig = self._file_signature()
+        self._content_sig = self._content_signature()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            try:
+                self._conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            except sqlite3.Error as e:
+                logger.debug(f"[watch] Connexion impossible à {self.db_path}: {e}")
+                return None
+        return self._conn
+
+    def _reset(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
+        self._columns = {}
+
+    def _table_signature(self, conn: sqlite3.Connection, table: str) -> Tuple:
+        """MAX(id), COUNT(*) et, si la colonne existe (selon la version d'AnythingLLM), MAX(lastUpdatedAt)."""
+        if table not in self._columns:
+            self._columns[table] = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        columns = "MAX(id), COUNT(*)"
+        if "lastUpdatedAt" in self._columns[table]:
+            columns += ", MAX(lastUpdatedAt)"
+        return tuple(conn.execute(f"SELECT {columns} FROM {table}").fetchone())
+
+    def _file_signature(self) -> Tuple:
+        sig = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        conn = self._connect()
+        if conn is not None:
+            try:
+                sig.append(conn.execute("PRAGMA data_version").fetchone()[0])
+            except sqlite3.Error:
+                self._reset()
+        return tuple(sig)
+
+    def _content_signature(self) -> Optional[Tuple]:
+        conn = self._connect()
+        if conn is None:
+            return None
+        try:
+            chats = self._table_signature(conn, "workspace_chats")
+            threads = self._table_signature(conn, "workspace_threads")
+            # Un renommage ne touche pas forcément lastUpdatedAt : empreinte des
+            # noms (quelques centaines de threads, lecture négligeable)
+            names = 0
+            for thread_id, name in conn.execute("SELECT id, name FROM workspace_threads"):
+                names = zlib.crc32(f"{thread_id}:{name}\n".encode("utf-8"), names)
+            return chats + threads + (names,)
+        except sqlite3.Error as e:
+            logger.debug(f"[watch] Lecture de l'empreinte impossible: {e}")
+            self._reset()
+            return None
+
+    def changed(self) -> bool:
+        """True si des chats/threads ont changé depuis le dernier appel."""
+        file_sig = self._file_signature()
+        if file_sig == self._file_sig:
+            return False
+        self._file_sig = file_sig
+        content_sig = self._content_signature()
+        if content_sig is not None and content_sig == self._content_sig:
+            return False
+        self._content_sig = content_sig
+        return True
+
+    def close(self):
+        self._reset()
@@ -0,0 +1,55 @@
+import threading
+import logging
+from typing import Dict, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+import config as worker_config
+
+logger = logging.getLogger("http_client")
+
+# Une session (donc un pool de connexions keep-alive) par service distant
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(service: str) -> requests.Session:
+    """Return the shared pooled session for a service ("litellm", "anythingllm").
+
+    Connections are kept alive and reused between calls instead of opening a
+    fresh TCP connection per request. The urllib3 pool is thread-safe, so the
+    session can be shared by the concurrent summarizer workers. It does not
+    block when all HTTP_POOL_SIZE connections are busy: an extra connection is
+    opened and discarded after use. A blocking pool without timeout would turn
+    any leaked connection into a permanent hang of the worker (concurrency is
+    already bounded upstream by LLM_CONCURRENCY and the worker pools).
+    """
+    with _sessions_lock:
+        session = _sessions.get(service)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=worker_config.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=worker_config.HTTP_POOL_SIZE,
+                pool_block=False,
+                max_retries=0,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["Connection"] = "keep-alive"
+            _sessions[service] = session
+            logger.debug(f"[http] New pooled session for {service} (pool={worker_config.HTTP_POOL_SIZE})")
+        return session
+
+
+def timeout_for(endpoint: str) -> Tuple[float, float]:
+    """Return the (connect, read) timeout configured for an endpoint kind."""
+    read = worker_config.HTTP_TIMEOUTS.get(endpoint, worker_config.HTTP_TIMEOUTS["default"])
+    return worker_config.HTTP_CONNECT_TIMEOUT, read
+
+
+def close_all():
+    """Close every pooled session (end of process)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
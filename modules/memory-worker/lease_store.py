@@ -0,0 +1,148 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+import config as worker_config
+
+logger = logging.getLogger("lease_store")
+
+# Bail de l'étape archivage : un seul worker relit la DB AnythingLLM par cycle
+ARCHIVIST_LEASE = "archivist"
+
+
+def default_worker_id() -> str:
+    """Identifiant du worker : nom d'hôte (conteneur) + pid."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseStore:
+    """Baux avec expiration partagés entre workers (SQLite sur le volume commun).
+
+    Un bail appartient à un seul worker jusqu'à son expiration. Le
+    propriétaire le prolonge tant qu'il travaille (thread de renouvellement) ;
+    un worker planté cesse de le prolonger et, passé LEASE_TTL_SECONDS, le
+    premier worker qui le demande le reprend. La prise de bail est une seule
+    instruction SQL, donc atomique entre processus.
+    """
+
+    def __init__(self, db_path: str = None, worker_id: str = None, ttl: float = None):
+        self.db_path = db_path or worker_config.LEASE_DB_PATH
+        self.worker_id = worker_id or worker_config.WORKER_ID or default_worker_id()
+        self.ttl = ttl or worker_config.LEASE_TTL_SECONDS
+        self._lock = threading.Lock()
+        self._held: Set[str] = set()
+        self._stop = threading.Event()
+        self._renewer: Optional[threading.Thread] = None
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+    # --- BAUX ---
+    def acquire(self, key: str) -> bool:
+        """Prend (ou prolonge) le bail `key` ; False s'il est tenu par un autre worker."""
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT owner, expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+            cur = self._conn.execute("""
+                INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+            """, (key, self.worker_id, now + self.ttl, now))
+            if cur.rowcount == 0:
+                return False
+            self._held.add(key)
+        if previous and previous[0] != self.worker_id:
+            logger.warning(f"   🔓 [LEASE] Bail {key} de {previous[0]} expiré, repris par {self.worker_id}")
+        return True
+
+    def release(self, key: str):
+        with self._lock:
+            self._held.discard(key)
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.worker_id))
+
+    def renew_all(self) -> int:
+        """Prolonge les baux tenus. Un bail perdu (déjà repris ailleurs) est signalé et oublié."""
+        with self._lock:
+            held = list(self._held)
+        renewed = 0
+        for key in held:
+            with self._lock:
+                if key not in self._held:
+                    continue
+                cur = self._conn.execute(
+                    "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+                    (time.time() + self.ttl, key, self.worker_id))
+                if cur.rowcount:
+                    renewed += 1
+                    continue
+                self._held.discard(key)
+            logger.warning(f"   ⚠️ [LEASE] Bail {key} perdu par {self.worker_id} (expiré puis repris ailleurs)")
+        return renewed
+
+    def holders(self) -> Dict[str, str]:
+        """Baux encore valides : {clé: worker}."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, owner FROM leases WHERE expires_at >= ?", (time.time(),)).fetchall()
+        return {key: owner for key, owner in rows}
+
+    @contextmanager
+    def lease(self, key: str) -> Iterator[bool]:
+        """with store.lease(key) as acquired: ... ; le bail est rendu à la sortie du bloc."""
+        acquired = self.acquire(key)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release(key)
+
+    # --- RENOUVELLEMENT ---
+    def start_renewer(self, interval: float = None):
+        """Thread de fond qui prolonge les baux tenus toutes les `interval` secondes."""
+        interval = interval or worker_config.LEASE_RENEW_SECONDS or self.ttl / 3
+        if self._renewer is not None:
+            return
+        def _run():
+            while not self._stop.wait(interval):
+                try:
+                    self.renew_all()
+                except sqlite3.Error as e:
+                    logger.warning(f"   ⚠️ [LEASE] Renouvellement impossible: {e}")
+        self._renewer = threading.Thread(target=_run, name="lease-renewer", daemon=True)
+        self._renewer.start()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            for key in list(self._held):
+                self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.worker_id))
+            self._held.clear()
+            self._conn.close()
+
+
+_store: Optional[LeaseStore] = None
+_store_lock = threading.Lock()
+
+
+def get_leases() -> Optional[LeaseStore]:
+    """Baux partagés du worker (None si SHARDING est désactivé)."""
+    global _store
+    if not worker_config.SHARDING:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = LeaseStore()
+            _store.start_renewer()
+            logger.info(f"🧩 [LEASE] Mode sharding actif, worker {_store.worker_id} (bail {_store.ttl:.0f}s)")
+        return _store
@@ -0,0 +1,124 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Dict, Optional
+import config as worker_config
+
+logger = logging.getLogger("llm_cache")
+
+
+def cache_key(model: str, system_prompt: str, chunk: str) -> str:
+    """Clé de cache : SHA-256 de (modèle, prompt système, texte du morceau)."""
+    h = hashlib.sha256()
+    for part in (model, system_prompt, chunk):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class LLMCache:
+    """Cache persistant des résumés de morceaux, adressé par contenu.
+
+    Évite de renvoyer au LLM un morceau déjà résumé (thread ré-archivé sous
+    un autre titre, marqueur .done ou entrée manifest perdus...). Éviction par
+    âge (LLM_CACHE_MAX_AGE_DAYS) puis par taille (LLM_CACHE_MAX_MB,
+    LLM_CACHE_MAX_ENTRIES), les entrées les moins récemment utilisées d'abord.
+    Seuls les vrais résumés sont stockés : jamais les placeholders d'erreur.
+    """
+
+    def __init__(self, db_path: str = None, max_bytes: int = None, max_entries: int = None,
+                 max_age_days: float = None):
+        self.db_path = db_path or worker_config.LLM_CACHE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else worker_config.LLM_CACHE_MAX_MB * 1024 * 1024
+        self.max_entries = max_entries if max_entries is not None else worker_config.LLM_CACHE_MAX_ENTRIES
+        self.max_age_days = max_age_days if max_age_days is not None else worker_config.LLM_CACHE_MAX_AGE_DAYS
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                summary TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries(last_used)")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, summary: str):
+        if not summary:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, model, summary, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, summary, len(summary.encode('utf-8')), now, now))
+            self.stores += 1
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 100:
+                self._evict_locked()
+
+    def evict(self) -> int:
+        with self._lock:
+            return self._evict_locked()
+
+    def _evict_locked(self) -> int:
+        self._puts_since_evict = 0
+        removed = 0
+        if self.max_age_days:
+            cutoff = time.time() - self.max_age_days * 86400
+            removed += self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (cutoff,)).rowcount
+
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries").fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            # Parcours LRU : on retire jusqu'à repasser sous les deux limites
+            to_delete = []
+            for key, size in self._conn.execute("SELECT key, size FROM summaries ORDER BY last_used ASC"):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                to_delete.append((key,))
+                count -= 1
+                total -= size
+            self._conn.executemany("DELETE FROM summaries WHERE key = ?", to_delete)
+            removed += len(to_delete)
+
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
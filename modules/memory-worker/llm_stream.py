@@ -0,0 +1,132 @@
+import json
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+import config as worker_config
+
+logger = logging.getLogger("llm_stream")
+
+# Marqueurs d'écho du prompt (défaut fréquent des petits modèles CPU)
+ECHO_MARKERS = ("### System:", "### User:")
+
+
+class _StopDetector:
+    """Décide, token par token, si la génération doit être coupée.
+
+    Tout est tenu à jour au fil des deltas (nombre de mots, dernières lignes
+    complètes, recherche d'écho limitée au texte nouveau) : un token coûte
+    O(taille du delta), pas O(texte reçu).
+    """
+
+    def __init__(self, word_limit: int):
+        self.word_limit = word_limit
+        self.repeat = worker_config.STREAM_MAX_REPEATED_LINES
+        self.words = 0
+        self._echo_prefix: Optional[bool] = None
+        self._line_start = 0
+        # (ligne sans blancs, position de son \n) des dernières lignes non vides
+        self._filled = deque(maxlen=self.repeat)
+
+    def _starts_with_echo(self, text: str) -> bool:
+        # Figé dès que le début non blanc du texte ne peut plus devenir un marqueur
+        if self._echo_prefix is None:
+            stripped = text.lstrip()
+            if stripped and not any(m.startswith(stripped) for m in ECHO_MARKERS):
+                self._echo_prefix = stripped.startswith(ECHO_MARKERS)
+            else:
+                return stripped.startswith(ECHO_MARKERS)
+        return self._echo_prefix
+
+    def feed(self, text: str, delta: str) -> Tuple[Optional[str], str]:
+        """`text` = texte reçu, `delta` compris. Retourne (raison, texte à garder) ;
+        raison None = on continue."""
+        previous = len(text) - len(delta)
+        words = delta.split()
+        if words:
+            # Un mot coupé entre deux deltas ne compte qu'une fois
+            glued = previous > 0 and not text[previous - 1].isspace() and not delta[0].isspace()
+            self.words += len(words) - glued
+        echo_prefix = self._starts_with_echo(text)
+
+        # 1. Écho du prompt APRÈS une vraie réponse : le modèle repart sur un nouveau tour
+        if not echo_prefix:
+            found = [idx for idx in (text.find(m, max(1, previous - len(m) + 1)) for m in ECHO_MARKERS) if idx > 0]
+            if found:
+                return "echo", text[:min(found)]
+
+        # 2. Dépassement de la limite de mots (plus large si la réponse commence par un écho,
+        #    que le nettoyage anti-écho retirera ensuite)
+        limit = self.word_limit * worker_config.STREAM_WORD_OVERRUN * (3 if echo_prefix else 1)
+        if self.words > limit:
+            cut = text.rfind("\n")
+            return "word_limit", text[:cut] if cut > 0 else text
+
+        # 3. Boucle : les dernières lignes complètes sont identiques (on en garde une)
+        if "\n" in delta:
+            end = text.rfind("\n")
+            offset = self._line_start
+            for line in text[self._line_start:end].split("\n"):
+                if line.strip():
+                    self._filled.append((line.strip(), offset + len(line)))
+                offset += len(line) + 1
+            self._line_start = end + 1
+            if len(self._filled) == self.repeat and len({line for line, _ in self._filled}) == 1:
+                return "repetition", text[:self._filled[0][1]]
+
+        return None, text
+
+
+def read_completion_stream(response: Any, word_limit: int, started: float) -> Tuple[str, Dict[str, Any]]:
+    """Lit une réponse /chat/completions en streaming (SSE) et coupe la génération
+    dès que le résumé est complet ou a dégénéré (écho, dépassement, boucle).
+
+    Fermer la réponse interrompt la génération côté LiteLLM/Ollama. Retourne
+    (texte, stats) avec stats = ttft (s), tokens, tokens_per_second, stopped.
+    """
+    text = ""
+    detector = _StopDetector(word_limit)
+    tokens = 0
+    first_token_at = None
+    stopped = None
+    usage_tokens = None
+    try:
+        for line in response.iter_lines():
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            if event.get("usage"):
+                usage_tokens = event["usage"].get("completion_tokens")
+            choices = event.get("choices") or []
+            delta = (choices[0].get("delta") or {}).get("content") if choices else None
+            if not delta:
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            tokens += 1
+            text += delta
+
+            stopped, kept = detector.feed(text, delta)
+            if stopped:
+                text = kept
+                logger.info(f"   ✂️ [LLM] Génération interrompue ({stopped}) après {tokens} tokens")
+                break
+    finally:
+        response.close()
+
+    ended = time.monotonic()
+    tokens = usage_tokens or tokens
+    generation_time = ended - (first_token_at or ended)
+    stats = {
+        "ttft": round((first_token_at or ended) - started, 3),
+        "tokens": tokens,
+        "tokens_per_second": round(tokens / generation_time, 1) if generation_time > 0 else None,
+        "stopped": stopped,
+    }
+    return text, stats
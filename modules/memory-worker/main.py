@@ -4,6 +4,9 @@ from datetime import datetime, timedelta
 import archivist   # Ton script V15
 import summarizer  # Ton script ci-dessus
 import config
+import db_watcher
+import lease_store
+import metrics
 
 
 def wait_for_db(path: str = None, timeout: int = 60):
@@ -28,29 +31,121 @@ def wait_for_db(path: str = None, timeout: int = 60):
         time.sleep(1)
 
 
+def archive_stage(full=None):
+    """Archivage DB -> JSON. En mode sharding, un seul worker à la fois s'en charge
+    (bail ARCHIVIST_LEASE) ; les autres résument les archives déjà présentes."""
+    leases = lease_store.get_leases()
+    if leases is None:
+        with metrics.STAGE_DURATION.time(stage="archive"):
+            archivist.scan_all(full=full)
+        return
+    with leases.lease(lease_store.ARCHIVIST_LEASE) as acquired:
+        if not acquired:
+            print("   🔒 Archivage en cours sur un autre worker, étape sautée.")
+            return
+        with metrics.STAGE_DURATION.time(stage="archive"):
+            archivist.scan_all(full=full)
+
+
+def run_cycle(full=None):
+    """Exécute un cycle complet Archiviste -> Summarizer.
+
+    full: None = mode par défaut de l'archivist (incrémental si activé),
+    True = rescan complet de la DB.
+    """
+    mode = "full" if full or not config.ARCHIVE_INCREMENTAL else "incremental"
+    started = time.monotonic()
+    ok = False
+    try:
+        print("📂 [1/2] Archivage DB -> JSON...")
+        archive_stage(full)
+
+        print("🧠 [2/2] Résumé & Upload JSON -> AnythingLLM...")
+        with metrics.STAGE_DURATION.time(stage="summarize"):
+            embedded = summarizer.run_summarization()
+        print(f"   🧬 Workspaces ré-embeddés : {embedded or 'aucun'}")
+        ok = True
+    finally:
+        # Durée, résultat et snapshot JSON enregistrés même si le cycle échoue
+        metrics.record_cycle(mode, time.monotonic() - started, ok)
+        metrics.write_snapshot()
+
+
+def next_scheduled_run():
+    """Return (wait_seconds, next_run) for the next scheduled cycle."""
+    if config.INTERVAL_HOURS < 24:
+        # Mode intervalle : toutes les X heures
+        wait_seconds = config.INTERVAL_HOURS * 3600
+        return wait_seconds, datetime.now() + timedelta(seconds=wait_seconds)
+    # Mode horaire fixe
+    return config.get_seconds_until_schedule()
+
+
+def watch_loop():
+    """Boucle du mode surveillance.
+
+    Un cycle incrémental est lancé quand la DB a changé puis est restée calme
+    WATCH_DEBOUNCE_SECONDS (ou au plus tard WATCH_MAX_DELAY_SECONDS après le
+    premier changement). Le cycle planifié reste en place et force un rescan
+    complet, en filet de sécurité.
+    """
+    watcher = db_watcher.DbChangeWatcher()
+    wait_seconds, next_run = next_scheduled_run()
+    next_full = time.monotonic() + wait_seconds
+    print(f"👀 Mode surveillance actif. Cycle complet planifié : {next_run}")
+    first_change = last_change = None
+
+    while True:
+        now = time.monotonic()
+        try:
+            if now >= next_full:
+                print(f"\n⏰ DRING ! Il est {datetime.now().strftime('%H:%M')}. Cycle complet planifié.")
+                run_cycle(full=True)
+                print("✅ Cycle complet terminé.")
+                watcher.changed()  # Absorbe les écritures faites pendant le cycle
+                first_change = last_change = None
+                wait_seconds, next_run = next_scheduled_run()
+                next_full = time.monotonic() + wait_seconds
+                print(f"💤 Prochain cycle complet : {next_run}")
+                continue
+
+            if watcher.changed():
+                last_change = now
+                first_change = first_change or now
+
+            if last_change is not None and (
+                    now - last_change >= config.WATCH_DEBOUNCE_SECONDS
+                    or now - first_change >= config.WATCH_MAX_DELAY_SECONDS):
+                print(f"\n🔔 Changement détecté dans la DB ({datetime.now().strftime('%H:%M:%S')}). Cycle incrémental...")
+                first_change = last_change = None
+                run_cycle()
+                print("✅ Cycle incrémental terminé.")
+        except Exception as e:
+            print(f"❌ CRITICAL ERROR dans le cycle : {e}")
+
+        time.sleep(config.WATCH_POLL_SECONDS)
+
+
 def main_loop():
     print("🤖 SYSTEME IA-MEMORY : DÉMARRAGE GLOBAL")
+    metrics.start_server()
 
     # 1. SCAN IMMÉDIAT AU LANCEMENT (Pour ne pas attendre demain pour tester)
+    # Incrémental : un redémarrage reste rapide, le cycle planifié fait le rescan complet
     print("\n--- 🚀 Lancement Cycle Initial ---")
-    print("1. 📂 Exécution Archiviste...")
-    archivist.scan_all()
-
-    print("2. 🧠 Exécution Summarizer...")
-    summarizer.run_summarization() # Cette fonction scanne tes fichiers et s'arrête quand fini
-
+    run_cycle()
     print("--- ✅ Cycle Initial Terminé ---\n")
 
+    if config.WATCH_MODE:
+        watch_loop()
+        return
+
     # 2. BOUCLE INFINIE DU SCHEDULER
     while True:
+        wait_seconds, next_run = next_scheduled_run()
         if config.INTERVAL_HOURS < 24:
-            # Mode intervalle : toutes les X heures
-            wait_seconds = config.INTERVAL_HOURS * 3600
-            next_run = datetime.now() + timedelta(seconds=wait_seconds)
             print(f"💤 Système en veille. Prochain cycle toutes les {config.INTERVAL_HOURS}h : {next_run.strftime('%H:%M')} (dans {config.INTERVAL_HOURS}h)")
         else:
-            # Mode horaire fixe
-            wait_seconds, next_run = config.get_seconds_until_schedule()
             hours = int(wait_seconds // 3600)
             minutes = int((wait_seconds % 3600) // 60)
             print(f"💤 Système en veille. Prochain cycle : {next_run} (dans {hours}h {minutes}m)")
@@ -60,14 +155,10 @@ def main_loop():
 
         print(f"\n⏰ DRING ! Il est {datetime.now().strftime('%H:%M')}. Au travail !")
 
-        # Séquence de travail
+        # Séquence de travail : rescan complet, comme le cycle planifié du mode
+        # surveillance (l'incrémental ne voit ni chats modifiés/supprimés ni threads renommés)
         try:
-            print("📂 [1/2] Archivage DB -> JSON...")
-            archivist.scan_all()
-
-            print("🧠 [2/2] Résumé & Upload JSON -> AnythingLLM...")
-            summarizer.run_summarization()
-
+            run_cycle(full=True)
             print("✅ Cycle journalier terminé.")
 
         except Exception as e:
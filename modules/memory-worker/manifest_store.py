@@ -0,0 +1,209 @@
+import os
+import json
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import config as worker_config
+import storage
+
+logger = logging.getLogger("manifest_store")
+
+# Colonnes indexées ; tout autre champ hérité de manifest.json va dans `extra`
+_COLUMNS = ("any_document_id", "previous_any_document_id", "last_message_timestamp", "last_chat_id")
+# Échecs de suppression tolérés avant d'abandonner un ancien document (déjà supprimé à la main...)
+STALE_MAX_ATTEMPTS = 5
+
+
+class ManifestStore:
+    """Index local des documents envoyés à AnythingLLM (une ligne par résumé).
+
+    Remplace le cycle lecture/réécriture complète de manifest.json par une
+    table SQLite indexée sur le nom du fichier résumé. Les écritures faites
+    dans un bloc `batch()` sont groupées en une transaction, validée à la
+    sortie du bloc (ou tous les MANIFEST_COMMIT_EVERY changements).
+    Utilisable depuis plusieurs threads (connexion partagée + verrou).
+    """
+
+    def __init__(self, db_path: str = None, legacy_path: str = None, commit_every: int = None):
+        self.db_path = db_path or worker_config.MANIFEST_DB_PATH
+        self.legacy_path = legacy_path or os.path.join(worker_config.ARCHIVE_DEFAULT_PATH, 'manifest.json')
+        self.commit_every = commit_every or worker_config.MANIFEST_COMMIT_EVERY
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._pending = 0
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifest (
+                filename TEXT PRIMARY KEY,
+                any_document_id TEXT,
+                previous_any_document_id TEXT,
+                last_message_timestamp INTEGER,
+                last_chat_id INTEGER,
+                extra TEXT
+            )
+        """)
+        # Anciens documents à supprimer d'AnythingLLM : persistés avec le
+        # remplacement de leur id, retirés seulement une fois la suppression faite
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stale_documents (
+                doc_id TEXT PRIMARY KEY,
+                workspace TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Index créé avant l'ajout de last_chat_id : on ajoute la colonne
+        existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(manifest)")}
+        if "last_chat_id" not in existing:
+            self._conn.execute("ALTER TABLE manifest ADD COLUMN last_chat_id INTEGER")
+        self._conn.commit()
+        self.migrate_legacy()
+
+    # --- MIGRATION ---
+    def migrate_legacy(self) -> int:
+        """Importe un ancien manifest.json (une seule fois) puis le renomme en .migrated."""
+        if not os.path.exists(self.legacy_path):
+            return 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM manifest LIMIT 1").fetchone():
+                logger.warning(f"[manifest] {self.legacy_path} ignoré : l'index SQLite contient déjà des entrées.")
+                return 0
+            try:
+                legacy = storage.read_json(self.legacy_path) or {}
+            except FileNotFoundError:
+                return 0  # Déjà migré (et renommé) par un autre worker
+            except Exception as e:
+                logger.warning(f"[manifest] Lecture de {self.legacy_path} impossible, migration ignorée: {e}")
+                return 0
+
+            count = 0
+            for key, entry in legacy.items():
+                if not isinstance(entry, dict):
+                    continue
+                filename = entry.get('filename') or os.path.basename(entry.get('filepath', '')) or key
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO manifest (filename, any_document_id, previous_any_document_id, "
+                    "last_message_timestamp, extra) VALUES (?, ?, ?, ?, ?)",
+                    (filename,
+                     entry.get('any_document_id'),
+                     entry.get('previous_any_document_id'),
+                     entry.get('last_message_timestamp'),
+                     json.dumps({k: v for k, v in entry.items() if k not in _COLUMNS + ('filename',)}, ensure_ascii=False)),
+                )
+                count += 1
+            self._conn.commit()
+
+        # En sharding, plusieurs workers peuvent migrer en même temps : les
+        # entrées sont identiques (INSERT OR IGNORE) et un seul renommage aboutit.
+        try:
+            os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        except FileNotFoundError:
+            return count
+        logger.info(f"[manifest] {count} entrées migrées depuis {self.legacy_path}")
+        return count
+
+    # --- TRANSACTIONS ---
+    @contextmanager
+    def batch(self):
+        """Groupe les écritures en une transaction validée à la sortie du bloc."""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.commit()
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def _written(self):
+        self._pending += 1
+        if self._batch_depth == 0 or self._pending >= self.commit_every:
+            self.commit()
+
+    # --- LECTURE / ÉCRITURE ---
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM manifest WHERE filename = ?", (filename,)).fetchone()
+        if row is None:
+            return None
+        entry = json.loads(row['extra']) if row['extra'] else {}
+        entry['filename'] = row['filename']
+        for col in _COLUMNS:
+            if row[col] is not None:
+                entry[col] = row[col]
+        return entry
+
+    def set_document_id(self, filename: str, doc_id: str) -> bool:
+        """Enregistre le nouvel id de document ; l'ancien passe en previous_any_document_id."""
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO manifest (filename, any_document_id) VALUES (?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    previous_any_document_id = CASE WHEN manifest.any_document_id IS NOT NULL
+                        THEN manifest.any_document_id ELSE manifest.previous_any_document_id END,
+                    any_document_id = excluded.any_document_id
+            """, (filename, doc_id))
+            self._written()
+        return True
+
+    def set_timestamp(self, filename: str, timestamp: int, chat_id: Optional[int] = None) -> bool:
+        """Met à jour last_message_timestamp (et last_chat_id si connu) ; False si l'entrée n'existe pas."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE manifest SET last_message_timestamp = ?, "
+                "last_chat_id = COALESCE(?, last_chat_id) WHERE filename = ?", (timestamp, chat_id, filename))
+            if cur.rowcount == 0:
+                return False
+            self._written()
+        return True
+
+    # --- ANCIENS DOCUMENTS ---
+    def queue_stale(self, doc_id: str, workspace: str):
+        """Ajoute un ancien document à supprimer (dans la transaction du remplacement de son id)."""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO stale_documents (doc_id, workspace) VALUES (?, ?)",
+                               (doc_id, workspace))
+            self._written()
+
+    def stale_documents(self) -> Dict[str, List[str]]:
+        """Suppressions en attente, par workspace."""
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_id, workspace FROM stale_documents ORDER BY rowid").fetchall()
+        pending: Dict[str, List[str]] = {}
+        for row in rows:
+            pending.setdefault(row['workspace'], []).append(row['doc_id'])
+        return pending
+
+    def stale_deleted(self, doc_ids: List[str]):
+        """Suppressions confirmées : retirées de la file (validé immédiatement)."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM stale_documents WHERE doc_id = ?", [(d,) for d in doc_ids])
+            self.commit()
+
+    def stale_failed(self, doc_ids: List[str]) -> List[str]:
+        """Compte un échec ; retourne les documents abandonnés après STALE_MAX_ATTEMPTS échecs."""
+        with self._lock:
+            self._conn.executemany("UPDATE stale_documents SET attempts = attempts + 1 WHERE doc_id = ?",
+                                   [(d,) for d in doc_ids])
+            dropped = [row['doc_id'] for row in self._conn.execute(
+                "SELECT doc_id FROM stale_documents WHERE attempts >= ?", (STALE_MAX_ATTEMPTS,))]
+            self._conn.execute("DELETE FROM stale_documents WHERE attempts >= ?", (STALE_MAX_ATTEMPTS,))
+            self.commit()
+        return dropped
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
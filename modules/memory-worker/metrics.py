@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import bisect
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+import config as worker_config
+
+logger = logging.getLogger("metrics")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Bornes (s) des histogrammes de latence : de l'appel local rapide au LLM CPU lent
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+CYCLE_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200, 14400)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for k, v in key)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+
+class Counter(_Metric):
+    """Compteur monotone, éventuellement étiqueté (inc(result="written"))."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """Valeur instantanée (dernière durée de cycle, horodatage...)."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif au format Prometheus (_bucket, _sum, _count)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelKey, Dict] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            data["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            data["sum"] += value
+            data["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mesure la durée du bloc (observée même si le bloc lève une exception)."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        out = []
+        with self._lock:
+            for key, data in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, data["counts"]):
+                    cumulative += count
+                    out.append((f"{self.name}_bucket", key + (("le", f"{bound:g}"),), cumulative))
+                out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), data["count"]))
+                out.append((f"{self.name}_sum", key, data["sum"]))
+                out.append((f"{self.name}_count", key, data["count"]))
+        return out
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [{
+                "labels": dict(key),
+                "count": data["count"],
+                "sum": round(data["sum"], 3),
+                "avg": round(data["sum"] / data["count"], 3) if data["count"] else None,
+                "buckets": dict(zip([f"{b:g}" for b in self.buckets] + ["+Inf"],
+                                    _cumulate(data["counts"]))),
+            } for key, data in sorted(self._values.items())]
+
+
+def _cumulate(counts: List[int]) -> List[int]:
+    total, out = 0, []
+    for c in counts:
+        total += c
+        out.append(total)
+    return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render_prometheus(self) -> str:
+        """Exposition au format texte Prometheus (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict:
+        return {
+            "generated_at": time.time(),
+            "metrics": {m.name: {"type": m.kind, "help": m.help, "samples": m.snapshot()}
+                        for m in self._metrics.values()},
+        }
+
+
+REGISTRY = Registry()
+
+# --- MÉTRIQUES DU WORKER ---
+# Archivist
+DB_ROWS_READ = REGISTRY.register(Counter(
+    "memory_worker_db_rows_read_total", "Lignes workspace_chats lues dans la base AnythingLLM"))
+ARCHIVES = REGISTRY.register(Counter(
+    "memory_worker_archives_total", "Archives JSON par résultat (written, skipped, error)"))
+# Summarizer
+CHUNKS_SUMMARIZED = REGISTRY.register(Counter(
+    "memory_worker_chunks_summarized_total", "Morceaux résumés par source (llm, cache)"))
+LLM_LATENCY = REGISTRY.register(Histogram(
+    "memory_worker_llm_latency_seconds", "Durée d'un appel LLM réussi (réponse complète)"))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "memory_worker_llm_errors_total", "Appels LLM en échec par type d'erreur"))
+SUMMARY_DEFERRED = REGISTRY.register(Gauge(
+    "memory_worker_summary_deferred_files", "Archives reportées au cycle suivant (budget du cycle épuisé)"))
+# AnythingLLM
+ANYTHING_LATENCY = REGISTRY.register(Histogram(
+    "memory_worker_anythingllm_latency_seconds", "Durée des appels AnythingLLM par opération (upload, delete, embeddings)"))
+ANYTHING_ERRORS = REGISTRY.register(Counter(
+    "memory_worker_anythingllm_errors_total", "Appels AnythingLLM en échec par opération"))
+# Cycle
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "memory_worker_stage_duration_seconds", "Durée des étapes d'un cycle (archive, summarize)", CYCLE_BUCKETS))
+CYCLE_DURATION = REGISTRY.register(Histogram(
+    "memory_worker_cycle_duration_seconds", "Durée totale d'un cycle par mode (full, incremental)", CYCLE_BUCKETS))
+CYCLES = REGISTRY.register(Counter(
+    "memory_worker_cycles_total", "Cycles terminés par mode et résultat (ok, error)"))
+CYCLE_OVERRUNS = REGISTRY.register(Counter(
+    "memory_worker_cycle_overruns_total", "Cycles ayant dépassé CYCLE_OVERRUN_SECONDS"))
+LAST_CYCLE_DURATION = REGISTRY.register(Gauge(
+    "memory_worker_last_cycle_duration_seconds", "Durée du dernier cycle"))
+LAST_CYCLE_END = REGISTRY.register(Gauge(
+    "memory_worker_last_cycle_end_timestamp_seconds", "Fin du dernier cycle par résultat (epoch)"))
+
+
+def record_cycle(mode: str, seconds: float, ok: bool):
+    """Enregistre la fin d'un cycle ; signale un dépassement de CYCLE_OVERRUN_SECONDS."""
+    result = "ok" if ok else "error"
+    CYCLE_DURATION.observe(seconds, mode=mode)
+    CYCLES.inc(mode=mode, result=result)
+    LAST_CYCLE_DURATION.set(seconds)
+    LAST_CYCLE_END.set(time.time(), result=result)
+    limit = worker_config.CYCLE_OVERRUN_SECONDS
+    if limit and seconds > limit:
+        CYCLE_OVERRUNS.inc()
+        logger.warning(f"⏱️ [METRICS] Cycle {mode} trop long : {seconds:.0f}s (limite {limit:.0f}s)")
+
+
+def write_snapshot(path: Optional[str] = None) -> Optional[str]:
+    """Écrit l'état des métriques en JSON (écriture atomique). Retourne le chemin."""
+    path = path or worker_config.METRICS_SNAPSHOT_PATH
+    if not path:
+        return None
+    try:
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", delete=False, dir=directory, encoding="utf-8", suffix=".tmp") as tf:
+            json.dump(REGISTRY.snapshot(), tf, indent=2, ensure_ascii=False)
+        os.replace(tf.name, path)
+        return path
+    except OSError as e:
+        logger.warning(f"[metrics] Écriture du snapshot {path} impossible: {e}")
+        return None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, ctype = REGISTRY.render_prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, ctype = json.dumps(REGISTRY.snapshot(), ensure_ascii=False).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_server(port: Optional[int] = None, bind: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """Démarre l'endpoint /metrics (Prometheus) et /metrics.json dans un thread. Port 0 = désactivé."""
+    global _server
+    port = worker_config.METRICS_PORT if port is None else port
+    if not port or _server is not None:
+        return _server
+    bind = bind or worker_config.METRICS_BIND
+    try:
+        _server = ThreadingHTTPServer((bind, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"[metrics] Endpoint indisponible sur {bind}:{port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"📈 [METRICS] Endpoint Prometheus : http://{bind}:{port}/metrics")
+    return _server
@@ -0,0 +1,155 @@
+import time
+import threading
+import logging
+from typing import Dict, Optional
+import config as worker_config
+
+logger = logging.getLogger("rate_limiter")
+
+
+class TokenBucket:
+    """Seau à jetons classique : `capacity` jetons, rechargé de `rate` jetons/seconde.
+
+    Le solde peut devenir négatif (dette) quand la consommation réelle dépasse
+    l'estimation ; les appels suivants attendent alors le remboursement.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Temps d'attente avant de pouvoir prendre `amount` jetons (0 = tout de suite)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+
+class BackendRateLimiter:
+    """Limiteur adaptatif d'un backend LLM : requêtes/minute et tokens/minute.
+
+    - acquire() bloque juste le temps nécessaire (aucune attente si le budget le permet) ;
+    - un 429 (avec ou sans Retry-After) suspend le backend et réduit le débit ;
+    - une latence qui dérive loin de la meilleure latence observée (backend
+      saturé) réduit aussi le débit, qui remonte progressivement ensuite.
+    rpm/tpm à None = pas de limite de ce côté.
+    """
+
+    MIN_FACTOR = 0.1
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.factor = 1.0
+        self.blocked_until = 0.0
+        self.waited_seconds = 0.0
+        self.throttled = 0
+        self._latency_ewma: Optional[float] = None
+        self._latency_best: Optional[float] = None
+        self._lock = threading.Lock()
+        # Rafale : 10 s de requêtes, une minute de tokens (fenêtres des fournisseurs)
+        self._requests = TokenBucket(rpm / 60.0, max(1.0, rpm / 6.0)) if rpm else None
+        self._tokens = TokenBucket(tpm / 60.0, float(tpm)) if tpm else None
+
+    def _apply_factor(self):
+        if self._requests:
+            self._requests.rate = self.rpm / 60.0 * self.factor
+        if self._tokens:
+            self._tokens.rate = self.tpm / 60.0 * self.factor
+
+    def acquire(self, estimated_tokens: int = 0) -> float:
+        """Attend qu'une requête de `estimated_tokens` tokens soit permise. Retourne l'attente (s)."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(0.0, self.blocked_until - now)
+                if self._requests:
+                    wait = max(wait, self._requests.wait_time(1, now))
+                if self._tokens and estimated_tokens:
+                    wait = max(wait, self._tokens.wait_time(estimated_tokens, now))
+                if wait <= 0:
+                    if self._requests:
+                        self._requests.take(1)
+                    if self._tokens and estimated_tokens:
+                        self._tokens.take(estimated_tokens)
+                    self.waited_seconds += waited
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Corrige le seau de tokens avec la consommation réelle (usage.total_tokens)."""
+        if not self._tokens or actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens.take(actual_tokens - estimated_tokens)
+
+    def on_success(self, latency: float, tokens: int = 0):
+        """Appel réussi : `latency` (s) est ramenée à 1000 tokens pour comparer des morceaux de tailles différentes."""
+        if tokens:
+            latency = latency * 1000.0 / tokens
+        with self._lock:
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+            self._latency_best = latency if self._latency_best is None else min(self._latency_best, latency)
+            if self._latency_ewma > worker_config.RATE_LATENCY_SLOWDOWN * max(self._latency_best, 0.05):
+                self.factor = max(self.MIN_FACTOR, self.factor * 0.9)
+            else:
+                self.factor = min(1.0, self.factor + 0.05)
+            self._apply_factor()
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> float:
+        """Réagit à un 429 : pause du backend et débit divisé par deux. Retourne la pause (s)."""
+        with self._lock:
+            self.throttled += 1
+            self.factor = max(self.MIN_FACTOR, self.factor * 0.5)
+            self._apply_factor()
+            pause = retry_after if retry_after is not None else min(60.0, 2.0 ** min(self.throttled, 6))
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+        logger.warning(f"[rate] {self.name} : 429 reçu, pause {pause:.1f}s, débit x{self.factor:.2f}")
+        return pause
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "factor": round(self.factor, 2),
+            "waited_seconds": round(self.waited_seconds, 1),
+            "throttled": self.throttled,
+            "latency_ewma": round(self._latency_ewma, 2) if self._latency_ewma is not None else None,
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After en secondes (la forme date HTTP est ignorée)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+_limiters: Dict[str, BackendRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model_name: str) -> BackendRateLimiter:
+    """Limiteur partagé du backend `model_name`, construit depuis son profil (config.MODEL_PROFILES)."""
+    with _limiters_lock:
+        limiter = _limiters.get(model_name)
+        if limiter is None:
+            profile = worker_config.get_model_profile(model_name)
+            limiter = BackendRateLimiter(model_name, profile.get("rpm"), profile.get("tpm"))
+            _limiters[model_name] = limiter
+        return limiter
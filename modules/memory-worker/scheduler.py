@@ -0,0 +1,120 @@
+import os
+import math
+import time
+import threading
+import logging
+from typing import Dict, List, Optional
+import config as worker_config
+
+logger = logging.getLogger("scheduler")
+
+DAY_MS = 86_400_000
+# Poids du score de priorité (activité récente, volume à résumer, temps d'attente)
+WEIGHT_RECENT = 4.0
+WEIGHT_VOLUME = 0.5
+WEIGHT_WAIT = 1.5
+# Au-delà, l'attente ne fait plus monter le score
+MAX_WAIT_DAYS = 7
+# Taille moyenne d'un échange dans une archive, pour estimer le nombre de nouveaux messages
+APPROX_BYTES_PER_MESSAGE = 600
+# Ligne du marqueur .done qui garde la taille de l'archive résumée
+SIZE_PREFIX = "size="
+
+
+class CycleBudget:
+    """Budget d'un cycle du summarizer : durée (s) et/ou tokens LLM estimés.
+
+    0 = pas de limite. Le budget est vérifié avant de commencer une archive :
+    les archives en cours vont jusqu'au bout (le dépassement est donc borné
+    par une archive par appel LLM simultané), les suivantes attendent le
+    cycle suivant.
+    """
+
+    def __init__(self, seconds: float = None, tokens: int = None):
+        self.seconds = worker_config.SUMMARY_TIME_BUDGET_SECONDS if seconds is None else seconds
+        self.tokens = worker_config.SUMMARY_TOKEN_BUDGET if tokens is None else tokens
+        self.started = time.monotonic()
+        self.used_tokens = 0
+        self._lock = threading.Lock()
+
+    def charge(self, tokens: int):
+        with self._lock:
+            self.used_tokens += tokens
+
+    def exhausted(self) -> Optional[str]:
+        """Raison de l'épuisement ("time", "tokens") ou None s'il reste du budget."""
+        if self.seconds and time.monotonic() - self.started >= self.seconds:
+            return "time"
+        if self.tokens and self.used_tokens >= self.tokens:
+            return "tokens"
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "elapsed": round(time.monotonic() - self.started, 1),
+            "seconds": self.seconds,
+            "used_tokens": self.used_tokens,
+            "tokens": self.tokens,
+        }
+
+
+def priority_score(new_messages: float, last_activity_ms: int, pending_since_ms: int, now_ms: int) -> float:
+    """Score d'une archive en attente (plus grand = traité plus tôt).
+
+    - activité récente : 1 pour un message à l'instant, 0,5 un jour après... ;
+    - volume : log du nombre de nouveaux messages (10 messages ne valent pas 10x 1) ;
+    - attente : jours depuis le plus ancien message non résumé, plafonné à
+      MAX_WAIT_DAYS, pour qu'un thread calme finisse par passer.
+    """
+    recency = 1 / (1 + max(0, now_ms - last_activity_ms) / DAY_MS)
+    waited_days = min(max(0, now_ms - pending_since_ms) / DAY_MS, MAX_WAIT_DAYS)
+    return (WEIGHT_RECENT * recency
+            + WEIGHT_VOLUME * math.log1p(new_messages)
+            + WEIGHT_WAIT * waited_days / MAX_WAIT_DAYS)
+
+
+def done_marker_content(archive_size: int) -> str:
+    """Contenu du marqueur .done : taille de l'archive lue pour le résumé."""
+    return f"uploaded_via_api\n{SIZE_PREFIX}{archive_size}\n"
+
+
+def _summarized_size(done_marker: str) -> int:
+    """Taille de l'archive lors du dernier résumé (0 si inconnue : ancien marqueur)."""
+    try:
+        with open(done_marker, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith(SIZE_PREFIX):
+                    return int(line[len(SIZE_PREFIX):])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def order_pending(files: List[str]) -> List[str]:
+    """Archives à traiter, de la plus prioritaire à la moins prioritaire.
+
+    Le score ne lit que les métadonnées (aucune archive n'est ouverte ni
+    décompressée, process_file s'en charge ensuite) :
+      - activité : date de modification de l'archive (réécrite à chaque nouveau message) ;
+      - attente : depuis la version de l'archive couverte par le dernier
+        résumé (date du marqueur .done), sinon depuis la dernière
+        modification pour une archive jamais résumée ;
+      - volume : octets ajoutés depuis le dernier résumé, ramenés en messages.
+    """
+    now_ms = int(time.time() * 1000)
+    scored = []
+    for path in files:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue  # Archive supprimée entre-temps
+        done_marker = path + ".done"
+        try:
+            pending_since = int(os.path.getmtime(done_marker) * 1000)
+        except OSError:
+            pending_since = int(st.st_mtime * 1000)
+        new_bytes = max(0, st.st_size - _summarized_size(done_marker))
+        new_messages = new_bytes / APPROX_BYTES_PER_MESSAGE
+        scored.append((priority_score(new_messages, int(st.st_mtime * 1000), pending_since, now_ms), path))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [path for _, path in scored]
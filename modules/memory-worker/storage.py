@@ -0,0 +1,182 @@
+import os
+import json
+import glob
+import gzip
+import time
+import argparse
+import tempfile
+import logging
+from typing import Any, Dict, Optional
+import config as worker_config
+
+logger = logging.getLogger("storage")
+
+try:
+    import zstandard
+except ImportError:  # Dépendance optionnelle : gzip (bibliothèque standard) sinon
+    zstandard = None
+
+# Les fichiers gardent leur nom (.json, .md) : le format est reconnu à la
+# lecture par son en-tête, un texte UTF-8 ne commence jamais par ces octets.
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+CODECS = ("none", "gzip", "zstd")
+
+_warned = set()
+
+
+def _warn_once(message: str):
+    if message not in _warned:
+        _warned.add(message)
+        logger.warning(message)
+
+
+def codec_of(raw: bytes) -> str:
+    if raw.startswith(GZIP_MAGIC):
+        return "gzip"
+    if raw.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return "none"
+
+
+def active_codec(codec: Optional[str] = None) -> str:
+    """Codec d'écriture : STORAGE_COMPRESSION, gzip si zstandard n'est pas installé."""
+    codec = (codec or worker_config.STORAGE_COMPRESSION or "none").lower()
+    if codec not in CODECS:
+        _warn_once(f"[storage] STORAGE_COMPRESSION={codec} inconnu, fichiers non compressés.")
+        return "none"
+    if codec == "zstd" and zstandard is None:
+        _warn_once("[storage] zstandard absent (pip install zstandard), compression gzip à la place.")
+        return "gzip"
+    return codec
+
+
+def decode(raw: bytes) -> str:
+    codec = codec_of(raw)
+    if codec == "gzip":
+        raw = gzip.decompress(raw)
+    elif codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Fichier compressé en zstd mais le module zstandard n'est pas installé")
+        raw = zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    return raw.decode("utf-8")
+
+
+def encode(text: str, codec: Optional[str] = None) -> bytes:
+    codec = active_codec(codec)
+    raw = text.encode("utf-8")
+    level = worker_config.STORAGE_COMPRESSION_LEVEL
+    if codec == "gzip":
+        # mtime=0 : même contenu = mêmes octets
+        return gzip.compress(raw, compresslevel=level or 6, mtime=0)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level or 10).compress(raw)
+    return raw
+
+
+def read_text(path: str) -> str:
+    """Lit un fichier texte, compressé ou non."""
+    with open(path, "rb") as f:
+        return decode(f.read())
+
+
+def read_json(path: str) -> Any:
+    return json.loads(read_text(path))
+
+
+def dumps_json(data: Any, codec: Optional[str] = None) -> str:
+    # Indentation gardée pour les fichiers lisibles tels quels, inutile une fois compressés
+    if active_codec(codec) == "none":
+        return json.dumps(data, indent=2, ensure_ascii=False)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_text(path: str, text: str, codec: Optional[str] = None):
+    """Écriture atomique (fichier temporaire + replace) dans le codec courant."""
+    directory = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile("wb", delete=False, dir=directory, suffix=".tmp") as tf:
+        tf.write(encode(text, codec))
+        tempname = tf.name
+    os.chmod(tempname, 0o644)  # rw-r--r--, comme les autres fichiers du worker
+    os.replace(tempname, path)
+
+
+def write_json(path: str, data: Any, codec: Optional[str] = None):
+    write_text(path, dumps_json(data, codec), codec)
+
+
+# --- MIGRATION ---
+def _stored_files():
+    """Archives JSON et résumés markdown (dossiers cachés, donc .state, exclus)."""
+    files = glob.glob(os.path.join(worker_config.ARCHIVE_DEFAULT_PATH, "**", "*.json"), recursive=True)
+    files += glob.glob(os.path.join(worker_config.MD_DEFAULT_PATH, "**", "*.md"), recursive=True)
+    return sorted(files)
+
+
+def _read_all(files) -> float:
+    started = time.perf_counter()
+    for path in files:
+        text = read_text(path)
+        if path.endswith(".json"):
+            json.loads(text)
+    return time.perf_counter() - started
+
+
+def migrate(codec: Optional[str] = None, dry_run: bool = False) -> Dict[str, Any]:
+    """Réécrit archives et résumés dans `codec` (défaut : STORAGE_COMPRESSION).
+
+    La date de modification de chaque fichier est conservée : les marqueurs
+    .done et les empreintes restent valides, aucun résumé n'est relancé.
+    Retourne la taille totale et le temps de relecture avant/après.
+    """
+    codec = active_codec(codec)
+    files = _stored_files()
+    size_before = sum(os.path.getsize(p) for p in files)
+    read_before = _read_all(files)
+    converted = size_after = 0
+    for path in files:
+        with open(path, "rb") as f:
+            raw = f.read()
+        if codec_of(raw) == codec:
+            size_after += len(raw)
+            continue
+        text = decode(raw)
+        if path.endswith(".json"):
+            text = dumps_json(json.loads(text), codec)
+        data = encode(text, codec)
+        size_after += len(data)
+        converted += 1
+        if dry_run:
+            continue
+        st = os.stat(path)
+        write_text(path, text, codec)
+        os.chmod(path, st.st_mode & 0o777)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    read_after = read_before if dry_run else _read_all(files)
+    return {
+        "codec": codec,
+        "files": len(files),
+        "converted": converted,
+        "bytes_before": size_before,
+        "bytes_after": size_after,
+        "read_seconds_before": round(read_before, 3),
+        "read_seconds_after": round(read_after, 3),
+        "dry_run": dry_run,
+    }
+
+
+if __name__ == "__main__":
+    # python storage.py [--to gzip|zstd|none] [--dry-run] : conversion ponctuelle
+    # des archives et résumés existants (les nouveaux suivent STORAGE_COMPRESSION).
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description="Compression des archives JSON et résumés markdown")
+    parser.add_argument("--to", choices=CODECS, help="codec cible (défaut : STORAGE_COMPRESSION)")
+    parser.add_argument("--dry-run", action="store_true", help="mesurer sans réécrire")
+    args = parser.parse_args()
+    report = migrate(args.to, args.dry_run)
+    before, after = report["bytes_before"], report["bytes_after"]
+    print(f"📦 [STORAGE] {report['converted']}/{report['files']} fichier(s) converti(s) en {report['codec']}"
+          f"{' (simulation)' if args.dry_run else ''}")
+    print(f"   💾 Espace : {before / 1024 / 1024:.2f} Mo -> {after / 1024 / 1024:.2f} Mo"
+          f" ({(1 - after / before) * 100 if before else 0:.0f}% gagnés)")
+    print(f"   ⏱️ Relecture complète : {report['read_seconds_before']}s -> {report['read_seconds_after']}s")
@@ -1,30 +1,29 @@
 import os
-import json
 import requests
 import glob
 import time
 import logging
 import re
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 import anything_client
+from archivist import normalize_to_ms
+import chunker
+import http_client
+import lease_store
+import llm_cache
+import llm_stream
+import metrics
+import rate_limiter
+import scheduler
+import storage
+import work_journal
 import config as worker_config  # Module de configuration partagé
 
-def normalize_to_ms(ts_val: any) -> Optional[int]:
-    """Return timestamp in milliseconds (int) given ts_val in seconds or ms.
-
-    Returns None when ts_val cannot be parsed.
-    """
-    try:
-        t = int(ts_val)
-    except Exception:
-        return None
-    if t > 1_000_000_000_000:
-        return t
-    if t > 1_000_000_000:
-        return t * 1000
-    return t
-
 def parse_date_to_ms(date_str: str) -> Optional[int]:
     """Parse date string like '2026-01-12 14:18:57' to milliseconds."""
     try:
@@ -33,6 +32,35 @@ def parse_date_to_ms(date_str: str) -> Optional[int]:
     except Exception:
         return None
 
+def message_ts(message: Dict) -> int:
+    """Horodatage (ms) d'un message d'archive : "ts" natif (v2), sinon la date lisible (v1)."""
+    ts = normalize_to_ms(message.get('ts'))
+    if ts is not None:
+        return ts
+    return parse_date_to_ms(message.get('date', '')) or 0
+
+def message_chat_ids(msgs: List[Dict]) -> Optional[List[int]]:
+    """Ids workspace_chats des messages (archives v2), None si l'un d'eux n'en a pas."""
+    ids = [m.get('chat_id') for m in msgs]
+    return ids if all(isinstance(i, int) for i in ids) else None
+
+def select_new_messages(msgs: List[Dict], entry: Optional[Dict]) -> List[Dict]:
+    """Messages pas encore résumés d'après le manifest.
+
+    Par id de chat quand l'archive et le manifest le permettent (exact et
+    indépendant des dates), sinon par comparaison d'horodatages entiers.
+    """
+    entry = entry or {}
+    last_chat_id = entry.get('last_chat_id')
+    if last_chat_id is not None and message_chat_ids(msgs) is not None:
+        return [m for m in msgs if m['chat_id'] > last_chat_id]
+    last_ts = entry.get('last_message_timestamp') or 0
+    if 'last_chat_id' not in entry and entry:
+        # Manifest écrit depuis une archive v1 : last_ts est à la seconde près,
+        # on compare à la même précision pour ne pas reprendre le dernier message.
+        return [m for m in msgs if message_ts(m) // 1000 * 1000 > last_ts]
+    return [m for m in msgs if message_ts(m) > last_ts]
+
 # --- DEBUG MODE ---
 # Mettre à True/False pour simuler l'IA et aller très vite sans appel API 
 DEBUG_MODE = False
@@ -55,6 +83,77 @@ ARCHIVE_DIR = worker_config.ARCHIVE_DEFAULT_PATH
 MD_DIR = worker_config.MD_DEFAULT_PATH
 # On peut surcharger le timeout via ENV, sinon config par défaut
 API_TIMEOUT = int(os.getenv("LLM_TIMEOUT", worker_config.LLM_TIMEOUT))
+# Concurrence des appels LLM selon le profil du modèle (1 pour Ollama local)
+LLM_CONCURRENCY = worker_config.get_model_profile(MODEL_NAME)["concurrency"]
+# Budget de tokens d'un morceau de conversation (profil du modèle, CHUNK_SIZE)
+CHUNK_TOKEN_BUDGET = chunker.chunk_token_budget(MODEL_NAME)
+
+# Pool partagé par tous les fichiers : borne le nombre d'appels LLM simultanés
+_llm_pool: Optional[ThreadPoolExecutor] = None
+_llm_pool_lock = threading.Lock()
+
+def flush_stale_documents():
+    """Supprime en fin de cycle les anciennes versions des documents ré-uploadés.
+
+    La file est dans le manifest (table stale_documents) : les suppressions
+    d'un cycle interrompu sont faites au cycle suivant. Un document n'en sort
+    qu'une fois supprimé, ou après STALE_MAX_ATTEMPTS échecs.
+    """
+    try:
+        manifest = anything_client.get_manifest()
+        pending = manifest.stale_documents()
+    except Exception as e:
+        logger.warning(f"   ⚠️ File des anciens documents illisible: {e}")
+        return
+    for slug, doc_ids in pending.items():
+        try:
+            results = anything_client.delete_documents(doc_ids, slug)
+        except Exception as e:
+            logger.warning(f"   ⚠️ Erreur suppression anciens documents ({slug}): {e}")
+            results = {d: False for d in doc_ids}
+        deleted = [d for d, ok in results.items() if ok]
+        failed = [d for d, ok in results.items() if not ok]
+        for prev_id in deleted:
+            logger.info(f"   🗑️ Ancien document supprimé: {prev_id}")
+        for prev_id in failed:
+            logger.warning(f"   ⚠️ Impossible de supprimer l'ancien document {prev_id}, nouvel essai au prochain cycle")
+        try:
+            if deleted:
+                manifest.stale_deleted(deleted)
+            for prev_id in manifest.stale_failed(failed) if failed else []:
+                logger.error(f"   ❌ Ancien document {prev_id} abandonné après plusieurs échecs de suppression")
+        except Exception as e:
+            logger.warning(f"   ⚠️ Mise à jour de la file des anciens documents impossible: {e}")
+
+# Budget du cycle en cours (durée / tokens LLM), posé par run_summarization
+_cycle_budget: Optional[scheduler.CycleBudget] = None
+
+def charge_budget(tokens: int):
+    if _cycle_budget is not None:
+        _cycle_budget.charge(tokens)
+
+# Workspaces à ré-embedder (un seul trigger par workspace et par cycle)
+embeddings = anything_client.EmbeddingDebouncer()
+
+_summary_cache: Optional[llm_cache.LLMCache] = None
+_summary_cache_lock = threading.Lock()
+
+def get_summary_cache() -> Optional[llm_cache.LLMCache]:
+    """Cache persistant des résumés (None si désactivé via LLM_CACHE_ENABLED)."""
+    global _summary_cache
+    if not worker_config.LLM_CACHE_ENABLED:
+        return None
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            _summary_cache = llm_cache.LLMCache()
+        return _summary_cache
+
+def get_llm_pool() -> ThreadPoolExecutor:
+    global _llm_pool
+    with _llm_pool_lock:
+        if _llm_pool is None:
+            _llm_pool = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="llm")
+        return _llm_pool
 
 # --- FONCTION API ---
 def upload_to_anything(content_md: str, filename: str, workspace_slug: str) -> Optional[str]:
@@ -74,36 +173,79 @@ def upload_to_anything(content_md: str, filename: str, workspace_slug: str) -> O
         return None
 
     logger.info(f"   ✅ Upload réussi, doc_id={doc_id}")
+    register_upload(filename, doc_id, workspace_slug)
+    return doc_id
 
+def register_upload(filename: str, doc_id: str, workspace_slug: str):
+    """
+    Suites d'un upload : suppression de l'ancien document, embeddings, manifest.
+    Idempotent : rejouable après une reprise (document déjà enregistré).
+    """
     # Gestion de l'ancien ID pour éviter les doublons dans AnythingLLM
+    # (le document encore en ligne est any_document_id ; previous_* a été mis dans
+    # la file des suppressions du manifest lors de son remplacement)
     _, entry = anything_client.find_entry_by_filename(filename)
     prev_id = None
-    if entry:
-        prev_id = entry.get('previous_any_document_id') or entry.get('any_document_id')
+    already_registered = bool(entry) and entry.get('any_document_id') == doc_id
+    if already_registered:
+        # Reprise : le crash a pu survenir avant la mise en file (INSERT OR IGNORE, sans doublon)
+        prev_id = entry.get('previous_any_document_id')
+    elif entry:
+        prev_id = entry.get('any_document_id') or entry.get('previous_any_document_id')
 
     if prev_id and prev_id != doc_id:
-        try:
-            deleted = anything_client.delete_document(prev_id, workspace_slug)
-            if deleted:
-                logger.info(f"   🗑️ Ancien document supprimé: {prev_id}")
-            else:
-                logger.warning(f"   ⚠️ Impossible de supprimer l'ancien document {prev_id}")
-        except Exception as e:
-            logger.warning(f"   ⚠️ Erreur suppression ancien document {prev_id}: {e}")
+        # Suppression groupée par workspace en fin de cycle (un seul appel bulk si supporté),
+        # mise en file dans la même transaction que le remplacement de l'id
+        anything_client.queue_stale_document(prev_id, workspace_slug)
 
-    # Mise à jour des embeddings (Vecteurs)
-    anything_client.trigger_embeddings(workspace_slug)
+    # Mise à jour des embeddings (Vecteurs) : regroupée par workspace en fin de cycle
+    embeddings.touch(workspace_slug)
 
     # Mise à jour du manifest local
+    if already_registered:
+        return
     updated = anything_client.update_entry_docid(filename, doc_id)
     if updated:
         logger.info(f"   🔖 Manifest mis à jour avec any_document_id={doc_id}")
     else:
         logger.warning(f"   ⚠️ Impossible de mettre à jour le manifest pour {filename}")
 
-    return doc_id
-
 # --- FONCTION LLM (Résumé) ---
+# Réponses de repli renvoyées à la place d'un résumé (jamais mises en cache)
+LLM_ERROR_PLACEHOLDERS = ("[LLM NOT CONFIGURED]", "[Timeout LLM]", "[Erreur API LLM]", "[Erreur Inattendue LLM]",
+                          "[Réponse LLM vide]")
+
+# Statistiques de streaming du cycle (TTFT, débit), agrégées en fin de cycle
+_stream_stats: List[Dict] = []
+_stream_stats_lock = threading.Lock()
+
+def record_stream_stats(stats: Dict):
+    with _stream_stats_lock:
+        _stream_stats.append(stats)
+
+def stream_stats_summary() -> Dict:
+    """Moyennes TTFT / tokens par seconde des appels du cycle, puis remise à zéro."""
+    with _stream_stats_lock:
+        calls = list(_stream_stats)
+        _stream_stats.clear()
+    if not calls:
+        return {}
+    rates = [c["tokens_per_second"] for c in calls if c["tokens_per_second"]]
+    return {
+        "calls": len(calls),
+        "avg_ttft": round(sum(c["ttft"] for c in calls) / len(calls), 2),
+        "avg_tokens_per_second": round(sum(rates) / len(rates), 1) if rates else None,
+        "early_stops": sum(1 for c in calls if c["stopped"]),
+    }
+
+def llm_error_type(error: requests.exceptions.RequestException) -> str:
+    """Étiquette d'erreur pour les métriques : http_<code>, connection ou request."""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return f"http_{error.response.status_code}"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "connection"
+    return "request"
+
 def summarize_chunk(text_chunk: str, workspace: str, date_str: str, part_number: int) -> str:
     """
     Envoie un bloc de conversation au LLM pour résumé.
@@ -125,6 +267,25 @@ def summarize_chunk(text_chunk: str, workspace: str, date_str: str, part_number:
         f"4. Si le texte contient une solution technique, note-la précisément (commandes, paramètres).\n"
         f"5. Limite ta réponse à {worker_config.SUMMARY_WORD_LIMIT} mots maximum."
     )
+    return call_llm(system_prompt, text_chunk, part_number)
+
+def call_llm(system_prompt: str, text_chunk: str, part_number: int, max_tokens: int = 500,
+             word_limit: Optional[int] = None) -> str:
+    """
+    Appel LiteLLM commun (cache, rate limit, streaming, nettoyage anti-écho).
+    En streaming, la génération est coupée dès que la réponse dépasse
+    word_limit ou dégénère (écho du prompt, boucle).
+    Retourne le texte généré, ou un des LLM_ERROR_PLACEHOLDERS en cas d'échec.
+    """
+    # Cache adressé par contenu : un morceau déjà résumé ne repart pas au LLM
+    cache = get_summary_cache()
+    key = llm_cache.cache_key(MODEL_NAME, system_prompt, text_chunk)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"   ♻️ [CACHE] Résumé réutilisé pour la partie {part_number}")
+            metrics.CHUNKS_SUMMARIZED.inc(source="cache")
+            return cached
 
     payload = {
         "model": MODEL_NAME,
@@ -133,18 +294,57 @@ def summarize_chunk(text_chunk: str, workspace: str, date_str: str, part_number:
             {"role": "user", "content": text_chunk}
         ],
         "temperature": 0.1, # Très bas pour être factuel
-        "max_tokens": 500
+        "max_tokens": max_tokens,
+        "stream": worker_config.LLM_STREAM
     }
 
     try:
         if not LLM_API_URL:
             logger.error("LLM API URL not configured. Set LITELLM_URL env var.")
+            metrics.LLM_ERRORS.inc(type="not_configured")
             return "[LLM NOT CONFIGURED]"
 
-        response = requests.post(LLM_API_URL, json=payload, timeout=API_TIMEOUT)
-        response.raise_for_status()
-
-        raw_summary = response.json()['choices'][0]['message']['content']
+        # Débit du backend (rpm/tpm) : on n'attend que si le budget est épuisé
+        limiter = rate_limiter.get_limiter(MODEL_NAME)
+        estimated_tokens = chunker.estimate_tokens(system_prompt + text_chunk) + payload["max_tokens"]
+        for attempt in range(worker_config.LLM_MAX_RETRIES + 1):
+            limiter.acquire(estimated_tokens)
+            started = time.monotonic()
+            response = http_client.get_session("litellm").post(
+                LLM_API_URL, json=payload, stream=payload["stream"],
+                timeout=(worker_config.HTTP_CONNECT_TIMEOUT, API_TIMEOUT))
+            if response.status_code != 429 or attempt == worker_config.LLM_MAX_RETRIES:
+                break
+            limiter.on_throttled(rate_limiter.parse_retry_after(response.headers.get("Retry-After")))
+            response.close()
+        # La réponse (stream=True) est rendue au pool sur tous les chemins,
+        # erreurs HTTP comprises : sinon chaque échec garde une connexion.
+        try:
+            response.raise_for_status()
+
+            if "text/event-stream" in response.headers.get("Content-Type", ""):
+                raw_summary, stream_stats = llm_stream.read_completion_stream(
+                    response, word_limit or worker_config.SUMMARY_WORD_LIMIT, started)
+                record_stream_stats(stream_stats)
+                logger.info(f"   ⚡ [LLM] Partie {part_number} : TTFT {stream_stats['ttft']}s, "
+                            f"{stream_stats['tokens_per_second']} tokens/s")
+                limiter.on_success(time.monotonic() - started, estimated_tokens)
+            else:
+                # Serveur sans streaming : réponse complète classique
+                limiter.on_success(time.monotonic() - started, estimated_tokens)
+                limiter.record_usage(estimated_tokens, (response.json().get('usage') or {}).get('total_tokens'))
+                raw_summary = response.json()['choices'][0]['message']['content']
+        finally:
+            response.close()
+        metrics.LLM_LATENCY.observe(time.monotonic() - started)
+        charge_budget(estimated_tokens)
+        # Flux terminé sans contenu (modèle déchargé, coupure...) : une erreur,
+        # ni mise en cache ni journalisée, le morceau sera redemandé
+        if not (raw_summary or "").strip():
+            metrics.LLM_ERRORS.inc(type="empty")
+            logger.error(f"❌ [LLM] Réponse vide sur la partie {part_number}.")
+            return "[Réponse LLM vide]"
+        metrics.CHUNKS_SUMMARIZED.inc(source="llm")
 
         # --- Nettoyage post-LLM (Anti-écho) ---
         cleaned_summary = raw_summary
@@ -167,45 +367,147 @@ def summarize_chunk(text_chunk: str, workspace: str, date_str: str, part_number:
         if not cleaned_summary:
             cleaned_summary = raw_summary
 
+        # Seules les vraies réponses sont mises en cache (jamais les placeholders d'erreur)
+        if cache and cleaned_summary:
+            cache.put(key, MODEL_NAME, cleaned_summary)
+
         return cleaned_summary
 
     except requests.exceptions.Timeout:
+        metrics.LLM_ERRORS.inc(type="timeout")
         logger.error(f"❌ [LLM] Timeout (>{API_TIMEOUT}s) sur la partie {part_number}.")
         return "[Timeout LLM]"
     except requests.exceptions.RequestException as e:
+        metrics.LLM_ERRORS.inc(type=llm_error_type(e))
         logger.error(f"❌ [LLM] Erreur API sur la partie {part_number}: {e}")
         return "[Erreur API LLM]"
     except Exception as e:
+        metrics.LLM_ERRORS.inc(type="unexpected")
         logger.exception(f"❌ [LLM] Erreur inattendue partie {part_number}: {e}")
         return "[Erreur Inattendue LLM]"
 
+# --- COMPACTION DES RÉSUMÉS ---
+CONSOLIDATED_HEADING = "## Mémoire consolidée"
+
+def split_summary_sections(content: str) -> Tuple[str, Optional[str], List[str]]:
+    """
+    Découpe un résumé markdown en (en-tête, mémoire consolidée, sections).
+    Les sections sont le bloc initial puis chaque "## Mise à jour", dans l'ordre.
+    """
+    pieces = re.split(r'(?m)^(?=## )', content)
+    first, rest = pieces[0], pieces[1:]
+    idx = first.find("### ")
+    header, initial = (first[:idx], first[idx:]) if idx != -1 else (first, "")
+
+    consolidated = None
+    sections = [initial] if initial.strip() else []
+    for piece in rest:
+        if piece.startswith(CONSOLIDATED_HEADING):
+            consolidated = piece[len(CONSOLIDATED_HEADING):].strip()
+        else:
+            sections.append(piece)
+    return header, consolidated, sections
+
+def consolidate_summaries(texts: List[str], workspace: str) -> Optional[str]:
+    """
+    Map-reduce des anciens résumés : les textes sont regroupés en lots, chaque
+    lot est condensé par le LLM (en parallèle), puis on recommence sur les
+    résultats jusqu'à obtenir un seul bloc. None si un appel LLM échoue.
+    """
+    system_prompt = (
+        f"Tu consolides la mémoire à long terme d'un fil de discussion ('{workspace}').\n"
+        f"On te donne plusieurs résumés successifs (du plus ancien au plus récent).\n"
+        f"RÈGLES ABSOLUES :\n"
+        f"1. Fusionne-les en UNE liste à puces (- point clé), sans introduction ni conclusion.\n"
+        f"2. Supprime les doublons ; en cas de contradiction, garde l'information la plus récente.\n"
+        f"3. Conserve précisément les solutions techniques (commandes, paramètres, versions).\n"
+        f"4. Limite ta réponse à {worker_config.SUMMARY_CONSOLIDATED_WORD_LIMIT} mots maximum."
+    )
+    level = [t.strip() for t in texts if t and t.strip()]
+    for _ in range(worker_config.SUMMARY_COMPACT_MAX_ROUNDS):
+        batches, current = [], ""
+        for text in level:
+            if current and len(current) + len(text) > worker_config.SUMMARY_COMPACT_BATCH_CHARS:
+                batches.append(current)
+                current = ""
+            current += text + "\n\n"
+        if current:
+            batches.append(current)
+
+        results = list(get_llm_pool().map(
+            lambda i_batch: call_llm(system_prompt, i_batch[1], i_batch[0] + 1, max_tokens=1000,
+                                     word_limit=worker_config.SUMMARY_CONSOLIDATED_WORD_LIMIT),
+            enumerate(batches)))
+        if any(r in LLM_ERROR_PLACEHOLDERS for r in results):
+            return None
+        level = results
+        if len(level) == 1:
+            return level[0]
+    return "\n".join(level)
+
+def compact_summary(content: str, workspace: str) -> str:
+    """
+    Compaction glissante : au-delà de SUMMARY_COMPACT_THRESHOLD caractères, les
+    sections les plus anciennes (et l'ancienne mémoire consolidée) sont fondues
+    dans une seule section "Mémoire consolidée" ; seules les
+    SUMMARY_KEEP_UPDATES dernières sections restent intactes. La taille du
+    document (donc le coût d'upload et de ré-embedding) reste ainsi bornée.
+    """
+    if DEBUG_MODE or len(content) <= worker_config.SUMMARY_COMPACT_THRESHOLD:
+        return content
+    header, consolidated, sections = split_summary_sections(content)
+    keep = max(1, worker_config.SUMMARY_KEEP_UPDATES)
+    if len(sections) <= keep:
+        return content
+
+    older, recent = sections[:-keep], sections[-keep:]
+    logger.info(f"   🗜️ Compaction : {len(older)} section(s) ancienne(s) fusionnée(s) dans la mémoire consolidée")
+    merged = consolidate_summaries(([consolidated] if consolidated else []) + older, workspace)
+    if merged is None:
+        logger.warning("   ⚠️ Compaction abandonnée (erreur LLM), résumé conservé tel quel.")
+        return content
+
+    # Le bloc initial n'a pas de titre "## ..." : on le garantit pour les sections gardées
+    recent_text = "".join(s if s.startswith("## ") else f"## Résumé initial\n\n{s}" for s in recent)
+    return f"{header}{CONSOLIDATED_HEADING}\n\n{merged.strip()}\n\n{recent_text}"
+
+def is_done(json_filepath: str) -> bool:
+    """Vrai si le marqueur .done est plus récent que l'archive (déjà traitée)."""
+    done_marker = json_filepath + ".done"
+    return os.path.exists(done_marker) and os.path.getmtime(done_marker) >= os.path.getmtime(json_filepath)
+
+def summary_names(json_filepath: str) -> Tuple[str, str]:
+    """(nom du résumé markdown, titre) d'une archive JSON."""
+    base_name = os.path.basename(json_filepath)
+    # Extract original filename by removing UUID if present
+    uuid_pattern = r'-([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})\.json$'
+    match = re.search(uuid_pattern, base_name)
+    if match:
+        original_filename = base_name[:-len(match.group(0))]  # remove -UUID.json
+        return original_filename, original_filename
+    return base_name.replace(".json", "_summary.md"), base_name.replace('.json', '')
+
 def process_file(json_filepath: str):
     """
     Traite un fichier JSON : Découpage intelligent -> Résumé -> Upload.
     """
     # 1. Vérification marqueur .done
     done_marker = json_filepath + ".done"
-    if os.path.exists(done_marker):
-        if os.path.getmtime(done_marker) >= os.path.getmtime(json_filepath):
-            return # Déjà traité
+    if is_done(json_filepath):
+        return # Déjà traité
 
     # 2. Lecture du JSON
     try:
-        with open(json_filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Version lue (date, taille) : le .done ne couvrira que celle-ci, même
+        # si l'archiviste réécrit l'archive pendant le résumé.
+        archive_stat = os.stat(json_filepath)
+        data = storage.read_json(json_filepath)
     except Exception as e:
         logger.error(f"❌ Erreur lecture JSON {json_filepath}: {e}")
         return
 
     base_name = os.path.basename(json_filepath)
-    # Extract original filename by removing UUID if present
-    uuid_pattern = r'-([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})\.json$'
-    match = re.search(uuid_pattern, base_name)
-    if match:
-        original_filename = base_name[:-len(match.group(0))]  # remove -UUID.json
-        summary_filename = original_filename
-    else:
-        summary_filename = base_name.replace(".json", "_summary.md")
+    summary_filename, title_name = summary_names(json_filepath)
     workspace_slug = data.get('workspace', 'default')
 
     logger.info(f"🚜 [SUMMARIZER] Traitement : {summary_filename}")
@@ -220,18 +522,18 @@ def process_file(json_filepath: str):
     old_content = ""
     if os.path.exists(md_path):
         try:
-            with open(md_path, 'r', encoding='utf-8') as f:
-                old_content = f.read()
+            old_content = storage.read_text(md_path)
             logger.info(f"   📖 Ancien résumé chargé depuis {md_path}")
         except Exception as e:
             logger.warning(f"   ⚠️ Impossible de lire l'ancien résumé {md_path}: {e}")
 
-    # Get last processed timestamp from manifest
+    # Get last processed chat id / timestamp from manifest
     _, entry = anything_client.find_entry_by_filename(summary_filename)
     last_ts = entry.get('last_message_timestamp', 0) if entry else 0
+    last_chat_id = entry.get('last_chat_id') if entry else None
 
     # Filter new messages
-    new_msgs = [m for m in msgs if (parse_date_to_ms(m.get('date', '')) or 0) > last_ts]
+    new_msgs = select_new_messages(msgs, entry)
     if not new_msgs:
         logger.info(f"   ⏭️ Aucun nouveau message depuis le dernier traitement. Skipped.")
         return
@@ -239,80 +541,117 @@ def process_file(json_filepath: str):
     logger.info(f"   🆕 {len(new_msgs)} nouveaux messages à traiter.")
 
     # --- 4. DÉCOUPAGE INTELLIGENT DES NOUVEAUX MESSAGES ---
-    chunks = []
-    current_chunk_str = ""
-    msg_count_in_chunk = 0
-
-    # Paramètres d'optimisation CPU/Contexte
-    MAX_MSG_PER_CHUNK = 10    # Max 10 échanges pour ne pas noyer l'IA
-    MAX_CHAR_PER_CHUNK = 3500 # Max caractères pour rester dans la fenêtre de contexte
-
-    for m in new_msgs:
-        u_text = m.get('user', '') or ""
-        a_text = m.get('ai', '') or ""
-
-        # Format lisible pour l'IA
-        entry = f"User: {u_text}\nAI: {a_text}\n\n"
-
-        # Si on dépasse la taille ou le nombre de messages, on coupe
-        if (len(current_chunk_str) + len(entry) > MAX_CHAR_PER_CHUNK) or (msg_count_in_chunk >= MAX_MSG_PER_CHUNK):
-            if current_chunk_str.strip():
-                chunks.append(current_chunk_str)
-            current_chunk_str = entry
-            msg_count_in_chunk = 1
-        else:
-            current_chunk_str += entry
-            msg_count_in_chunk += 1
-
-    if current_chunk_str.strip():
-        chunks.append(current_chunk_str)
+    # Morceaux remplis jusqu'au budget de tokens du modèle (moins d'appels, plus pleins)
+    chunks = chunker.build_chunks(new_msgs, CHUNK_TOKEN_BUDGET)
 
-    logger.info(f"   🧩 {len(chunks)} morceaux (basés sur les nouveaux messages) à traiter.")
+    logger.info(f"   🧩 {len(chunks)} morceaux (≤ {CHUNK_TOKEN_BUDGET} tokens, basés sur les nouveaux messages) à traiter.")
 
     # --- 5. RÉSUMÉ PAR L'IA DES NOUVEAUX CHUNKS ---
-    summary_date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    title_name = original_filename if 'original_filename' in locals() else base_name.replace('.json', '')
-    if old_content:
-        # Append to old content
-        final_content = old_content + f"\n## Mise à jour : {summary_date_str}\n\n"
+    # Journal de reprise : chaque morceau résumé est conservé sur disque, un
+    # cycle interrompu reprend au premier morceau manquant.
+    journal = work_journal.WorkJournal(
+        summary_filename,
+        work_journal.job_key(MODEL_NAME, summary_filename, last_ts, last_chat_id, chunks=chunks),
+        old_content)
+    old_content = journal.base_content
+    summary_date_str = journal.setdefault("summary_date", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    if journal.stage == work_journal.STAGE_CHUNKS:
+        if old_content:
+            # Append to old content
+            final_content = old_content + f"\n## Mise à jour : {summary_date_str}\n\n"
+        else:
+            final_content = f"# Mémoire : {title_name}\n**Workspace:** {workspace_slug} | **Date:** {summary_date_str}\n\n"
+
+        def summarize_part(i: int, chunk: str) -> str:
+            done = journal.chunk(i)
+            if done is not None:
+                return done
+            logger.info(f"   ⏳ Morceau {i+1}/{len(chunks)} ({summary_filename})...")
+            res = summarize_chunk(chunk, workspace_slug, summary_date_str, i + 1)
+            if res not in LLM_ERROR_PLACEHOLDERS:
+                journal.record_chunk(i, res)
+            return res
+
+        # Les morceaux partent en parallèle dans le pool LLM ; map() rend les
+        # résultats dans l'ordre des parties.
+        results = get_llm_pool().map(summarize_part, range(len(chunks)), chunks)
+        for i, res in enumerate(results):
+            final_content += f"### Partie {i + 1}\n{res}\n\n"
+
+        # --- 5b. COMPACTION (taille du document bornée) ---
+        final_content = compact_summary(final_content, workspace_slug)
     else:
-        final_content = f"# Mémoire : {title_name}\n**Workspace:** {workspace_slug} | **Date:** {summary_date_str}\n\n"
-
-    for i, chunk in enumerate(chunks):
-        logger.info(f"   ⏳ Morceau {i+1}/{len(chunks)}...")
-        res = summarize_chunk(chunk, workspace_slug, summary_date_str, i + 1)
-        final_content += f"### Partie {len(chunks) - len(chunks) + i + 1}\n{res}\n\n"  # Adjust part number if appending
-
-        # Petite pause pour laisser souffler le CPU si besoin
-        if not DEBUG_MODE:
-            time.sleep(1)
+        # Reprise après le résumé : le contenu final est déjà connu
+        final_content = journal.get("final_content")
 
     # --- 6. SAUVEGARDE DU RÉSUMÉ LOCAL ---
     try:
         os.makedirs(MD_DIR, exist_ok=True)
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(final_content)
+        storage.write_text(md_path, final_content)
         logger.info(f"   💾 Résumé sauvegardé localement : {md_path}")
     except Exception as e:
         logger.error(f"   ❌ Erreur sauvegarde résumé local {md_path}: {e}")
+    if journal.stage == work_journal.STAGE_CHUNKS:
+        journal.advance(work_journal.STAGE_SAVED, final_content=final_content)
 
     # --- 7. ENVOI API ---
-    success = upload_to_anything(final_content, summary_filename, workspace_slug)
+    if journal.stage == work_journal.STAGE_UPLOADED:
+        # Déjà uploadé avant l'interruption : on ne rejoue que l'enregistrement
+        success = journal.get("doc_id")
+        register_upload(summary_filename, success, workspace_slug)
+    else:
+        success = upload_to_anything(final_content, summary_filename, workspace_slug)
+        if success:
+            journal.advance(work_journal.STAGE_UPLOADED, doc_id=success)
 
     # --- 8. MISE À JOUR MANIFEST AVEC TIMESTAMP ---
     if success:
-        # Update manifest with last message timestamp
-        max_ts = max((parse_date_to_ms(m.get('date', '')) or 0 for m in msgs), default=0)
-        anything_client.update_entry_timestamp(summary_filename, max_ts)
+        # Update manifest with last message timestamp (et dernier id de chat en v2)
+        max_ts = max((message_ts(m) for m in msgs), default=0)
+        chat_ids = message_chat_ids(msgs)
+        anything_client.update_entry_timestamp(summary_filename, max_ts, max(chat_ids) if chat_ids else None)
+        # Le manifest (doc id, timestamp) doit être sur disque avant le .done et
+        # la suppression du journal : sinon un crash dans le batch du cycle perd
+        # l'upload et le cycle suivant refait le résumé (doublon dans AnythingLLM).
+        if not anything_client.commit_manifest():
+            logger.error(f"❌ Manifest non enregistré pour {base_name}. Pas de marqueur .done créé.")
+            return
         with open(done_marker, 'w') as f:
-            f.write("uploaded_via_api")
+            f.write(scheduler.done_marker_content(archive_stat.st_size))
+        # Le marqueur prend la date de l'archive lue, pas l'heure de fin : une
+        # réécriture par l'archiviste (autre worker en sharding) pendant le
+        # résumé reste plus récente que le .done et sera traitée au cycle suivant.
+        os.utime(done_marker, ns=(archive_stat.st_atime_ns, archive_stat.st_mtime_ns))
+        journal.clear()
         logger.info(f"   🏁 Cycle terminé pour {base_name}")
     else:
         logger.error(f"❌ Échec upload pour {base_name}. Pas de marqueur .done créé.")
 
-def run_summarization():
+def process_file_leased(json_filepath: str) -> bool:
+    """
+    process_file sous bail (mode sharding) : une archive n'est traitée que par
+    le worker qui tient son bail. Retourne False si un autre worker l'a prise.
+    """
+    leases = lease_store.get_leases()
+    if leases is None:
+        process_file(json_filepath)
+        return True
+    if is_done(json_filepath):
+        return True  # Rien à faire : inutile de prendre le bail
+    key = "file:" + os.path.relpath(json_filepath, worker_config.ARCHIVE_DEFAULT_PATH)
+    with leases.lease(key) as acquired:
+        if not acquired:
+            logger.debug(f"   🔒 [LEASE] {key} traité par un autre worker.")
+            return False
+        # Le .done est revérifié par process_file : l'archive a pu être finie entre-temps
+        process_file(json_filepath)
+    return True
+
+def run_summarization() -> dict:
     """
     Point d'entrée principal : Scanne le dossier archives.
+    Retourne le résultat du ré-embedding par workspace ({slug: succès}).
     """
     logger.info("🧠 SUMMARIZER V2 (Smart Chunking + Strict Prompt) : START")
     
@@ -321,21 +660,70 @@ def run_summarization():
     
     if not files:
         logger.info(f"   Aucun fichier JSON trouvé dans {worker_config.ARCHIVE_DEFAULT_PATH}")
-        return
+        return {}
 
-    for i, f in enumerate(files):
-        # On ignore les fichiers .done , manifest.json et autres fichiers non-json
-        if not f.endswith(".json"):
-            continue
-        if os.path.basename(f) == "manifest.json":
-            logger.debug(f"   ⏩ Ignoré : {f} (fichier manifest)")
-            continue
-    
-        process_file(f)
-        
-        # Pause entre les fichiers pour le Rate Limit
-        if i < len(files) - 1:
-            time.sleep(worker_config.RATE_LIMIT_SLEEP)
+    files = [f for f in files if f.endswith(".json") and os.path.basename(f) != "manifest.json"]
+    # Archives en attente, les plus prioritaires d'abord (activité récente,
+    # volume à résumer, ancienneté) : les threads actifs passent avant les threads morts
+    pending = scheduler.order_pending([f for f in files if not is_done(f)])
+    logger.info(f"   {len(files)} archives dont {len(pending)} en attente, "
+                f"{LLM_CONCURRENCY} appel(s) LLM simultané(s) pour {MODEL_NAME}")
+
+    global _cycle_budget
+    budget = _cycle_budget = scheduler.CycleBudget()
+
+    def run_one(f: str) -> str:
+        # Budget épuisé : on ne commence plus d'archive, le reste attend le cycle suivant
+        if budget.exhausted():
+            return "deferred"
+        return "processed" if process_file_leased(f) else "leased"
+
+    outcomes: Counter = Counter()
+    try:
+        # Les écritures manifest du cycle sont groupées en une transaction SQLite.
+        # En mode sharding, pas de transaction longue : elle bloquerait les
+        # écritures manifest des autres workers pendant tout le cycle.
+        with nullcontext() if worker_config.SHARDING else anything_client.manifest_batch():
+            # Le rythme des appels LLM est géré par rate_limiter : un fichier
+            # déjà traité (ou sans nouveau message) ne coûte aucune attente.
+            if LLM_CONCURRENCY == 1:
+                for f in pending:
+                    outcomes[run_one(f)] += 1
+            else:
+                # Plusieurs fichiers en vol : leurs morceaux se partagent le pool LLM borné
+                with ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="summarizer") as files_pool:
+                    futures = {files_pool.submit(run_one, f): f for f in pending}
+                    for future, f in futures.items():
+                        try:
+                            outcomes[future.result()] += 1
+                        except Exception as e:
+                            logger.exception(f"❌ Erreur traitement {f}: {e}")
+        if outcomes["leased"]:
+            logger.info(f"   🔒 [LEASE] {outcomes['leased']} archive(s) laissée(s) aux autres workers.")
+        metrics.SUMMARY_DEFERRED.set(outcomes["deferred"])
+        if outcomes["deferred"]:
+            logger.warning(f"   ⏳ [BUDGET] Budget {budget.exhausted()} épuisé ({budget.stats()}) : "
+                           f"{outcomes['deferred']} archive(s) reportée(s) au prochain cycle.")
+    finally:
+        _cycle_budget = None
+        flush_stale_documents()
+        embedding_results = embeddings.flush()
+        for slug, ok in embedding_results.items():
+            if ok:
+                logger.info(f"   🧬 Embeddings mis à jour pour le workspace {slug}")
+            else:
+                logger.warning(f"   ⚠️ Échec de la mise à jour des embeddings pour {slug}")
+
+    cache = get_summary_cache()
+    if cache:
+        cache.evict()
+        logger.info(f"   ♻️ [CACHE] {cache.stats()}")
+    streamed = stream_stats_summary()
+    if streamed:
+        logger.info(f"   ⚡ [LLM] {streamed}")
+    logger.info(f"   🚦 [RATE] {MODEL_NAME} : {rate_limiter.get_limiter(MODEL_NAME).stats()}")
+
+    return embedding_results
 
 if __name__ == "__main__":
     run_summarization()
\ No newline at end of file
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Les modules du worker sont importés à plat (comme dans le conteneur) et
+# config lit l'environnement à l'import : chemins redirigés vers un dossier
+# temporaire avant tout import, pour ne jamais toucher /app.
+_TMP = tempfile.mkdtemp(prefix="memory-worker-tests-")
+os.environ["ARCHIVE_PATH"] = os.path.join(_TMP, "archives")
+os.environ["MD_PATH"] = os.path.join(_TMP, "markdowns")
+os.environ["DB_PATH"] = os.path.join(_TMP, "anythingllm.db")
+os.environ.setdefault("METRICS_PORT", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
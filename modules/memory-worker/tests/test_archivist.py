@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import archivist
+import config as worker_config
+import storage
+from bench import synthetic_db
+
+
+def _archives(root):
+    """{chemin relatif: (contenu, mtime)} des archives JSON (dossier .state exclu)."""
+    found = {}
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(directory, name)
+                found[os.path.relpath(path, root)] = (storage.read_json(path), os.stat(path).st_mtime_ns)
+    return found
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    db = str(tmp_path / "anythingllm.db")
+    synthetic_db.generate(db, workspaces=2, threads=4, messages=5, default_messages=3)
+    monkeypatch.setattr(worker_config, "DB_DEFAULT_PATH", db)
+
+    def use_archive_dir(name):
+        root = str(tmp_path / name)
+        monkeypatch.setattr(worker_config, "ARCHIVE_DEFAULT_PATH", root)
+        monkeypatch.setattr(worker_config, "STATE_DEFAULT_PATH", os.path.join(root, ".state"))
+        return root
+
+    return db, use_archive_dir
+
+
+def test_incremental_scan_matches_full_scan(workdir):
+    db, use_archive_dir = workdir
+    incremental_root = use_archive_dir("incremental")
+    archivist.scan_all(full=True)
+    before = _archives(incremental_root)
+    assert before
+
+    synthetic_db.append_chats(db, threads=2, messages=3)
+    archivist.scan_all(full=False)
+    after = _archives(incremental_root)
+
+    # Seules les archives des deux threads modifiés sont réécrites
+    changed = [name for name in after if after[name][1] != before.get(name, (None, None))[1]]
+    assert len(changed) == 2
+
+    full_root = use_archive_dir("full")
+    archivist.scan_all(full=True)
+    assert {k: v[0] for k, v in _archives(full_root).items()} == {k: v[0] for k, v in after.items()}
+
+
+def test_incremental_scan_without_changes_rewrites_nothing(workdir):
+    _, use_archive_dir = workdir
+    root = use_archive_dir("archives")
+    archivist.scan_all(full=True)
+    before = _archives(root)
+    archivist.scan_all(full=False)
+    assert _archives(root) == before
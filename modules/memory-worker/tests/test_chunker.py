@@ -0,0 +1,57 @@
+import chunker
+import config as worker_config
+
+
+def _message(i, size=40):
+    return {"user": f"question {i} " + "u" * size, "ai": f"réponse {i} " + "a" * size}
+
+
+def test_estimate_tokens_is_stable():
+    assert chunker.estimate_tokens("") == 1
+    assert chunker.estimate_tokens("x" * 35) == 11
+
+
+def test_chunk_token_budget_capped_by_chunk_size(monkeypatch):
+    monkeypatch.setattr(worker_config, "SUMMARY_CHUNK_SIZE", None)
+    profile_budget = chunker.chunk_token_budget("ollama/mistral")
+    monkeypatch.setattr(worker_config, "SUMMARY_CHUNK_SIZE", 3000)
+    assert chunker.chunk_token_budget("ollama/mistral") == min(profile_budget, chunker.estimate_tokens("x" * 3000))
+    # Plancher : jamais de morceaux minuscules
+    monkeypatch.setattr(worker_config, "SUMMARY_CHUNK_SIZE", 10)
+    assert chunker.chunk_token_budget("ollama/mistral") == 256
+
+
+def test_split_text_prefers_paragraphs_and_respects_budget():
+    paragraphs = [f"paragraphe {i} " + "mot " * 50 for i in range(20)]
+    text = "\n\n".join(paragraphs)
+    parts = chunker.split_text(text, 200)
+    assert len(parts) > 1
+    assert all(chunker.estimate_tokens(p) <= 200 for p in parts)
+    # Aucun paragraphe n'est coupé ni perdu
+    assert [p for part in parts for p in part.split("\n\n")] == paragraphs
+
+
+def test_split_text_without_separator_cuts_hard():
+    parts = chunker.split_text("x" * 5000, 300)
+    assert "".join(parts) == "x" * 5000
+    assert all(chunker.estimate_tokens(p) <= 300 for p in parts)
+
+
+def test_build_chunks_fills_budget_in_order():
+    messages = [_message(i) for i in range(30)]
+    chunks = chunker.build_chunks(messages, 300)
+    assert 1 < len(chunks) < len(messages)
+    assert all(chunker.estimate_tokens(c) <= 300 for c in chunks)
+    joined = "".join(chunks)
+    positions = [joined.index(f"question {i} ") for i in range(30)]
+    assert positions == sorted(positions)
+
+
+def test_build_chunks_splits_oversized_exchange():
+    big = {"user": "intro", "ai": "\n\n".join("bloc " + "z" * 400 for _ in range(10))}
+    chunks = chunker.build_chunks([_message(0), big, _message(1)], 300)
+    continued = [c for c in chunks if c.startswith("(suite) ")]
+    assert continued
+    assert all(chunker.estimate_tokens(c) <= 300 for c in chunks)
+    # Le gros échange occupe ses propres morceaux, entre ses voisins
+    assert "question 0" in chunks[0] and "question 1" in chunks[-1]
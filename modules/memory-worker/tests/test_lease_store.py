@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from lease_store import LeaseStore
+
+
+@pytest.fixture
+def stores(tmp_path):
+    db = str(tmp_path / "leases.sqlite3")
+    a = LeaseStore(db_path=db, worker_id="worker-a", ttl=0.2)
+    b = LeaseStore(db_path=db, worker_id="worker-b", ttl=0.2)
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_lease_is_exclusive_until_released(stores):
+    a, b = stores
+    assert a.acquire("file:x.json")
+    assert a.acquire("file:x.json")  # Le propriétaire peut le reprendre (prolongation)
+    assert not b.acquire("file:x.json")
+    assert a.holders() == {"file:x.json": "worker-a"}
+    a.release("file:x.json")
+    assert b.acquire("file:x.json")
+
+
+def test_expired_lease_is_taken_over(stores):
+    a, b = stores
+    assert a.acquire("archivist")
+    time.sleep(0.3)
+    assert b.acquire("archivist")
+    assert b.holders() == {"archivist": "worker-b"}
+    # L'ancien propriétaire découvre la perte au renouvellement et ne la rend pas à tort
+    assert a.renew_all() == 0
+    a.release("archivist")
+    assert b.holders() == {"archivist": "worker-b"}
+
+
+def test_renewal_keeps_lease_alive(stores):
+    a, b = stores
+    assert a.acquire("file:y.json")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert a.renew_all() == 1
+    assert not b.acquire("file:y.json")
+
+
+def test_context_manager_releases(stores):
+    a, b = stores
+    with a.lease("file:z.json") as acquired:
+        assert acquired
+        with b.lease("file:z.json") as other:
+            assert not other
+    assert b.acquire("file:z.json")
+
+
+def test_close_releases_held_leases(tmp_path):
+    db = str(tmp_path / "leases.sqlite3")
+    a = LeaseStore(db_path=db, worker_id="worker-a", ttl=60)
+    a.acquire("file:w.json")
+    a.close()
+    b = LeaseStore(db_path=db, worker_id="worker-b", ttl=60)
+    try:
+        assert b.acquire("file:w.json")
+    finally:
+        b.close()
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+import llm_cache
+from llm_cache import LLMCache
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(**limits):
+        cache = LLMCache(db_path=str(tmp_path / "llm_cache.sqlite3"), **{
+            "max_bytes": 10 ** 9, "max_entries": 10 ** 6, "max_age_days": 0, **limits})
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_cache_key_depends_on_every_part():
+    key = llm_cache.cache_key("model", "prompt", "chunk")
+    assert key == llm_cache.cache_key("model", "prompt", "chunk")
+    assert key != llm_cache.cache_key("other", "prompt", "chunk")
+    assert key != llm_cache.cache_key("model", "prompt", "chunk2")
+    # Le séparateur évite les collisions par concaténation
+    assert llm_cache.cache_key("ab", "c", "d") != llm_cache.cache_key("a", "bc", "d")
+
+
+def test_get_put_and_empty_summaries(make_cache):
+    cache = make_cache()
+    assert cache.get("k") is None
+    cache.put("k", "model", "résumé")
+    cache.put("empty", "model", "")
+    assert cache.get("k") == "résumé"
+    assert cache.get("empty") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_eviction_by_entries_is_lru(make_cache):
+    cache = make_cache(max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.put(key, "model", key * 10)
+        time.sleep(0.01)
+    cache.get("a")  # "a" redevient le plus récent
+    cache.put("d", "model", "d" * 10)
+    assert cache.evict() == 1
+    assert cache.get("b") is None
+    assert [cache.get(k) is not None for k in ("a", "c", "d")] == [True, True, True]
+
+
+def test_eviction_by_size(make_cache):
+    cache = make_cache(max_bytes=250)
+    for key in ("a", "b", "c"):
+        cache.put(key, "model", key * 100)
+        time.sleep(0.01)
+    assert cache.evict() == 1
+    assert cache.get("a") is None
+
+
+def test_eviction_by_age(make_cache, monkeypatch):
+    cache = make_cache(max_age_days=1)
+    cache.put("old", "model", "ancien")
+    real_time = time.time
+    monkeypatch.setattr(llm_cache.time, "time", lambda: real_time() + 2 * 86400)
+    cache.put("new", "model", "récent")
+    assert cache.evict() == 1
+    assert cache.get("old") is None
+    assert cache.get("new") == "récent"
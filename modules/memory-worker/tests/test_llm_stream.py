@@ -0,0 +1,105 @@
+import json
+import time
+
+import pytest
+
+import config as worker_config
+import llm_stream
+
+
+class FakeResponse:
+    """Réponse SSE minimale : iter_lines() et close()."""
+
+    def __init__(self, deltas, usage=None):
+        self.lines = [b"data: " + json.dumps({"choices": [{"delta": {"content": d}}]}).encode() for d in deltas]
+        if usage:
+            self.lines.append(b"data: " + json.dumps({"choices": [], "usage": usage}).encode())
+        self.lines.append(b"data: [DONE]")
+        self.consumed = 0
+        self.closed = False
+
+    def iter_lines(self):
+        for line in self.lines:
+            self.consumed += 1
+            yield line
+            yield b""
+
+    def close(self):
+        self.closed = True
+
+
+def _feed(deltas, word_limit=1000):
+    detector = llm_stream._StopDetector(word_limit)
+    text = ""
+    for delta in deltas:
+        text += delta
+        reason, kept = detector.feed(text, delta)
+        if reason:
+            return reason, kept, detector
+    return None, text, detector
+
+
+@pytest.fixture(autouse=True)
+def stream_settings(monkeypatch):
+    monkeypatch.setattr(worker_config, "STREAM_WORD_OVERRUN", 1)
+    monkeypatch.setattr(worker_config, "STREAM_MAX_REPEATED_LINES", 3)
+
+
+def test_word_count_across_split_words():
+    _, text, detector = _feed(["Bon", "jour le", " mon", "de\n", "  entier ", "\tici"])
+    assert detector.words == len(text.split()) == 5
+
+
+def test_word_limit_cuts_at_last_line():
+    reason, kept, _ = _feed(["un deux\n", "trois quatre ", "cinq six"], word_limit=5)
+    assert reason == "word_limit"
+    assert kept == "un deux"
+
+
+def test_echo_after_answer_is_cut():
+    reason, kept, _ = _feed(["Résumé: tout va bien.\n", "### Us", "er: et ensuite ?"])
+    assert reason == "echo"
+    assert kept == "Résumé: tout va bien.\n"
+
+
+def test_leading_echo_is_kept_for_cleanup():
+    reason, _, _ = _feed(["   ### System:", " consignes\n", "### User: texte\n\nRésumé"])
+    assert reason is None
+
+
+def test_repeated_lines_keep_one():
+    reason, kept, _ = _feed(["Intro\n", "même ligne\n", "\n", "même ligne\n", "même ligne\n", "suite"])
+    assert reason == "repetition"
+    assert kept == "Intro\nmême ligne"
+
+
+def test_read_completion_stream_stops_and_closes():
+    deltas = [f"mot{i} " for i in range(50)]
+    response = FakeResponse(deltas)
+    text, stats = llm_stream.read_completion_stream(response, 10, time.monotonic())
+    assert response.closed
+    assert stats["stopped"] == "word_limit"
+    assert response.consumed < len(deltas)
+    assert len(text.split()) == 11
+
+
+def test_read_completion_stream_prefers_reported_usage():
+    response = FakeResponse(["Un résumé ", "court."], usage={"completion_tokens": 7})
+    text, stats = llm_stream.read_completion_stream(response, 100, time.monotonic())
+    assert text == "Un résumé court."
+    assert stats["tokens"] == 7
+    assert stats["stopped"] is None
+
+
+def test_stop_checks_are_linear():
+    # 20 000 tokens : l'ancienne version (split du texte entier à chaque token)
+    # prenait plusieurs secondes
+    detector = llm_stream._StopDetector(10 ** 9)
+    text = ""
+    started = time.perf_counter()
+    for i in range(20000):
+        delta = f"mot{i % 7} " + ("\n" if i % 13 == 0 else "")
+        text += delta
+        assert detector.feed(text, delta)[0] is None
+    assert time.perf_counter() - started < 2
+    assert detector.words == len(text.split())
@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+
+from manifest_store import ManifestStore, STALE_MAX_ATTEMPTS
+
+LEGACY = {f"k{i}": {"filename": f"thread_{i}.md", "any_document_id": f"doc-{i}",
+                    "last_message_timestamp": 1000 + i} for i in range(20)}
+
+
+def _store(tmp_path):
+    return ManifestStore(str(tmp_path / "manifest.sqlite3"), str(tmp_path / "manifest.json"))
+
+
+def _open_store(directory):
+    store = ManifestStore(os.path.join(directory, "manifest.sqlite3"), os.path.join(directory, "manifest.json"))
+    store.close()
+
+
+def test_legacy_manifest_is_migrated_once(tmp_path):
+    (tmp_path / "manifest.json").write_text(json.dumps(LEGACY))
+    store = _store(tmp_path)
+    try:
+        assert not (tmp_path / "manifest.json").exists()
+        assert (tmp_path / "manifest.json.migrated").exists()
+        entry = store.get("thread_3.md")
+        assert entry["any_document_id"] == "doc-3"
+        assert entry["last_message_timestamp"] == 1003
+        assert store.migrate_legacy() == 0
+    finally:
+        store.close()
+
+
+def test_concurrent_migration_from_several_workers(tmp_path):
+    (tmp_path / "manifest.json").write_text(json.dumps(LEGACY))
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_open_store, args=(str(tmp_path),)) for _ in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(60)
+    assert [p.exitcode for p in workers] == [0] * 4
+    assert (tmp_path / "manifest.json.migrated").exists()
+    conn = sqlite3.connect(str(tmp_path / "manifest.sqlite3"))
+    assert conn.execute("SELECT COUNT(*) FROM manifest").fetchone()[0] == len(LEGACY)
+    conn.close()
+
+
+def test_timestamp_keeps_chat_id_when_missing(tmp_path):
+    store = _store(tmp_path)
+    try:
+        store.set_document_id("a.md", "doc-a")
+        store.set_timestamp("a.md", 2000, chat_id=42)
+        store.set_timestamp("a.md", 3000)
+        entry = store.get("a.md")
+        assert (entry["last_message_timestamp"], entry["last_chat_id"]) == (3000, 42)
+    finally:
+        store.close()
+
+
+def test_stale_documents_are_retried_then_dropped(tmp_path):
+    store = _store(tmp_path)
+    try:
+        store.queue_stale("old-doc", "night")
+        assert store.stale_documents() == {"night": ["old-doc"]}
+        for _ in range(STALE_MAX_ATTEMPTS - 1):
+            assert store.stale_failed(["old-doc"]) == []
+        assert store.stale_failed(["old-doc"]) == ["old-doc"]
+        assert store.stale_documents() == {}
+
+        store.queue_stale("other-doc", "night")
+        store.stale_deleted(["other-doc"])
+        assert store.stale_documents() == {}
+    finally:
+        store.close()
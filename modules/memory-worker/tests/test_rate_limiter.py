@@ -0,0 +1,67 @@
+import pytest
+
+import config as worker_config
+import rate_limiter
+from rate_limiter import BackendRateLimiter, TokenBucket
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=10, capacity=5)
+    now = bucket._updated
+    assert bucket.wait_time(5, now) == 0
+    bucket.take(5)
+    assert bucket.wait_time(1, now) == pytest.approx(0.1)
+    assert bucket.wait_time(1, now + 0.2) == 0
+    # Jamais plus que la capacité, même après une longue pause
+    bucket.wait_time(0, now + 100)
+    assert bucket.tokens == 5
+
+
+def test_token_bucket_debt_delays_next_request():
+    bucket = TokenBucket(rate=1, capacity=10)
+    now = bucket._updated
+    bucket.take(15)  # Consommation réelle au-delà de l'estimation
+    assert bucket.wait_time(1, now) == pytest.approx(6)
+
+
+def test_unlimited_backend_never_waits():
+    limiter = BackendRateLimiter("local")
+    assert all(limiter.acquire(10 ** 6) == 0 for _ in range(100))
+
+
+def test_request_budget_blocks_when_exhausted(monkeypatch):
+    limiter = BackendRateLimiter("cloud", rpm=60)
+    burst = int(limiter._requests.capacity)
+    assert all(limiter.acquire() == 0 for _ in range(burst))
+    slept = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda s: (slept.append(s), limiter._requests.take(-1)))
+    assert limiter.acquire() > 0
+    assert slept and slept[0] == pytest.approx(1, rel=0.1)
+
+
+def test_throttling_pauses_and_slows_down():
+    limiter = BackendRateLimiter("cloud", rpm=60, tpm=60000)
+    assert limiter.on_throttled(2.5) == 2.5
+    assert limiter.factor == 0.5
+    assert limiter._requests.rate == pytest.approx(0.5)
+    assert limiter.on_throttled() == 4.0  # Sans Retry-After : 2 ** nombre de 429
+    assert limiter.factor == 0.25
+
+
+def test_latency_drift_slows_down_then_recovers(monkeypatch):
+    monkeypatch.setattr(worker_config, "RATE_LATENCY_SLOWDOWN", 2.0)
+    limiter = BackendRateLimiter("cloud", rpm=60)
+    limiter.on_success(1.0)
+    for _ in range(10):
+        limiter.on_success(10.0)
+    slowed = limiter.factor
+    assert slowed < 1.0
+    for _ in range(50):
+        limiter.on_success(1.0)
+    assert limiter.factor > slowed
+
+
+@pytest.mark.parametrize("value, expected", [("3", 3.0), ("-1", 0.0), (None, None),
+                                             ("Wed, 21 Oct 2015 07:28:00 GMT", None)])
+def test_parse_retry_after(value, expected):
+    assert rate_limiter.parse_retry_after(value) == expected
@@ -0,0 +1,67 @@
+import os
+import time
+
+import scheduler
+import summarizer
+from scheduler import CycleBudget
+
+DAY = 86400
+
+
+def _archive(directory, name, size, age_days, done_age_days=None, done_size=None):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write("x" * size)
+    now = time.time()
+    os.utime(path, (now - age_days * DAY, now - age_days * DAY))
+    if done_age_days is not None:
+        with open(path + ".done", "w") as f:
+            f.write(scheduler.done_marker_content(done_size or 0))
+        os.utime(path + ".done", (now - done_age_days * DAY, now - done_age_days * DAY))
+    return path
+
+
+def test_active_thread_goes_first(tmp_path):
+    dead = _archive(str(tmp_path), "dead.json", 200 * 600, age_days=20)
+    active = _archive(str(tmp_path), "active.json", 3 * 600, age_days=0)
+    assert scheduler.order_pending([dead, active]) == [active, dead]
+
+
+def test_summarized_size_counts_only_new_bytes(tmp_path):
+    # Même activité : celui qui a le plus de nouveaux messages passe d'abord
+    mostly_done = _archive(str(tmp_path), "a.json", 100 * 600, 1, done_age_days=2, done_size=99 * 600)
+    mostly_new = _archive(str(tmp_path), "b.json", 100 * 600, 1, done_age_days=2, done_size=10 * 600)
+    assert scheduler.order_pending([mostly_done, mostly_new]) == [mostly_new, mostly_done]
+
+
+def test_missing_archive_is_skipped(tmp_path):
+    kept = _archive(str(tmp_path), "a.json", 10, 0)
+    assert scheduler.order_pending([kept, str(tmp_path / "gone.json")]) == [kept]
+
+
+def test_budget_exhaustion():
+    assert CycleBudget(seconds=0, tokens=0).exhausted() is None
+    budget = CycleBudget(seconds=0, tokens=100)
+    budget.charge(60)
+    assert budget.exhausted() is None
+    budget.charge(60)
+    assert budget.exhausted() == "tokens"
+    budget = CycleBudget(seconds=0.01, tokens=0)
+    time.sleep(0.02)
+    assert budget.exhausted() == "time"
+
+
+def test_done_marker_follows_the_archive_version(tmp_path):
+    # Le .done prend la date de l'archive lue : une réécriture pendant le
+    # résumé (archiviste d'un autre worker) reste à traiter
+    path = _archive(str(tmp_path), "a.json", 10, age_days=1)
+    read_stat = os.stat(path)
+    with open(path + ".done", "w") as f:
+        f.write(scheduler.done_marker_content(read_stat.st_size))
+    os.utime(path + ".done", ns=(read_stat.st_atime_ns, read_stat.st_mtime_ns))
+    assert summarizer.is_done(path)
+
+    with open(path, "a") as f:
+        f.write("nouveau message")
+    os.utime(path, (read_stat.st_mtime + 1, read_stat.st_mtime + 1))
+    assert not summarizer.is_done(path)
@@ -0,0 +1,57 @@
+import os
+import stat
+
+import pytest
+
+import config as worker_config
+import storage
+
+CODECS = ["none", "gzip"] + (["zstd"] if storage.zstandard is not None else [])
+DATA = {"workspace": "école", "messages": [{"user": "Où ? 🚀", "ai": "Ici."}] * 50}
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_json_round_trip(tmp_path, codec):
+    path = str(tmp_path / "thread.json")
+    storage.write_json(path, DATA, codec)
+    with open(path, "rb") as f:
+        assert storage.codec_of(f.read()) == codec
+    assert storage.read_json(path) == DATA
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_text_round_trip_and_permissions(tmp_path, codec):
+    path = str(tmp_path / "summary.md")
+    storage.write_text(path, "# Mémoire\n\nrésumé", codec)
+    assert storage.read_text(path) == "# Mémoire\n\nrésumé"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    assert os.listdir(tmp_path) == ["summary.md"]  # Pas de fichier temporaire laissé
+
+
+def test_gzip_output_is_deterministic():
+    assert storage.encode("même contenu", "gzip") == storage.encode("même contenu", "gzip")
+
+
+def test_unknown_codec_falls_back_to_plain_text():
+    assert storage.active_codec("lz4") == "none"
+
+
+def test_migrate_converts_and_keeps_mtime(tmp_path, monkeypatch):
+    archives, markdowns = tmp_path / "archives", tmp_path / "markdowns"
+    archives.mkdir()
+    markdowns.mkdir()
+    monkeypatch.setattr(worker_config, "ARCHIVE_DEFAULT_PATH", str(archives))
+    monkeypatch.setattr(worker_config, "MD_DEFAULT_PATH", str(markdowns))
+    archive, summary = str(archives / "a.json"), str(markdowns / "a.md")
+    storage.write_json(archive, DATA, "none")
+    storage.write_text(summary, "résumé " * 200, "none")
+    os.utime(archive, ns=(1_000_000_000, 1_500_000_000_000_000_000))
+    mtime = os.stat(archive).st_mtime_ns
+
+    report = storage.migrate("gzip")
+
+    assert report["converted"] == 2
+    assert report["bytes_after"] < report["bytes_before"]
+    assert os.stat(archive).st_mtime_ns == mtime
+    assert storage.read_json(archive) == DATA
+    assert storage.migrate("gzip")["converted"] == 0
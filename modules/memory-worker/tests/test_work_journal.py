@@ -0,0 +1,65 @@
+import os
+
+import work_journal
+from work_journal import WorkJournal
+
+CHUNKS = ["morceau 1", "morceau 2", "morceau 3"]
+
+
+def _journal(tmp_path, chunks=CHUNKS, content="ancien résumé"):
+    job = work_journal.job_key("model", "thread.md", 0, None, chunks=chunks)
+    return WorkJournal("thread.md", job, content, journal_dir=str(tmp_path))
+
+
+def test_resume_keeps_summarized_chunks(tmp_path):
+    first = _journal(tmp_path)
+    date = first.setdefault("summary_date", "2026-01-01 04:00:00")
+    first.record_chunk(0, "résumé 1")
+    first.record_chunk(1, "résumé 2")
+
+    resumed = _journal(tmp_path)
+    assert resumed.chunk(0) == "résumé 1"
+    assert resumed.chunk(1) == "résumé 2"
+    assert resumed.chunk(2) is None
+    assert resumed.setdefault("summary_date", "autre date") == date
+    assert resumed.stage == work_journal.STAGE_CHUNKS
+
+
+def test_new_messages_restart_from_scratch(tmp_path):
+    _journal(tmp_path).record_chunk(0, "résumé 1")
+    changed = _journal(tmp_path, chunks=CHUNKS + ["morceau 4"])
+    assert changed.chunk(0) is None
+
+
+def test_stages_survive_restart(tmp_path):
+    journal = _journal(tmp_path)
+    journal.advance(work_journal.STAGE_SAVED, final_content="nouveau résumé")
+    journal.advance(work_journal.STAGE_UPLOADED, doc_id="doc-1")
+
+    resumed = _journal(tmp_path)
+    assert resumed.stage == work_journal.STAGE_UPLOADED
+    assert resumed.get("doc_id") == "doc-1"
+    assert resumed.get("final_content") == "nouveau résumé"
+
+
+def test_unconfirmed_update_restarts_from_base(tmp_path):
+    # La mise à jour a été écrite sur disque, puis de nouveaux messages sont
+    # arrivés : on repart du résumé d'avant, pas de celui déjà modifié
+    journal = _journal(tmp_path, content="base")
+    journal.advance(work_journal.STAGE_SAVED, final_content="base + mise à jour")
+
+    resumed = _journal(tmp_path, chunks=CHUNKS + ["morceau 4"], content="base + mise à jour")
+    assert resumed.stage == work_journal.STAGE_CHUNKS
+    assert resumed.base_content == "base"
+
+
+def test_clear_and_corrupt_journal(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record_chunk(0, "résumé 1")
+    journal.clear()
+    assert not os.path.exists(journal.path)
+    journal.clear()  # Idempotent
+
+    with open(journal.path, "w") as f:
+        f.write("{pas du json")
+    assert _journal(tmp_path).chunk(0) is None
@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import logging
+from typing import Any, Dict, Iterable, Optional
+import config as worker_config
+
+logger = logging.getLogger("work_journal")
+
+# Étapes d'un fichier, dans l'ordre : morceaux résumés -> résumé final écrit -> document uploadé
+STAGE_CHUNKS = "chunks"
+STAGE_SAVED = "saved"
+STAGE_UPLOADED = "uploaded"
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def job_key(*parts: Any, chunks: Iterable[str] = ()) -> str:
+    """Identifie un travail : mêmes paramètres et mêmes morceaux = même travail."""
+    h = hashlib.sha256()
+    for part in list(parts) + list(chunks):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class WorkJournal:
+    """Journal de reprise du traitement d'un fichier par le summarizer.
+
+    Chaque résumé de morceau est écrit sur disque dès qu'il est obtenu, puis
+    les étapes de finalisation (résumé écrit, document uploadé). Après un
+    crash ou un redémarrage, le même travail (même `job`) reprend au premier
+    morceau manquant et ne refait que les étapes non confirmées. Le journal
+    est supprimé une fois le fichier marqué .done.
+
+    `base_content` garde le résumé markdown d'avant la mise à jour : si le
+    travail a changé entre-temps (nouveaux messages) alors qu'une mise à jour
+    non confirmée était déjà écrite, on repart de cette base au lieu d'ajouter
+    une seconde fois la même section.
+    """
+
+    def __init__(self, name: str, job: str, current_content: str, journal_dir: Optional[str] = None):
+        self.name = name
+        self.job = job
+        self.path = os.path.join(journal_dir or worker_config.JOURNAL_DIR, f"{name}.json")
+        self._lock = threading.Lock()
+        self.data: Dict[str, Any] = self._load(current_content)
+
+    def _load(self, current_content: str) -> Dict[str, Any]:
+        fresh = {"job": self.job, "stage": STAGE_CHUNKS, "base_content": current_content, "chunks": {}}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except FileNotFoundError:
+            return fresh
+        except Exception as e:
+            logger.warning(f"   ⚠️ [JOURNAL] Journal illisible {self.path}, ignoré : {e}")
+            return fresh
+
+        # Mise à jour déjà écrite mais jamais confirmée (timestamp/.done) : on repart de la base
+        if previous.get("stage") in (STAGE_SAVED, STAGE_UPLOADED) \
+                and previous.get("final_digest") == digest(current_content):
+            fresh["base_content"] = previous.get("base_content", "")
+
+        if previous.get("job") != self.job:
+            logger.info(f"   📓 [JOURNAL] {self.name} : nouveaux messages depuis l'interruption, reprise de zéro.")
+            return fresh
+
+        done = len(previous.get("chunks") or {})
+        logger.info(f"   📓 [JOURNAL] Reprise de {self.name} : {done} morceau(x) déjà résumé(s), étape {previous.get('stage')}.")
+        return previous
+
+    def _save_locked(self):
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", delete=False, dir=directory, encoding="utf-8", suffix=".tmp") as tf:
+                json.dump(self.data, tf, ensure_ascii=False)
+                tf.flush()
+                os.fsync(tf.fileno())
+            os.replace(tf.name, self.path)
+        except OSError as e:
+            logger.warning(f"   ⚠️ [JOURNAL] Écriture impossible {self.path}: {e}")
+
+    # --- MORCEAUX ---
+    def chunk(self, index: int) -> Optional[str]:
+        with self._lock:
+            return self.data["chunks"].get(str(index))
+
+    def record_chunk(self, index: int, summary: str):
+        with self._lock:
+            self.data["chunks"][str(index)] = summary
+            self._save_locked()
+
+    # --- ÉTAPES ---
+    @property
+    def stage(self) -> str:
+        return self.data.get("stage", STAGE_CHUNKS)
+
+    @property
+    def base_content(self) -> str:
+        return self.data.get("base_content") or ""
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def setdefault(self, key: str, value: Any) -> Any:
+        """Valeur figée pour tout le travail (ex. date de la mise à jour), écrite avec le prochain enregistrement."""
+        with self._lock:
+            return self.data.setdefault(key, value)
+
+    def advance(self, stage: str, **fields: Any):
+        with self._lock:
+            self.data.update(fields, stage=stage)
+            if "final_content" in fields:
+                self.data["final_digest"] = digest(fields["final_content"])
+            self._save_locked()
+
+    def clear(self):
+        """Travail terminé (.done écrit) : le journal n'a plus de raison d'être."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"   ⚠️ [JOURNAL] Suppression impossible {self.path}: {e}")